@@ -9,6 +9,7 @@ from .collaboration import router as collaboration_router
 from .upload import router as upload_router
 from .articles import router as articles_router
 from .files import router as files_router
+from .search import router as search_router
 
 # 导出所有路由对象，方便在 main.py 中使用
 auth = auth_router
@@ -21,4 +22,5 @@ roles = roles_router
 collaboration = collaboration_router
 upload = upload_router
 articles = articles_router
-files = files_router
\ No newline at end of file
+files = files_router
+search = search_router
\ No newline at end of file
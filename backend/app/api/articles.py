@@ -17,6 +17,7 @@ from app.schemas.article import (
 )
 from app.config import settings
 from app.services.article_cache_service import article_cache_service
+from app.services.search_service import search_service, ENTITY_ARTICLE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -38,22 +39,61 @@ def can_manage(article: Article, user: User) -> bool:
     return article.author_id == user.id
 
 
+# MinIO 直链（任意主机 + 存储桶前缀）统一改写为后端代理路径 /api/files/
+# 正则在模块加载时编译一次；写入时即改写并落库，读取时的改写只对尚未迁移的旧数据生效
+_BUCKET_MARKER = f"/{settings.MINIO_BUCKET}/"
+_BUCKET_URL_PATTERN = re.compile(r'https?://[^/\s"\'<>]+/' + re.escape(settings.MINIO_BUCKET) + r'/')
+_FILES_PREFIX = "/api/files/"
+
+
 def _rewrite_public_url(url: Optional[str]) -> Optional[str]:
-    if not url:
+    if not url or _BUCKET_MARKER not in url:
         return url
-    bucket = settings.MINIO_BUCKET
-    pattern = re.compile(r'^https?://[^/]+/' + re.escape(bucket) + r'/(.+)$')
-    m = pattern.match(url)
-    if m:
-        return f"/api/files/{m.group(1)}"
+    m = _BUCKET_URL_PATTERN.match(url)
+    if m and m.end() < len(url):
+        return _FILES_PREFIX + url[m.end():]
     return url
 
 
 def _rewrite_content_links(html: Optional[str]) -> Optional[str]:
-    if not html:
+    # 绝大多数正文（含已迁移的）不含直链，先做子串判断避免整篇正则扫描
+    if not html or _BUCKET_MARKER not in html:
         return html
-    bucket = settings.MINIO_BUCKET
-    return re.sub(r'https?://[^/]+/' + re.escape(bucket) + r'/', '/api/files/', html)
+    return _BUCKET_URL_PATTERN.sub(_FILES_PREFIX, html)
+
+
+def _normalize_roles(roles: Optional[list]) -> list:
+    """角色编码统一小写去重（列表权限过滤在数据库中按小写精确匹配）"""
+    result = []
+    for role in roles or []:
+        code = (role or '').strip().lower()
+        if code and code not in result:
+            result.append(code)
+    return result
+
+
+def _article_access_filter(user: User):
+    """与 _can_access_article 等价的 SQL 条件（JSONB ? 运算符，走 GIN 索引）"""
+    conditions = [
+        Article.author_id == user.id,
+        Article.is_public.is_(True),
+        Article.editable_user_ids.has_key(user.id),
+    ]
+    if user.department:
+        conditions.append(Article.departments.has_key(user.department))
+    if user.role:
+        conditions.append(Article.editable_roles.has_key(user.role.lower()))
+    return or_(*conditions)
+
+
+# 列表只取这些列；content 仅在 include_content 时读取
+_LIST_COLUMNS = (
+    Article.id, Article.title, Article.summary, Article.type, Article.status, Article.tags,
+    Article.cover_url, Article.category, Article.is_public,
+    Article.editable_user_ids, Article.editable_roles, Article.departments, Article.project_id,
+    Article.author_id, Article.author_name, Article.view_count, Article.edit_count, Article.version,
+    Article.is_locked, Article.locked_by, Article.locked_at, Article.created_at, Article.updated_at,
+)
 
 
 def _can_access_article(article: Article, user: User) -> bool:
@@ -89,17 +129,24 @@ def _can_access_article(article: Article, user: User) -> bool:
 @router.get("/", response_model=ArticleListResponse)
 def list_articles(
     params: ArticleQueryParams = Depends(),
+    include_content: bool = Query(True, description="是否返回正文（不需要正文的列表页传 false）"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = db.query(Article)
+    columns = _LIST_COLUMNS + ((Article.content,) if include_content else ())
+    query = db.query(*columns)
     if params.type:
         query = query.filter(Article.type == params.type)
     if params.status:
         query = query.filter(Article.status == params.status)
     if params.search:
-        like = f"%{params.search}%"
-        query = query.filter(or_(Article.title.ilike(like), Article.summary.ilike(like)))
+        # 全文索引（标题/摘要/正文）；查询中没有可检索的词时退回模糊匹配
+        matched = search_service.match_ids(ENTITY_ARTICLE, params.search)
+        if matched is not None:
+            query = query.filter(Article.id.in_(matched))
+        else:
+            like = f"%{params.search}%"
+            query = query.filter(or_(Article.title.ilike(like), Article.summary.ilike(like)))
     if params.author_name:
         like_author = f"%{params.author_name}%"
         query = query.filter(Article.author_name.ilike(like_author))
@@ -115,25 +162,16 @@ def list_articles(
         if params.month:
             query = query.filter(func.extract('month', Article.created_at) == params.month)
 
-    # 权限过滤：根据用户部门和可编辑成员过滤文章
+    # 权限过滤：非管理员在数据库中按作者/可编辑成员/部门/角色/公开过滤，分页也在数据库中完成
     if current_user.role != 'admin':
-        # 获取所有文章，然后在内存中过滤（因为需要检查JSON字段）
-        all_items = query.order_by(desc(Article.updated_at)).all()
-        filtered_items = [article for article in all_items if _can_access_article(article, current_user)]
-        
-        # 分页
-        total = len(filtered_items)
-        start = (params.page - 1) * params.page_size
-        end = start + params.page_size
-        items = filtered_items[start:end]
-    else:
-        # 管理员看到所有文章
-        total = query.count()
-        items = query.order_by(desc(Article.updated_at)).offset((params.page - 1) * params.page_size).limit(params.page_size).all()
+        query = query.filter(_article_access_filter(current_user))
+
+    total = query.count()
+    items = query.order_by(desc(Article.updated_at)).offset((params.page - 1) * params.page_size).limit(params.page_size).all()
 
     resp_items: list[ArticleResponse] = []
     for i in items:
-        data = ArticleResponse.from_orm(i)
+        data = ArticleResponse.model_validate(i, from_attributes=True)
         data.content = _rewrite_content_links(data.content)
         data.cover_url = _rewrite_public_url(data.cover_url)
         resp_items.append(data)
@@ -156,16 +194,16 @@ def create_article(
     article = Article(
         id=str(uuid.uuid4()),
         title=payload.title,
-        content=payload.content or "",
+        content=_rewrite_content_links(payload.content) or "",
         summary=payload.summary,
         type=payload.type,
         status=payload.status or "draft",
         tags=payload.tags or [],
-        cover_url=payload.cover_url,
+        cover_url=_rewrite_public_url(payload.cover_url),
         category=payload.category,
         is_public=True if payload.is_public is None else payload.is_public,
         editable_user_ids=(payload.editable_user_ids or []),
-        editable_roles=(payload.editable_roles or []),
+        editable_roles=_normalize_roles(payload.editable_roles),
         departments=(payload.departments or []),
         project_id=payload.project_id,  # 添加项目关联
         author_id=current_user.id,
@@ -195,10 +233,7 @@ def create_article(
     article_cache_service.invalidate_article_tree(article.type)
     logger.info(f"🗑️ 创建文章后清除缓存: {article.id}")
 
-    data = ArticleResponse.from_orm(article)
-    data.content = _rewrite_content_links(data.content)
-    data.cover_url = _rewrite_public_url(data.cover_url)
-    return data
+    return ArticleResponse.from_orm(article)
 
 
 @router.get("/{article_id}", response_model=ArticleResponse)
@@ -260,9 +295,11 @@ def update_article(
     if payload.summary is not None and payload.summary != a.summary:
         changes.append("更新摘要")
         a.summary = payload.summary
-    if payload.content is not None and payload.content != a.content:
+    # 正文与封面在写入时即改写为 /api/files/ 链接，读取时无需再处理
+    content = _rewrite_content_links(payload.content)
+    if content is not None and content != a.content:
         changes.append("编辑内容")
-        a.content = payload.content
+        a.content = content
         a.edit_count += 1
     if payload.status is not None and payload.status != a.status:
         changes.append(f"状态: {a.status} -> {payload.status}")
@@ -270,9 +307,10 @@ def update_article(
     if payload.tags is not None and payload.tags != a.tags:
         changes.append("更新标签")
         a.tags = payload.tags
-    if payload.cover_url is not None and payload.cover_url != a.cover_url:
+    cover_url = _rewrite_public_url(payload.cover_url)
+    if cover_url is not None and cover_url != a.cover_url:
         changes.append("更新封面")
-        a.cover_url = payload.cover_url
+        a.cover_url = cover_url
     if payload.category is not None and payload.category != a.category:
         changes.append("更新分类")
         a.category = payload.category
@@ -283,7 +321,7 @@ def update_article(
         a.editable_user_ids = payload.editable_user_ids
         changes.append("可编辑成员变更")
     if payload.editable_roles is not None:
-        a.editable_roles = payload.editable_roles
+        a.editable_roles = _normalize_roles(payload.editable_roles)
         changes.append("可编辑角色变更")
     if payload.departments is not None:
         a.departments = payload.departments
@@ -6,7 +6,6 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status, WebSocket,
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import and_, or_, desc, asc, func
 from typing import List, Optional
-import time
 from datetime import datetime, timedelta
 from app.utils.datetime_utils import utc_now
 import uuid
@@ -25,110 +24,65 @@ from app.schemas.collaboration import (
     CollaborationDocumentQueryParams, CollaborationDocumentListResponse,
     CollaboratorResponse, CollaboratorCreate, CollaboratorUpdate,
     DocumentEditHistoryResponse, DocumentCommentResponse, DocumentCommentCreate,
-    CollaborationStateResponse, CollaborationStatisticsResponse
+    CollaborationStateResponse, CollaborationStatisticsResponse, DocumentContentDelta
 )
-from app.utils.redis_client import get_redis
+from app.config import settings
+from app.services.collaboration_room_service import collaboration_rooms
+from app.services.presence_service import presence_service
+from app.services.document_save_service import document_saves, VersionConflict, DocumentNotFound
+from app.services.search_service import search_service, ENTITY_DOCUMENT
 
 router = APIRouter(prefix="/collaboration", tags=["协作文档"])
+# ==================== 实时协作房间（OT） ====================
+
+async def _handle_collab_message(room, websocket: WebSocket, data: dict):
+    mtype = data.get('type')
+    if mtype == 'presence':
+        await collaboration_rooms.broadcast_presence(room, {
+            "type": "presence",
+            "user_id": data.get('user_id'),
+            "user_name": data.get('user_name'),
+            "cursor": data.get('cursor'),
+            "selection": data.get('selection')
+        }, source=websocket)
+    elif mtype == 'op':
+        # 变换到最新版本、定序并广播给所有客户端（包含发送者），以便发送端拿到最终版本号
+        await collaboration_rooms.submit(
+            room,
+            websocket,
+            client_version=int(data.get('version') or 1),
+            pos=int(data.get('pos') or 0),
+            dele=int(data.get('del') or 0),
+            ins=data.get('ins') or "",
+            user_id=data.get('user_id'),
+            user_name=data.get('user_name')
+        )
+    else:
+        # 回退：广播原样数据
+        await collaboration_rooms.broadcast(room, data, exclude=websocket)
 
-# 在线状态 TTL（秒）
-PRESENCE_TTL_SECONDS = 20
-# ==================== 简易内存房间（OT-lite） ====================
-from collections import defaultdict
-from typing import Dict, Any
-
-class RoomState:
-    def __init__(self):
-        self.content: str = ""
-        self.version: int = 1
-        self.ops: list[dict] = []  # 仅保存最近若干条
-        self.clients: set[WebSocket] = set()
-
-ROOMS: Dict[str, RoomState] = defaultdict(RoomState)
-
-def transform_position(pos: int, since_ops: list[dict]) -> int:
-    new_pos = pos
-    for op in since_ops:
-        op_pos = op.get('pos', 0)
-        ins = op.get('ins', "")
-        dele = int(op.get('del', 0) or 0)
-        if op_pos < new_pos:
-            new_pos += len(ins) - dele
-    return max(0, new_pos)
-
-def apply_op_to_text(text: str, pos: int, dele: int, ins: str) -> str:
-    pos = max(0, min(len(text), pos))
-    dele = max(0, min(len(text) - pos, dele))
-    return text[:pos] + (ins or "") + text[pos+dele:]
-
-async def ws_broadcast(room: RoomState, message: Any, exclude: WebSocket | None = None):
-    dead = []
-    for ws in list(room.clients):
-        if exclude is not None and ws is exclude:
-            continue
-        try:
-            await ws.send_json(message)
-        except Exception:
-            dead.append(ws)
-    for ws in dead:
-        room.clients.discard(ws)
 
 @router.websocket("/ws/{document_id}")
 async def collaboration_ws(websocket: WebSocket, document_id: str):
     await websocket.accept()
-    room = ROOMS[document_id]
-    room.clients.add(websocket)
+    # 加入房间时发送初始化内容（房间状态由 collaboration_rooms 跨 worker 维护）
+    # ?batch=1 的客户端按窗口接收 {"type": "batch", "messages": [...]} 合并帧，也可以用同样格式批量上报
+    batch = websocket.query_params.get("batch") in ("1", "true")
+    room = await collaboration_rooms.join(document_id, websocket, batch=batch)
     try:
-        # 首次发送初始化内容
-        await websocket.send_json({
-            "type": "init",
-            "version": room.version,
-            "content": room.content,
-        })
         while True:
             data = await websocket.receive_json()
-            mtype = data.get('type')
-            if mtype == 'presence':
-                await ws_broadcast(room, {
-                    "type": "presence",
-                    "user_id": data.get('user_id'),
-                    "user_name": data.get('user_name'),
-                    "cursor": data.get('cursor'),
-                    "selection": data.get('selection')
-                }, exclude=websocket)
-            elif mtype == 'op':
-                client_ver = int(data.get('version') or 1)
-                pos = int(data.get('pos') or 0)
-                dele = int(data.get('del') or 0)
-                ins = data.get('ins') or ""
-                # 将 pos 转换到当前最新版本
-                if client_ver < room.version:
-                    since_ops = room.ops[client_ver - 1:]
-                    pos = transform_position(pos, since_ops)
-                # 应用到服务端文本
-                room.content = apply_op_to_text(room.content, pos, dele, ins)
-                room.version += 1
-                op_msg = {
-                    "type": "op",
-                    "version": room.version,
-                    "pos": pos,
-                    "del": dele,
-                    "ins": ins,
-                    "user_id": data.get('user_id'),
-                    "user_name": data.get('user_name')
-                }
-                room.ops.append({"pos": pos, "del": dele, "ins": ins})
-                if len(room.ops) > 500:
-                    room.ops = room.ops[-500:]
-                # 广播给所有客户端（包含发送者），以便发送端拿到最终版本号
-                await ws_broadcast(room, op_msg, exclude=None)
+            if data.get('type') == 'batch':
+                for message in data.get('messages') or []:
+                    await _handle_collab_message(room, websocket, message)
             else:
-                # 回退：广播原样数据
-                await ws_broadcast(room, data, exclude=websocket)
+                await _handle_collab_message(room, websocket, data)
     except WebSocketDisconnect:
-        room.clients.discard(websocket)
+        pass
     except Exception:
-        room.clients.discard(websocket)
+        pass
+    finally:
+        await collaboration_rooms.leave(room, websocket)
 
 
 # ==================== 权限检查辅助函数 ====================
@@ -290,14 +244,18 @@ async def get_documents(
         if params.owner_id:
             query = query.filter(CollaborationDocument.owner_id == params.owner_id)
         if params.search:
-            search_term = f"%{params.search}%"
-            query = query.filter(
-                or_(
-                    CollaborationDocument.title.ilike(search_term),
-                    CollaborationDocument.description.ilike(search_term),
-                    CollaborationDocument.content.ilike(search_term)
+            # 全文索引（标题/描述/正文），不再对 HTML 正文做 ilike 全表扫描
+            matched = search_service.match_ids(ENTITY_DOCUMENT, params.search)
+            if matched is not None:
+                query = query.filter(CollaborationDocument.id.in_(matched))
+            else:
+                search_term = f"%{params.search}%"
+                query = query.filter(
+                    or_(
+                        CollaborationDocument.title.ilike(search_term),
+                        CollaborationDocument.description.ilike(search_term)
+                    )
                 )
-            )
         if params.created_start:
             query = query.filter(CollaborationDocument.created_at >= params.created_start)
         if params.created_end:
@@ -470,24 +428,22 @@ async def get_document_state(
         if not check_document_permission(document, current_user, "view"):
             raise HTTPException(status_code=403, detail="无权限查看此文档")
         
-        # 活跃编辑者（心跳30秒内）
-        threshold = utc_now() - timedelta(seconds=30)
-        sessions = db.query(CollaborationSession).filter(
-            CollaborationSession.document_id == document_id,
-            CollaborationSession.is_active == True,
-            CollaborationSession.last_heartbeat >= threshold,
-        ).all()
+        # 活跃编辑者：优先读 Redis 在线状态，Redis 不可用时按会话表心跳兜底
+        editors = presence_service.online(document_id)
+        if editors is None:
+            editors = _recent_sessions(db, document_id)
         active = []
-        for s in sessions:
+        for e in editors:
+            has_selection = e["selection_start"] is not None and e["selection_end"] is not None
             active.append({
-                "user_id": s.user_id,
-                "user_name": s.user_name,
-                "cursor_position": s.cursor_position,
+                "user_id": e["user_id"],
+                "user_name": e["user_name"],
+                "cursor_position": e["cursor_position"],
                 "selection_range": {
-                    "start": s.selection_start or 0,
-                    "end": s.selection_end or 0
-                } if (s.selection_start is not None and s.selection_end is not None) else None,
-                "last_active": (s.last_heartbeat or utc_now()).isoformat(),
+                    "start": e["selection_start"] or 0,
+                    "end": e["selection_end"] or 0
+                } if has_selection else None,
+                "last_active": (e["last_heartbeat"] or utc_now()).isoformat(),
             })
 
         # 构建协作状态响应（返回真实锁状态）
@@ -669,6 +625,14 @@ async def update_document(
         if not check_document_permission(document, current_user, "edit"):
             raise HTTPException(status_code=403, detail="无权限编辑此文档")
         
+        # 内容与版本号由增量保存服务维护（Redis 共享状态 / 行锁直写），不直接改写 document.content；
+        # 先保存内容，版本冲突时元数据也不落库
+        saved_version = None
+        if document_data.content is not None:
+            saved_version = document_saves.save_content(
+                db, document, document_data.content, current_user, base_version=document_data.version
+            )
+        
         # 更新字段
         changes = []
         if document_data.title is not None and document_data.title != document.title:
@@ -679,11 +643,6 @@ async def update_document(
             changes.append("描述已更新")
             document.description = document_data.description
         
-        if document_data.content is not None and document_data.content != document.content:
-            changes.append("内容已更新")
-            document.content = document_data.content
-            document.edit_count += 1
-        
         if document_data.status is not None and document_data.status != document.status:
             changes.append(f"状态: {document.status} -> {document_data.status}")
             document.status = document_data.status
@@ -703,9 +662,8 @@ async def update_document(
         if changes:
             document.last_edited_by = (current_user.real_name or current_user.username)
             document.last_edited_at = datetime.now()
-            document.version += 1
             
-            # 记录编辑历史
+            # 记录编辑历史（version 是内容版本，由增量保存/协作房间维护，元数据变更不递增）
             history = DocumentEditHistory(
                 id=str(uuid.uuid4()),
                 document_id=document.id,
@@ -713,7 +671,7 @@ async def update_document(
                 editor_name=(current_user.real_name or current_user.username),
                 action="update",
                 changes_summary="; ".join(changes),
-                version_before=document.version - 1,
+                version_before=document.version,
                 version_after=document.version
             )
             db.add(history)
@@ -723,8 +681,17 @@ async def update_document(
         
         print(f"✅ [CollaborationAPI] 协作文档更新成功: {document.title}")
         
-        return CollaborationDocumentResponse.from_orm(document)
+        response = CollaborationDocumentResponse.from_orm(document)
+        if saved_version is not None:
+            # Redis 中的保存稍后才合并落库，响应以刚保存的内容为准
+            response.content = document_data.content
+            response.version = saved_version
+        return response
         
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    except DocumentNotFound:
+        raise HTTPException(status_code=404, detail="文档不存在")
     except HTTPException:
         raise
     except Exception as e:
@@ -1136,6 +1103,27 @@ async def unlock_document(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"结束编辑失败: {str(e)}")
 
+def _recent_sessions(db: Session, document_id: str) -> List[dict]:
+    """Redis 不可用时的兜底：按会话表最近心跳判断在线"""
+    threshold = datetime.now() - timedelta(seconds=settings.COLLAB_PRESENCE_TTL_SECONDS)
+    sessions = db.query(CollaborationSession).filter(
+        CollaborationSession.document_id == document_id,
+        CollaborationSession.is_active == True,
+        CollaborationSession.last_heartbeat >= threshold,
+    ).all()
+    return [
+        {
+            "user_id": str(s.user_id),
+            "user_name": s.user_name,
+            "cursor_position": s.cursor_position,
+            "selection_start": s.selection_start,
+            "selection_end": s.selection_end,
+            "last_heartbeat": s.last_heartbeat,
+        }
+        for s in sessions
+    ]
+
+
 @router.post("/documents/{document_id}/presence")
 async def heartbeat_presence(
     document_id: str,
@@ -1145,52 +1133,71 @@ async def heartbeat_presence(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """编辑心跳与光标位置上报（前端每 5-10 秒调用一次）。"""
+    """编辑心跳与光标位置上报（前端每 5-10 秒调用一次）。
+
+    心跳只写 Redis；仅在加入文档（首次心跳或超时后重新上线）时写会话表，
+    Redis 不可用时退化为每次心跳写会话表。
+    """
     try:
-        session = db.query(CollaborationSession).filter(
-            CollaborationSession.document_id == document_id,
-            CollaborationSession.user_id == current_user.id
-        ).first()
-        if not session:
-            session = CollaborationSession(
-                id=str(uuid.uuid4()),
-                document_id=document_id,
-                user_id=current_user.id,
-                user_name=(current_user.real_name or current_user.username),
-                session_id=str(uuid.uuid4()),
-                is_active=True
+        user_name = current_user.real_name or current_user.username
+        joined = presence_service.heartbeat(
+            document_id, current_user.id, user_name,
+            cursor_position, selection_start, selection_end
+        )
+        if joined is None or joined:
+            presence_service.record_join(
+                db, document_id, current_user.id, user_name,
+                cursor_position, selection_start, selection_end
             )
-            db.add(session)
-        session.is_active = True
-        session.last_heartbeat = datetime.now()
-        if cursor_position is not None:
-            session.cursor_position = cursor_position
-        if selection_start is not None:
-            session.selection_start = selection_start
-        if selection_end is not None:
-            session.selection_end = selection_end
-        db.commit()
+        return {"ok": True}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # --- 同步到 Redis：记录用户全局在线与文档在线 ---
-        try:
-            r = get_redis()
-            now = int(time.time())
-            # 全局在线标记
-            r.set(f"presence:user:{current_user.id}", now, ex=PRESENCE_TTL_SECONDS)
-            # 文档在线集合（用 hash 保存 user_id -> ts，给整个 hash 设置 TTL）
-            doc_hash = f"presence:doc:{document_id}"
-            r.hset(doc_hash, str(current_user.id), now)
-            r.expire(doc_hash, PRESENCE_TTL_SECONDS)
-        except Exception:
-            # 忽略 Redis 错误，不影响主流程
-            pass
 
+@router.delete("/documents/{document_id}/presence")
+async def leave_presence(
+    document_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """离开文档（关闭页面时调用），立即从在线列表移除并回写会话表。"""
+    try:
+        removed = presence_service.leave(document_id, current_user.id)
+        if removed is None or removed:
+            presence_service.record_leaves(db, [{
+                "document_id": document_id,
+                "user_id": current_user.id,
+                "last_heartbeat": datetime.now(),
+            }])
         return {"ok": True}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _get_editable_document(db: Session, document_id: str, current_user: User) -> CollaborationDocument:
+    document = db.query(CollaborationDocument).filter(
+        CollaborationDocument.id == document_id
+    ).first()
+    if not document:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    # 检查编辑权限
+    if not check_document_permission(document, current_user, "edit"):
+        raise HTTPException(status_code=403, detail="无权限编辑此文档")
+    # 独占锁校验：若被他人锁定，禁止保存
+    if getattr(document, 'is_locked', False) and document.locked_by not in (None, current_user.id):
+        raise HTTPException(status_code=423, detail="文档已被他人编辑中")
+    return document
+
+
+def _version_conflict(e: VersionConflict) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": "文档已被更新，请基于最新版本重新保存", "current_version": e.current_version}
+    )
+
+
 @router.put("/documents/{document_id}/content")
 async def update_document_content(
     document_id: str,
@@ -1198,52 +1205,28 @@ async def update_document_content(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """更新文档内容（实时保存）"""
+    """更新文档内容（整篇保存，兼容旧客户端）
+
+    服务端与最新内容比较后按一次替换增量保存；带 version 时做冲突检测，否则后写覆盖。
+    """
     try:
         print(f"💾 [CollaborationAPI] 更新文档内容: {document_id}")
         
-        document = db.query(CollaborationDocument).filter(
-            CollaborationDocument.id == document_id
-        ).first()
-        
-        if not document:
-            raise HTTPException(status_code=404, detail="文档不存在")
-        
-        # 检查编辑权限
-        if not check_document_permission(document, current_user, "edit"):
-            raise HTTPException(status_code=403, detail="无权限编辑此文档")
-        # 独占锁校验：若被他人锁定，禁止保存
-        if getattr(document, 'is_locked', False) and document.locked_by not in (None, current_user.id):
-            raise HTTPException(status_code=423, detail="文档已被他人编辑中")
-        
-        # 更新内容
-        document.content = content_data.get("content", "")
-        document.last_edited_by = current_user.username
-        document.last_edited_at = datetime.now()
-        document.edit_count += 1
-        # 版本号自增
-        previous_version = document.version or 1
-        document.version = previous_version + 1
-
-        # 记录编辑内容历史
-        history = DocumentEditHistory(
-            id=str(uuid.uuid4()),
-            document_id=document.id,
-            editor_id=current_user.id,
-            editor_name=current_user.username,
-            action="edit_content",
-            changes_summary="编辑内容",
-            version_before=previous_version,
-            version_after=document.version
+        document = _get_editable_document(db, document_id, current_user)
+        base_version = content_data.get("version")
+        version = document_saves.save_content(
+            db, document, content_data.get("content", ""), current_user,
+            base_version=int(base_version) if base_version is not None else None
         )
-        db.add(history)
-        
-        db.commit()
         
-        print(f"✅ [CollaborationAPI] 文档内容更新成功")
+        print(f"✅ [CollaborationAPI] 文档内容更新成功 (v{version})")
         
-        return {"message": "内容已保存"}
+        return {"message": "内容已保存", "version": version}
         
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    except DocumentNotFound:
+        raise HTTPException(status_code=404, detail="文档不存在")
     except HTTPException:
         raise
     except Exception as e:
@@ -1255,31 +1238,90 @@ async def update_document_content(
         )
 
 
+@router.patch("/documents/{document_id}/content")
+async def save_document_delta(
+    document_id: str,
+    delta: DocumentContentDelta,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """增量保存：提交基于 base_version 的操作（或整篇内容），版本不是最新时返回 409"""
+    try:
+        document = _get_editable_document(db, document_id, current_user)
+        if delta.ops is not None:
+            ops = [{"pos": op.pos, "del": op.delete, "ins": op.ins} for op in delta.ops if op.delete or op.ins]
+            if not ops:
+                _, version = document_saves.current(db, document)
+                if version != delta.base_version:
+                    raise VersionConflict(version)
+                return {"version": version}
+            version = document_saves.save(db, document, delta.base_version, ops, current_user)
+        elif delta.content is not None:
+            version = document_saves.save_content(db, document, delta.content, current_user, base_version=delta.base_version)
+        else:
+            raise HTTPException(status_code=400, detail="ops 与 content 至少提供一个")
+        return {"version": version}
+    except VersionConflict as e:
+        raise _version_conflict(e)
+    except DocumentNotFound:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ [CollaborationAPI] 增量保存失败: {e}")
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"保存失败: {str(e)}"
+        )
+
+
 @router.get("/documents/{document_id}/content")
 async def get_document_content(
     document_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取文档内容与版本，用于前端轮询同步"""
+    """获取文档内容与版本，用于前端轮询同步（包含尚未落库的保存）"""
     doc = db.query(CollaborationDocument).filter(CollaborationDocument.id == document_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="文档不存在")
+    content, version = document_saves.current(db, doc)
     return {
-        "content": doc.content or "",
-        "version": doc.version or 1,
+        "content": content,
+        "version": version,
         "updated_at": (doc.updated_at or datetime.now()).isoformat(),
         "last_edited_by": doc.last_edited_by,
     }
 
 
+@router.get("/documents/{document_id}/versions/{version}")
+async def get_document_version(
+    document_id: str,
+    version: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取某个历史版本的内容（由最近的全文快照加其后的差异重建）"""
+    doc = db.query(CollaborationDocument).filter(CollaborationDocument.id == document_id).first()
+    if not doc:
+        raise HTTPException(status_code=404, detail="文档不存在")
+    if not check_document_permission(doc, current_user, "view"):
+        raise HTTPException(status_code=403, detail="无权限查看此文档历史")
+    content = document_saves.reconstruct(db, document_id, version)
+    if content is None:
+        # 只有历史记录中实际落库的版本可查（合并落库的中间版本没有单独记录）
+        raise HTTPException(status_code=404, detail="该版本没有可用的历史记录")
+    return {"version": version, "content": content}
+
+
 @router.get("/documents/{document_id}/online-users")
 async def get_document_online_users(
     document_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取某文档的在线用户列表（基于 Redis TTL 与 DB 心跳兜底）。"""
+    """获取某文档的在线用户列表（Redis 在线 ZSET，Redis 不可用时按会话表心跳兜底）。"""
     # 权限：能看文档的人即可查看在线列表
     doc = db.query(CollaborationDocument).filter(CollaborationDocument.id == document_id).first()
     if not doc:
@@ -1287,54 +1329,27 @@ async def get_document_online_users(
     if not check_document_permission(doc, current_user, "view"):
         raise HTTPException(status_code=403, detail="无权限查看")
 
-    online_map = {}
-    try:
-        r = get_redis()
-        doc_hash = f"presence:doc:{document_id}"
-        entries = r.hgetall(doc_hash) or {}
-        now_ts = int(time.time())
-        for uid, ts in entries.items():
-            try:
-                ts_int = int(ts)
-            except Exception:
-                ts_int = 0
-            online_map[str(uid)] = (now_ts - ts_int) <= PRESENCE_TTL_SECONDS
-    except Exception:
-        online_map = {}
-
-    # DB 兜底：最近心跳 <= TTL 的也算在线
-    threshold = datetime.now() - timedelta(seconds=PRESENCE_TTL_SECONDS)
-    sessions = db.query(CollaborationSession).filter(
-        CollaborationSession.document_id == document_id,
-        CollaborationSession.last_heartbeat != None,
-        CollaborationSession.last_heartbeat >= threshold
-    ).all()
-
-    # 汇总用户信息
-    result = []
-    seen = set()
-    for s in sessions:
-        uid = str(s.user_id)
-        seen.add(uid)
-        result.append({
-            "user_id": uid,
-            "user_name": s.user_name,
-            "is_online": online_map.get(uid, True),
-            "last_heartbeat": s.last_heartbeat.isoformat() if s.last_heartbeat else None
-        })
-
-    # 若 Redis 有而 DB 无，补充在线用户
-    for uid, is_on in online_map.items():
-        if uid not in seen and is_on:
-            user = db.query(User).filter(User.id == uid).first()
-            result.append({
-                "user_id": uid,
-                "user_name": (user.real_name or user.username) if user else uid,
-                "is_online": True,
-                "last_heartbeat": None
-            })
-
-    result.sort(key=lambda x: (not x["is_online"], x["user_name"]))
+    entries = presence_service.online(document_id)
+    if entries is None:
+        entries = _recent_sessions(db, document_id)
+
+    # 一次批量查询补全显示名
+    names = {}
+    user_ids = [e["user_id"] for e in entries]
+    if user_ids:
+        rows = db.query(User.id, User.real_name, User.username).filter(User.id.in_(user_ids)).all()
+        names = {str(uid): (real_name or username) for uid, real_name, username in rows}
+
+    result = [
+        {
+            "user_id": e["user_id"],
+            "user_name": names.get(e["user_id"]) or e["user_name"] or e["user_id"],
+            "is_online": True,
+            "last_heartbeat": e["last_heartbeat"].isoformat() if e["last_heartbeat"] else None
+        }
+        for e in entries
+    ]
+    result.sort(key=lambda x: x["user_name"])
     return {"users": result}
 
 
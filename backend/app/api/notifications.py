@@ -1,7 +1,7 @@
 """
 通知 API
 提供通知的查询、标记已读、删除等功能
-基于 Redis 存储，通知 7 天自动过期
+基于 Redis 存储（Hash + ZSET 索引 + 已读集合），通知按类型 TTL 自动过期
 """
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
@@ -17,26 +17,31 @@ router = APIRouter(prefix="/notifications", tags=["通知"])
 
 @router.get("/")
 def get_notifications(
-    limit: int = Query(50, le=200, description="返回数量限制"),
+    limit: int = Query(50, ge=1, le=200, description="返回数量限制"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的 next_cursor）"),
+    include_read: bool = Query(False, description="是否包含已读通知"),
     current_user = Depends(get_current_user)
 ):
     """
-    获取当前用户的未读通知列表（从 Redis）
-    注意：Redis 中只保存未读通知，读取后自动删除
+    获取当前用户的通知列表（从 Redis，最新的在前）
+    默认只返回未读通知；通过 next_cursor 继续翻页
     """
     try:
-        # 从 Redis 获取未读通知
-        notifications = redis_notification_storage.get_unread_notifications(
+        page = redis_notification_storage.list_notifications(
             user_id=current_user.id,
-            limit=limit
+            limit=limit,
+            cursor=cursor,
+            include_read=include_read
         )
+        notifications = page["notifications"]
         
         logger.info(f"📬 [NotificationAPI] 用户 {current_user.username} 查询通知: count={len(notifications)}")
         
         return {
             "success": True,
             "total": len(notifications),
-            "notifications": notifications
+            "notifications": notifications,
+            "next_cursor": page["next_cursor"]
         }
     except Exception as e:
         logger.error(f"❌ [NotificationAPI] 查询通知失败: {e}", exc_info=True)
@@ -70,7 +75,7 @@ def mark_as_read(
     current_user = Depends(get_current_user)
 ):
     """
-    标记通知为已读（从 Redis 中删除）
+    标记通知为已读
     """
     try:
         success = redis_notification_storage.mark_as_read(
@@ -97,82 +102,80 @@ def mark_all_as_read(
     current_user = Depends(get_current_user)
 ):
     """
-    标记所有通知为已读（清空 Redis 中的通知列表）
+    标记所有通知为已读
     """
     try:
-        # 先获取数量
-        count = redis_notification_storage.get_unread_count(user_id=current_user.id)
+        count = redis_notification_storage.mark_all_as_read(user_id=current_user.id)
         
-        # 标记全部已读（清空列表）
-        success = redis_notification_storage.mark_all_as_read(user_id=current_user.id)
+        if count < 0:
+            raise HTTPException(status_code=503, detail="通知服务不可用")
         
-        if success:
-            logger.info(f"✅ [NotificationAPI] 用户 {current_user.username} 标记全部已读，共 {count} 条")
+        logger.info(f"✅ [NotificationAPI] 用户 {current_user.username} 标记全部已读，共 {count} 条")
         
         return {
             "success": True,
             "message": f"已标记 {count} 条通知为已读",
             "count": count
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ [NotificationAPI] 全部标记已读失败: {e}")
         raise HTTPException(status_code=500, detail=f"标记失败: {str(e)}")
 
 
-@router.delete("/{notification_id}")
-def delete_notification(
-    notification_id: str,
+@router.delete("/clear-read")
+def clear_read_notifications(
     current_user = Depends(get_current_user)
 ):
     """
-    删除通知（从 Redis 中移除）
+    清空所有已读通知
     """
     try:
-        success = redis_notification_storage.delete_notification(
-            user_id=current_user.id,
-            notification_id=notification_id
-        )
+        count = redis_notification_storage.clear_read(user_id=current_user.id)
         
-        if not success:
-            raise HTTPException(status_code=404, detail="通知不存在")
+        if count < 0:
+            raise HTTPException(status_code=503, detail="通知服务不可用")
         
-        logger.info(f"✅ [NotificationAPI] 通知已删除: {notification_id}")
+        logger.info(f"✅ [NotificationAPI] 用户 {current_user.username} 清空通知，共 {count} 条")
         
         return {
             "success": True,
-            "message": "通知已删除"
+            "message": f"已清空 {count} 条通知",
+            "count": count
         }
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"❌ [NotificationAPI] 删除通知失败: {e}")
-        raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
+        logger.error(f"❌ [NotificationAPI] 清空通知失败: {e}")
+        raise HTTPException(status_code=500, detail=f"清空失败: {str(e)}")
 
 
-@router.delete("/clear-read")
-def clear_read_notifications(
+@router.delete("/{notification_id}")
+def delete_notification(
+    notification_id: str,
     current_user = Depends(get_current_user)
 ):
     """
-    清空所有已读通知
-    注意：在 Redis 实现中，读取后的通知会自动删除，此接口等同于 mark_all_as_read
+    删除通知（从 Redis 中移除）
     """
     try:
-        # 先获取数量
-        count = redis_notification_storage.get_unread_count(user_id=current_user.id)
+        success = redis_notification_storage.delete_notification(
+            user_id=current_user.id,
+            notification_id=notification_id
+        )
         
-        # 清空所有通知
-        success = redis_notification_storage.mark_all_as_read(user_id=current_user.id)
+        if not success:
+            raise HTTPException(status_code=404, detail="通知不存在")
         
-        if success:
-            logger.info(f"✅ [NotificationAPI] 用户 {current_user.username} 清空通知，共 {count} 条")
+        logger.info(f"✅ [NotificationAPI] 通知已删除: {notification_id}")
         
         return {
             "success": True,
-            "message": f"已清空 {count} 条通知",
-            "count": count
+            "message": "通知已删除"
         }
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"❌ [NotificationAPI] 清空通知失败: {e}")
-        raise HTTPException(status_code=500, detail=f"清空失败: {str(e)}")
-
+        logger.error(f"❌ [NotificationAPI] 删除通知失败: {e}")
+        raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
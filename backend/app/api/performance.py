@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
@@ -9,6 +9,7 @@ from app.utils.security import get_current_user, get_current_admin_user
 from app.utils.permissions import require_permission
 from app.services.performance_service import performance_service
 from app.services.stats_cache_service import stats_cache_service
+from app.services.project_counter_service import project_counter_service
 import logging
 
 # 配置日志
@@ -160,27 +161,68 @@ def get_project_stats(
     stats = performance_service.calculate_project_stats(db, project_id)
     
     # 写入缓存
-    stats_dict = stats.dict() if hasattr(stats, 'dict') else stats
+    stats_dict = ProjectStatsResponse.model_validate(stats).model_dump(mode="json")
     stats_cache_service.set_project_stats(project_id, stats_dict)
     logger.info(f"💾 [PerformanceAPI] 项目统计已缓存: {project_id}")
     
     return stats
 
+@router.get("/batch")
+def get_batch_performance(
+    period: str = "monthly",
+    user_ids: List[str] = Query(default=[]),
+    project_ids: List[str] = Query(default=[]),
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission("TeamPerformance"))
+):
+    """
+    批量计算绩效与项目统计（需菜单权限 TeamPerformance）
+    
+    - user_ids / project_ids 可重复传参；两者都为空时计算所有在职用户的绩效
+    - 用户与项目各自只执行一条聚合查询，团队看板无需逐人请求
+    """
+    from app.models.user import User
+    
+    if not user_ids and not project_ids:
+        user_ids = [uid for (uid,) in db.query(User.id).filter(User.status == "active").all()]
+    
+    users_data = performance_service.calculate_users_performance(db, user_ids, period) if user_ids else {}
+    projects_data = {
+        project_id: ProjectStatsResponse.model_validate(stats).model_dump(mode="json")
+        for project_id, stats in performance_service.calculate_projects_stats(db, project_ids).items()
+    } if project_ids else {}
+    
+    # 绩效记录已重算，清除对应周期的团队绩效缓存
+    if users_data:
+        stats_cache_service.invalidate_performance_stats(period=period)
+    
+    logger.info(f"✅ [PerformanceAPI] 批量统计完成: 用户 {len(users_data)} 个, 项目 {len(projects_data)} 个")
+    return {
+        "code": 200,
+        "msg": "成功",
+        "data": {
+            "period": period,
+            "users": users_data,
+            "projects": projects_data
+        }
+    }
+
 @router.get("/dashboard")
 def get_dashboard_data(
     db: Session = Depends(get_db),
     current_user = Depends(require_permission("ProjectDashboard"))
 ):
     """获取仪表板数据（需菜单权限 ProjectDashboard，带缓存）"""
+    # 读取缓存；统计失效后的并发请求只有一个执行聚合查询
+    return stats_cache_service.get_or_compute_dashboard_stats(
+        lambda: _compute_dashboard_data(db)
+    )
+
+def _compute_dashboard_data(db: Session) -> dict:
+    """计算仪表板统计数据（缓存未命中时执行）"""
     from app.models.task import Task
     from app.models.user import User
     
-    # 尝试从缓存获取
-    cached_dashboard = stats_cache_service.get_dashboard_stats()
-    if cached_dashboard:
-        logger.info("🎯 [PerformanceAPI] 仪表板统计缓存命中")
-        return cached_dashboard
-    
     # 基础统计
     total_projects = db.query(Project).count()
     active_projects = db.query(Project).filter(Project.status == "active").count()
@@ -189,13 +231,14 @@ def get_dashboard_data(
     completed_tasks = db.query(Task).filter(Task.status.in_(["submitted", "approved"])).count()
     total_users = db.query(User).count()
     
-    # 项目进度
+    # 项目进度（读取按状态维护的任务计数，一次查询覆盖所有项目）
     projects = db.query(Project).all()
+    counts_by_project = project_counter_service.get_all_status_counts(db)
     project_progress = []
     for project in projects:
-        project_tasks = db.query(Task).filter(Task.project_id == project.id).all()
-        total_project_tasks = len(project_tasks)
-        completed_project_tasks = len([t for t in project_tasks if t.status in ["submitted", "approved"]])
+        status_counts = counts_by_project.get(project.id, {})
+        total_project_tasks = sum(status_counts.values())
+        completed_project_tasks = status_counts.get("submitted", 0) + status_counts.get("approved", 0)
         completion_rate = (completed_project_tasks / total_project_tasks * 100) if total_project_tasks > 0 else 0
         
         project_progress.append({
@@ -216,8 +259,5 @@ def get_dashboard_data(
         "project_progress": project_progress
     }
     
-    # 写入缓存
-    stats_cache_service.set_dashboard_stats(dashboard_data)
-    logger.info("💾 [PerformanceAPI] 仪表板统计已缓存")
-    
-    return dashboard_data 
\ No newline at end of file
+    logger.info("📊 [PerformanceAPI] 仪表板统计已重新计算")
+    return dashboard_data
@@ -9,6 +9,7 @@ from app.utils.permissions import require_permission
 from datetime import datetime
 from app.utils.datetime_utils import utc_now
 from app.services.cache_service import cache_service
+from app.services.project_counter_service import project_counter_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -207,7 +208,7 @@ def update_project(
     cache_service.invalidate_projects_cache()
     cache_service.invalidate_project_detail_cache(project_id)
     # 项目更新可能影响任务列表，也清除任务缓存
-    cache_service.invalidate_tasks_cache(project_id)
+    cache_service.invalidate_tasks_cache()
     
     logger.info(f"✅ [ProjectAPI] 更新后状态（提交后）: {project.status}")
     logger.info(f"✅ [ProjectAPI] 项目更新成功: {project_id}")
@@ -231,7 +232,7 @@ def delete_project(
     # ✅ 清除缓存
     cache_service.invalidate_projects_cache()
     cache_service.invalidate_project_detail_cache(project_id)
-    cache_service.invalidate_tasks_cache(project_id)
+    cache_service.invalidate_tasks_cache()
     
     return {"message": "项目删除成功"}
 
@@ -258,18 +259,17 @@ def get_project_stats(
     if not project:
         raise HTTPException(status_code=404, detail="项目不存在")
     
-    # 查询该项目的所有任务（不过滤完结项目）
-    from app.models.task import Task
-    tasks = db.query(Task).filter(Task.project_id == project_id).all()
+    # 读取按状态维护的任务计数（不过滤完结项目，无需扫描任务表）
+    status_counts = project_counter_service.get_status_counts(db, project_id)
     
     # 统计任务状态
-    total = len(tasks)
-    pending = len([t for t in tasks if t.status == 'pending'])
-    in_progress = len([t for t in tasks if t.status == 'in_progress'])
-    submitted = len([t for t in tasks if t.status == 'submitted'])
-    approved = len([t for t in tasks if t.status == 'approved'])
-    rejected = len([t for t in tasks if t.status == 'rejected'])
-    skipped = len([t for t in tasks if t.status == 'skipped'])
+    total = sum(status_counts.values())
+    pending = status_counts.get('pending', 0)
+    in_progress = status_counts.get('in_progress', 0)
+    submitted = status_counts.get('submitted', 0)
+    approved = status_counts.get('approved', 0)
+    rejected = status_counts.get('rejected', 0)
+    skipped = status_counts.get('skipped', 0)
     
     # 计算完成率
     completion_rate = round((approved / total * 100) if total > 0 else 0, 2)
@@ -291,7 +291,7 @@ def get_project_stats(
     }
     
     # 写入缓存（10分钟）
-    cache_service.set(cache_key, result, expire=600)
+    cache_service.set(cache_key, result, expire=600, tags=["projects"])
     logger.debug(f"💾 项目统计写入缓存: {project_id}")
     
     return result
@@ -6,6 +6,7 @@ from app.schemas.role import RoleCreate, RoleUpdate, RoleResponse
 from app.models.role import Role
 from app.utils.security import get_current_admin_user, get_current_user
 from app.utils.permissions import require_permission
+from app.utils.permission_registry import permission_registry
 from app.models.user import User
 
 # 添加redirect_slashes=False避免重定向问题
@@ -83,6 +84,7 @@ def create_role(
     
     db.add(db_role)
     db.commit()
+    permission_registry.reload(db)
     db.refresh(db_role)
     return {
         "code": 200,
@@ -125,6 +127,7 @@ def update_role(
         setattr(role, field, value)
     
     db.commit()
+    permission_registry.reload(db)
     db.refresh(role)
     return {
         "code": 200,
@@ -160,6 +163,7 @@ def update_role_permissions(
         raise HTTPException(status_code=400, detail="permissions 应为数组")
     role.permissions = json.dumps(perms, ensure_ascii=False)
     db.commit()
+    permission_registry.reload(db)
     db.refresh(role)
     return { "code": 200, "msg": "权限已更新", "data": perms }
 
@@ -186,6 +190,7 @@ def delete_role(
     
     db.delete(role)
     db.commit()
+    permission_registry.reload(db)
     return {
         "code": 200,
         "msg": "角色删除成功",
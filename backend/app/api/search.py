@@ -0,0 +1,66 @@
+"""
+全文搜索 API
+统一搜索文章与协作文档，按相关度排序并返回高亮摘要
+"""
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+from typing import Optional
+import logging
+
+from app.database import get_db
+from app.utils.security import get_current_user
+from app.models.user import User
+from app.models.article import Article
+from app.models.collaboration import CollaborationDocument, DocumentCollaborator
+from app.models.search import SearchEntry
+from app.api.articles import _article_access_filter
+from app.services.search_service import search_service, ENTITY_ARTICLE, ENTITY_DOCUMENT
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/search", tags=["全文搜索"])
+
+
+def _visibility(current_user: User, entity_type: Optional[str]) -> dict:
+    """各实体类型的可见性条件（关联 SearchEntry.entity_id，源记录已删除的索引条目同时被排除）"""
+    is_admin = current_user.role == 'admin'
+    visibility = {}
+    if entity_type in (None, ENTITY_ARTICLE):
+        condition = Article.id == SearchEntry.entity_id
+        if not is_admin:
+            condition = condition & _article_access_filter(current_user)
+        visibility[ENTITY_ARTICLE] = exists().where(condition)
+    if entity_type in (None, ENTITY_DOCUMENT):
+        condition = CollaborationDocument.id == SearchEntry.entity_id
+        if not is_admin:
+            condition = condition & (
+                (CollaborationDocument.owner_id == current_user.id)
+                | CollaborationDocument.collaborators.any(DocumentCollaborator.user_id == current_user.id)
+            )
+        visibility[ENTITY_DOCUMENT] = exists().where(condition)
+    return visibility
+
+
+@router.get("/")
+def search(
+    q: str = Query(..., min_length=1, max_length=200, description="搜索关键词（多个词之间为 AND）"),
+    type: Optional[str] = Query(None, pattern="^(article|document)$", description="只搜索某类内容"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    搜索文章与协作文档
+    标题命中权重高于正文；title_highlight/snippet 为已转义的 HTML，命中处用 <mark> 标注
+    """
+    try:
+        result = search_service.search(
+            db, q, _visibility(current_user, type), page=page, page_size=page_size
+        )
+        logger.info(f"🔍 [SearchAPI] 用户 {current_user.username} 搜索 '{q}': total={result['total']}")
+        return {"query": q, **result}
+    except Exception as e:
+        logger.error(f"❌ [SearchAPI] 搜索失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
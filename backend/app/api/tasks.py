@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, UploadFile, File, Form, Request
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.orm.attributes import flag_modified
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
+import base64
+import json
 from app.utils.datetime_utils import utc_now
 from app.database import get_db
 from app.schemas.task import TaskCreate, TaskUpdate, TaskResponse, TaskSubmit, TaskReview, TaskSkip, TaskSkipRequest, TaskSkipReview
@@ -15,8 +18,8 @@ from app.utils.permissions import require_permission
 from app.services.performance_service import performance_service
 from app.services.notification_ws import manager as ws_manager
 from app.services.stats_cache_service import stats_cache_service
-import io
-import csv
+from app.services.project_counter_service import project_counter_service
+from app.services.task_import_service import task_import_service, SUPPORTED_EXTENSIONS
 try:
     import openpyxl  # xlsx
 except Exception:
@@ -28,51 +31,13 @@ except Exception:
 from app.utils.audit_logger import audit_logger
 import logging
 from app.services.cache_service import cache_service
+from app.utils.http_cache import cached_json_response
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# ========== 工具函数 ==========
-
-def update_project_stats(db: Session, project_id: str):
-    """
-    更新项目的统计字段
-    - total_tasks: 项目总任务数
-    - assigned_tasks: 已分配任务数
-    - completed_tasks: 已完成任务数（approved状态）
-    """
-    try:
-        logger.info(f"📊 [ProjectStats] 开始更新项目统计: {project_id}")
-        
-        # 查询项目
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
-            logger.warning(f"⚠️ [ProjectStats] 项目不存在: {project_id}")
-            return
-        
-        # 查询该项目的所有任务
-        tasks = db.query(Task).filter(Task.project_id == project_id).all()
-        
-        # 统计
-        total = len(tasks)
-        assigned = len([t for t in tasks if t.assigned_to is not None])
-        completed = len([t for t in tasks if t.status == 'approved'])
-        
-        # 更新项目字段
-        project.total_tasks = total
-        project.assigned_tasks = assigned
-        project.completed_tasks = completed
-        
-        logger.info(f"✅ [ProjectStats] 项目统计已更新: {project_id} | 总数:{total} 已分配:{assigned} 已完成:{completed}")
-        
-        # 不在这里commit，让调用者决定何时commit
-        
-    except Exception as e:
-        logger.error(f"❌ [ProjectStats] 更新项目统计失败: {project_id} | 错误: {e}")
-        raise
-
 @router.post("/init-test-data")
 def init_test_data(
     db: Session = Depends(get_db),
@@ -129,6 +94,7 @@ def init_test_data(
     
     for task in test_tasks:
         db.add(task)
+    project_counter_service.record_created(db, test_tasks)
     
     db.commit()
     
@@ -170,22 +136,15 @@ def create_task(
     )
     db.add(db_task)
     
-    # ✅ 更新项目统计字段
-    if task_data.project_id:
-        try:
-            update_project_stats(db, task_data.project_id)
-        except Exception as e:
-            logger.error(f"❌ [TaskAPI] 更新项目统计失败: {e}")
+    # ✅ 增量更新项目任务计数（与任务创建在同一事务内提交）
+    project_counter_service.record_task_change(db, db_task)
     
     db.commit()
     db.refresh(db_task)
 
-    # ✅ 清除缓存（三重清除策略）
-    # 1. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task_data.project_id)
-    # 2. 清除跨项目的任务缓存（任务池可能查看所有项目）
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 3. 清除项目详情
+    # 清除项目详情
     cache_service.invalidate_project_detail_cache(task_data.project_id)
     # 清除统计缓存
     stats_cache_service.invalidate_dashboard_stats()
@@ -195,33 +154,111 @@ def create_task(
     logger.info(f"✅ [TaskAPI] 任务创建缓存已清除: project={task_data.project_id}, 所有视图已刷新")
     return db_task
 
-@router.get("/", include_in_schema=True)
-def get_tasks(
-    project_id: Optional[str] = None,
-    status: Optional[str] = None,
-    assigned_to: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100,
-    include_completed_projects: bool = False,  # ✅ 新增：是否包含完结项目的任务
-    db: Session = Depends(get_db),
-    current_user = Depends(require_permission(["TaskPool", "ProjectManagement"]))  # 允许TaskPool或ProjectManagement权限
-):
-    """获取任务列表（带Redis缓存）"""
-    logger.info(f"📋 [TaskAPI] 获取任务列表 - 用户: {current_user.username}, 角色: {current_user.role}, ID: {current_user.id}")
-    logger.info(f"📋 [TaskAPI] 查询参数 - project_id: {project_id}, status: {status}, assigned_to: {assigned_to}, skip: {skip}, limit: {limit}, include_completed_projects: {include_completed_projects}")
-    
-    # 生成缓存key
-    cache_key = f"tasks:list:{project_id or 'all'}:{status or 'all'}:{assigned_to or 'all'}:{skip}:{limit}:{include_completed_projects}"
+# 任务列表的计数方式：exact 精确 COUNT，estimate 取查询计划的估算行数，none 不计数
+TASK_COUNT_MODES = ("exact", "estimate", "none")
+
+def _encode_task_cursor(created_at: datetime, task_id: str) -> str:
+    """把 (created_at, id) 编码为不透明的游标字符串"""
+    raw = json.dumps([created_at.isoformat(), task_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_task_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析游标字符串，格式非法时抛出 400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, task_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(task_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+def _estimate_query_count(db: Session, query) -> int:
+    """
+    估算查询结果行数
     
-    # 尝试从缓存获取
-    cached_data = cache_service.get(cache_key)
-    if cached_data:
-        logger.info(f"🎯 任务列表缓存命中: {cache_key}")
-        return cached_data
+    PostgreSQL 下读取 EXPLAIN 的计划行数，开销与结果集大小无关；
+    其他数据库或估算失败时退回精确 COUNT。
+    """
+    if db.bind.dialect.name != "postgresql":
+        return query.count()
+    try:
+        # 以驱动参数执行编译后的语句：不内联字面量，也不经 text() 二次解析冒号
+        compiled = query.statement.compile(dialect=db.bind.dialect, compile_kwargs={"render_postcompile": True})
+        params = compiled.params
+        if compiled.positiontup is not None:
+            params = tuple(params[name] for name in compiled.positiontup)
+        plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning(f"⚠️ [TaskAPI] 估算任务总数失败，改用精确计数: {e}")
+        return query.count()
+
+# 任务列表视图：full 兼容旧结构（含附件与时间线），list 只加载列表列
+TASK_LIST_VIEWS = ("full", "list")
+
+# list 视图只投影这些列，不读取 annotation_data / timeline 等大JSON列
+_TASK_LIST_COLUMNS = (
+    Task.id,
+    Task.title,
+    Task.description,
+    Task.project_id,
+    Task.status,
+    Task.priority,
+    Task.assigned_to,
+    Task.assigned_to_name,
+    Task.created_by,
+    Task.created_by_name,
+    Task.image_url,
+    Task.score,
+    Task.assigned_at,
+    Task.submitted_at,
+    Task.reviewed_by,
+    Task.reviewed_by_name,
+    Task.reviewed_at,
+    Task.review_comment,
+    Task.created_at,
+    Task.updated_at,
+)
+
+def _count_task_attachments(db: Session, task_ids: List[str]) -> dict:
+    """批量统计附件数量（单条 GROUP BY 查询，避免逐行懒加载）"""
+    if not task_ids:
+        return {}
+    rows = db.query(TaskAttachment.task_id, func.count(TaskAttachment.id)).filter(
+        TaskAttachment.task_id.in_(task_ids)
+    ).group_by(TaskAttachment.task_id).all()
+    return {task_id: count for task_id, count in rows}
+
+def _query_task_list(
+    db: Session,
+    project_id: Optional[str],
+    status: Optional[str],
+    assigned_to: Optional[str],
+    skip: int,
+    limit: int,
+    include_completed_projects: bool,
+    cursor: Optional[Tuple[datetime, str]] = None,
+    use_cursor: bool = False,
+    count_mode: str = "exact",
+    view: str = "full"
+) -> dict:
+    """
+    查询任务列表（缓存未命中时执行）
     
-    # 使用join查询以包含项目信息
-    from app.models.project import Project
-    query = db.query(Task).join(Project, Task.project_id == Project.id)
+    use_cursor 为真时按 (created_at, id) 倒序做键集分页，
+    cursor 为上一页最后一条的 (created_at, id)，每页开销与页码无关。
+    view=list 时只投影列表列并返回 attachment_count，
+    标注数据与时间线只由详情接口返回。
+    """
+    # 项目名称在同一条SELECT中JOIN取出，不再逐行访问 task.project
+    project_name = Project.name.label("project_name")
+    if view == "list":
+        query = db.query(*_TASK_LIST_COLUMNS, project_name)
+    else:
+        # 附件用 selectinload 一次性批量加载，避免 N+1
+        query = db.query(Task, project_name).options(selectinload(Task.attachments))
+    query = query.select_from(Task).join(Project, Task.project_id == Project.id)
     
     # ✅ 根据参数决定是否过滤完结项目的任务
     if not include_completed_projects:
@@ -243,62 +280,155 @@ def get_tasks(
     if assigned_to:
         query = query.filter(Task.assigned_to == assigned_to)
     
-    # 统一权限管理：通过菜单权限控制，不再硬编码角色检查
-    # 如果用户能访问 TaskPool，就能查看所有任务数据
-    logger.info(f"🔐 [TaskAPI] 统一权限管理 - 用户: {current_user.username}, 角色: {current_user.role}")
-    logger.info(f"✅ [TaskAPI] 用户已通过 TaskPool 权限验证，可查看所有任务数据")
-    
     # 执行查询前记录SQL
-    total_tasks = query.count()
-    logger.info(f"📊 [TaskAPI] 权限过滤后的任务总数: {total_tasks}")
-    
-    tasks = query.offset(skip).limit(limit).all()
-    logger.info(f"✅ [TaskAPI] 返回任务数量: {len(tasks)} / 总数: {total_tasks}")
-    
-    # 为每个任务设置项目名称
-    task_responses = []
-    for task in tasks:
-        task_dict = {
-            "id": task.id,
-            "title": task.title,
-            "description": task.description,
-            "project_id": task.project_id,
-            "project_name": task.project.name if task.project else "未知项目",
-            "status": task.status,
-            "priority": task.priority,
-            "assigned_to": task.assigned_to,
-            "assigned_to_name": getattr(task, 'assigned_to_name', None),
-            "created_by": task.created_by,
-            "created_by_name": getattr(task, 'created_by_name', None),
-            "image_url": task.image_url,
-            "annotation_data": task.annotation_data,
-            "score": task.score,
-            "assigned_at": task.assigned_at,
-            "submitted_at": task.submitted_at,
-            "reviewed_by": task.reviewed_by,
-            "reviewed_by_name": getattr(task, 'reviewed_by_name', None),
-            "reviewed_at": task.reviewed_at,
-            "review_comment": task.review_comment,
-            "created_at": task.created_at,
-            "updated_at": task.updated_at,
-            "attachments": task.attachments or [],
-            "timeline": task.timeline or []
-        }
-        task_responses.append(task_dict)
+    if count_mode == "exact":
+        total_tasks = query.count()
+    elif count_mode == "estimate":
+        total_tasks = _estimate_query_count(db, query)
+    else:
+        total_tasks = None
+    logger.info(f"📊 [TaskAPI] 权限过滤后的任务总数: {total_tasks} (计数方式: {count_mode})")
+    
+    next_cursor = None
+    if use_cursor:
+        # 键集分页：沿 created_at 索引倒序定位，多取一条判断是否还有下一页
+        query = query.order_by(Task.created_at.desc(), Task.id.desc())
+        if cursor:
+            query = query.filter(tuple_(Task.created_at, Task.id) < tuple_(*cursor))
+        rows = query.limit(limit + 1).all()
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1] if view == "list" else rows[-1][0]
+            next_cursor = _encode_task_cursor(last.created_at, last.id)
+    else:
+        rows = query.offset(skip).limit(limit).all()
+    logger.info(f"✅ [TaskAPI] 返回任务数量: {len(rows)} / 总数: {total_tasks}")
+    
+    if view == "list":
+        attachment_counts = _count_task_attachments(db, [row.id for row in rows])
+        task_responses = []
+        for row in rows:
+            task_dict = dict(row._mapping)
+            task_dict["project_name"] = task_dict["project_name"] or "未知项目"
+            task_dict["attachment_count"] = attachment_counts.get(row.id, 0)
+            task_responses.append(task_dict)
+    else:
+        task_responses = [_build_full_task_dict(task, name) for task, name in rows]
     
     # 记录返回的任务详情（仅前3个）
     for i, task_dict in enumerate(task_responses[:3]):
         logger.info(f"📄 [TaskAPI] 任务 {i+1}: ID={task_dict['id']}, 标题={task_dict['title']}, 项目={task_dict['project_name']}, 创建者={task_dict['created_by']}, 分配给={task_dict['assigned_to']}, 状态={task_dict['status']}")
     
-    # 构建响应
+    # 构建分页结构
     result = {"list": task_responses, "total": total_tasks}
+    if use_cursor:
+        result["next_cursor"] = next_cursor
+        result["total_is_estimate"] = count_mode == "estimate"
+    return result
+
+def _build_full_task_dict(task: Task, project_name: Optional[str]) -> dict:
+    """full 视图：保持旧版列表结构（含附件、时间线与标注数据）"""
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "project_id": task.project_id,
+        "project_name": project_name or "未知项目",
+        "status": task.status,
+        "priority": task.priority,
+        "assigned_to": task.assigned_to,
+        "assigned_to_name": getattr(task, 'assigned_to_name', None),
+        "created_by": task.created_by,
+        "created_by_name": getattr(task, 'created_by_name', None),
+        "image_url": task.image_url,
+        "annotation_data": task.annotation_data,
+        "score": task.score,
+        "assigned_at": task.assigned_at,
+        "submitted_at": task.submitted_at,
+        "reviewed_by": task.reviewed_by,
+        "reviewed_by_name": getattr(task, 'reviewed_by_name', None),
+        "reviewed_at": task.reviewed_at,
+        "review_comment": task.review_comment,
+        "created_at": task.created_at,
+        "updated_at": task.updated_at,
+        "attachments": [
+            {
+                "id": attachment.id,
+                "file_name": attachment.file_name,
+                "file_url": attachment.file_url,
+                "file_size": attachment.file_size,
+                "file_type": attachment.file_type,
+                "attachment_type": attachment.attachment_type,
+                "created_at": attachment.created_at,
+            }
+            for attachment in task.attachments or []
+        ],
+        "timeline": task.timeline or []
+    }
+
+@router.get("/", include_in_schema=True)
+def get_tasks(
+    request: Request,
+    project_id: Optional[str] = None,
+    status: Optional[str] = None,
+    assigned_to: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    include_completed_projects: bool = False,  # ✅ 新增：是否包含完结项目的任务
+    cursor: Optional[str] = None,  # 游标分页：首页传空字符串，之后传上一页返回的 next_cursor
+    count: Optional[str] = None,  # 计数方式：exact / estimate / none，游标分页默认 estimate
+    view: str = "full",  # 返回视图：full（兼容旧结构）/ list（仅列表列 + 附件数量）
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(["TaskPool", "ProjectManagement"]))  # 允许TaskPool或ProjectManagement权限
+):
+    """
+    获取任务列表（带Redis缓存，支持 ETag/304）
     
-    # 写入缓存（5分钟）
-    cache_service.set(cache_key, result, expire=300)
-    logger.info(f"💾 任务列表写入缓存: {cache_key}")
+    - 默认 skip/limit 偏移分页，返回精确总数
+    - 传入 cursor 时按 (created_at, id) 倒序键集分页，返回 next_cursor，
+      深页与首页开销相同；总数默认取查询计划估算值
+    - view=list 只查询列表列，不返回 annotation_data / timeline / attachments，
+      改为返回 attachment_count；完整数据请使用详情接口
+    """
+    logger.info(f"📋 [TaskAPI] 获取任务列表 - 用户: {current_user.username}, 角色: {current_user.role}, ID: {current_user.id}")
+    logger.info(f"📋 [TaskAPI] 查询参数 - project_id: {project_id}, status: {status}, assigned_to: {assigned_to}, skip: {skip}, limit: {limit}, include_completed_projects: {include_completed_projects}")
     
-    # 返回分页结构
-    return result
+    # 统一权限管理：通过菜单权限控制，不再硬编码角色检查
+    # 如果用户能访问 TaskPool，就能查看所有任务数据
+    logger.info(f"🔐 [TaskAPI] 统一权限管理 - 用户: {current_user.username}, 角色: {current_user.role}")
+    
+    use_cursor = cursor is not None
+    count_mode = count or ("estimate" if use_cursor else "exact")
+    if count_mode not in TASK_COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count 参数仅支持: {', '.join(TASK_COUNT_MODES)}")
+    if view not in TASK_LIST_VIEWS:
+        raise HTTPException(status_code=400, detail=f"view 参数仅支持: {', '.join(TASK_LIST_VIEWS)}")
+    cursor_position = _decode_task_cursor(cursor) if cursor else None
+    
+    # 生成缓存key（嵌入命名空间代数，写操作只需递增代数即可使其失效）
+    variant_parts = []
+    if use_cursor:
+        variant_parts.append(f"cursor={cursor}")
+    if use_cursor or count_mode != "exact":
+        variant_parts.append(f"count={count_mode}")
+    if view != "full":
+        variant_parts.append(f"view={view}")
+    variant = ":".join(variant_parts)
+    cache_key = cache_service.task_list_cache_key(
+        project_id, status, assigned_to, 0 if use_cursor else skip, limit, include_completed_projects, variant
+    )
+    
+    # 读取缓存；命中时直接返回Redis中的JSON字节（带ETag，客户端可得到304）
+    # 未命中时同一时刻只有一个请求执行查询，其余请求等待结果或使用旧值
+    return cached_json_response(
+        request,
+        cache_key,
+        lambda: _query_task_list(
+            db, project_id, status, assigned_to, skip, limit, include_completed_projects,
+            cursor=cursor_position, use_cursor=use_cursor, count_mode=count_mode, view=view
+        ),
+        expire=300
+    )
 
 @router.get("/{task_id}", response_model=TaskResponse)
 def get_task(
@@ -346,7 +476,7 @@ def claim_task(
     """领取任务"""
     logger.info(f"📦 [TaskAPI] 用户领取任务: {current_user.username} -> {task_id}")
     
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if not task:
         logger.warning(f"❌ [TaskAPI] 任务不存在: {task_id}")
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -400,23 +530,14 @@ def claim_task(
     task.timeline = events
     flag_modified(task, 'timeline')  # 明确告诉SQLAlchemy字段已修改
     
-    # ✅ 更新项目统计字段
-    if task.project_id:
-        try:
-            update_project_stats(db, task.project_id)
-        except Exception as e:
-            logger.error(f"❌ [TaskAPI] 更新项目统计失败: {e}")
+    # ✅ 增量更新项目任务计数（与状态变更在同一事务内提交）
+    project_counter_service.record_task_change(db, task)
     
     db.commit()
     
-    # ✅ 清除缓存（重要：三重清除策略）
-    # 1. 清除领取者的任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id, current_user.id)
-    # 2. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id)
-    # 3. 清除跨项目的任务缓存（任务池可能查看所有项目）
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 4. 清除任务详情
+    # 清除任务详情
     cache_service.invalidate_task_detail_cache(task_id)
     cache_service.invalidate_project_detail_cache(task.project_id)
     
@@ -444,7 +565,7 @@ async def submit_task(
     # 详细记录接收到的数据
     logger.info(f"📋 [TaskAPI] TaskSubmit数据: annotation_data={task_submit.annotation_data}, comment={task_submit.comment}, organ_count={task_submit.organ_count}")
     
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if not task:
         logger.warning(f"❌ [TaskAPI] 任务不存在: {task_id}")
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -478,16 +599,14 @@ async def submit_task(
     task.timeline = events
     flag_modified(task, 'timeline')  # 明确告诉SQLAlchemy字段已修改
     
+    # ✅ 增量更新项目任务计数（与状态变更在同一事务内提交）
+    project_counter_service.record_task_change(db, task)
+    
     db.commit()
     
-    # ✅ 清除缓存（重要：三重清除策略）
-    # 1. 清除提交者的任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id, current_user.id)
-    # 2. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id)
-    # 3. 清除跨项目的任务缓存（审核员可能查看所有项目）
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 4. 清除任务详情
+    # 清除任务详情
     cache_service.invalidate_task_detail_cache(task_id)
     # 清除统计缓存
     stats_cache_service.invalidate_performance_stats(current_user.id)
@@ -561,153 +680,54 @@ async def upload_annotation_images(
 
 @router.post("/import")
 async def import_tasks(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     project_id: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
     current_user = Depends(require_permission("TaskPool"))
 ):
     """批量导入任务，支持 .xlsx/.xls/.csv
     期望列：title, description, priority, image_url, estimated_hours，可选 assigned_to, project_id
     如果未提供 project_id 字段，则使用表单中的 project_id
+    
+    文件落盘后立即返回 job_id，导入在后台流式执行，
+    通过 GET /tasks/import/{job_id} 查询进度与结果
     """
     filename = (file.filename or "").lower()
-    if not (filename.endswith(".xlsx") or filename.endswith(".xls") or filename.endswith(".csv")):
+    if not filename.endswith(SUPPORTED_EXTENSIONS):
         raise HTTPException(status_code=400, detail="仅支持xlsx/xls/csv 文件")
+    if (filename.endswith(".xlsx") and not openpyxl) or (filename.endswith(".xls") and not xlrd):
+        raise HTTPException(status_code=500, detail="服务器缺少Excel解析依赖，请安装openpyxl/xlrd")
 
     try:
-        content = await file.read()
-        rows = []
-
-        if filename.endswith(".csv"):
-            # 尝试多种编码（Windows下Excel常用GBK）
-            decoded_text: str
-            try:
-                decoded_text = content.decode("utf-8-sig")
-            except Exception:
-                try:
-                    decoded_text = content.decode("gbk")
-                except Exception:
-                    decoded_text = content.decode("latin1")
-            text_stream = io.StringIO(decoded_text)
-            reader = csv.DictReader(text_stream)
-            for row in reader:
-                rows.append({(k or '').strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items()})
-        elif filename.endswith(".xlsx") and openpyxl:
-            wb = openpyxl.load_workbook(io.BytesIO(content))
-            ws = wb.active
-            header_cells = next(ws.iter_rows(min_row=1, max_row=1))
-            headers = [str(c.value).strip() if c.value is not None else '' for c in header_cells]
-            for r in ws.iter_rows(min_row=2, values_only=True):
-                row = {headers[i]: (str(r[i]).strip() if r[i] is not None else '') for i in range(len(headers))}
-                rows.append(row)
-        elif filename.endswith(".xls") and xlrd:
-            book = xlrd.open_workbook(file_contents=content)
-            sheet = book.sheet_by_index(0)
-            headers = [str(sheet.cell_value(0, c)).strip() for c in range(sheet.ncols)]
-            for r in range(1, sheet.nrows):
-                row = {headers[c]: str(sheet.cell_value(r, c)).strip() for c in range(sheet.ncols)}
-                rows.append(row)
-        else:
-            raise HTTPException(status_code=500, detail="服务器缺少Excel解析依赖，请安装openpyxl/xlrd")
-
-        created = 0
-        errors = []
-
-        def pick(row: dict, names):
-            for n in names:
-                if n in row and str(row[n]).strip() != '':
-                    return str(row[n]).strip()
-            lower = {k.lower(): v for k, v in row.items()}
-            for n in names:
-                if n.lower() in lower and str(lower[n.lower()]).strip() != '':
-                    return str(lower[n.lower()]).strip()
-            return None
-
-        for idx, row in enumerate(rows, start=2):
-            try:
-                title = pick(row, ["title", "任务标题", "名称"]) or ''
-                if not title:
-                    errors.append(f"第{idx}行缺少任务标题")
-                    continue
-                description = pick(row, ["description", "任务描述"]) or ''
-                priority = pick(row, ["priority", "优先级"]) or 'medium'
-                # 兼容中文优先级
-                priority_map = {
-                    '低': 'low', 'low': 'low',
-                    '中': 'medium', '中等': 'medium', 'medium': 'medium',
-                    '高': 'high', 'high': 'high',
-                    '紧急': 'urgent', 'urgent': 'urgent'
-                }
-                priority = priority_map.get(priority, priority)
-                image_url = pick(row, ["image_url", "影像URL", "影像链接", "图片链接"]) or None
-                est_hours_raw = pick(row, ["estimated_hours", "预计工时"]) or '0'
-                try:
-                    estimated_hours = float(est_hours_raw)
-                except Exception:
-                    estimated_hours = 0.0
-                assigned_to = pick(row, ["assigned_to", "标注员ID"]) or None
-
-                project_id_value = project_id or pick(row, ["project_id", "项目ID"]) or None
-                if not project_id_value:
-                    errors.append(f"第{idx}行缺少项目ID（请在弹窗选择项目或在文件中提供project_id）")
-                    continue
-
-                project = db.query(Project).filter(Project.id == project_id_value).first()
-                if not project:
-                    errors.append(f"第{idx}行项目不存在: {project_id_value}")
-                    continue
-
-                task = Task(
-                    title=title,
-                    description=description,
-                    project_id=project_id_value,
-                    priority=priority if priority in ["low", "medium", "high", "urgent"] else "medium",
-                    status='pending',
-                    created_by=current_user.id,
-                )
-                if image_url:
-                    task.image_url = image_url
-                task.annotation_data = {"estimated_hours": estimated_hours}
-                if assigned_to:
-                    user = db.query(User).filter(User.id == assigned_to).first()
-                    if user:
-                        task.assigned_to = user.id
-
-                db.add(task)
-                created += 1
-            except Exception as e:
-                logging.exception("导入任务失败（行%r）", idx)
-                errors.append(f"第{idx}行导入失败: {e}")
-
-        # ✅ 更新项目统计字段
-        if project_id:
-            try:
-                update_project_stats(db, project_id)
-            except Exception as e:
-                logger.error(f"❌ [TaskAPI] 批量导入后更新项目统计失败: {e}")
-
-        db.commit()
-        
-        # ✅ 清除缓存（批量导入后）
-        if project_id:
-            # 1. 清除项目的所有任务缓存
-            cache_service.invalidate_tasks_cache(project_id)
-            # 2. 清除跨项目的任务缓存
-            cache_service.invalidate_tasks_cache()
-            # 3. 清除项目详情
-            cache_service.invalidate_project_detail_cache(project_id)
-            # 清除统计缓存
-            stats_cache_service.invalidate_dashboard_stats()
-            stats_cache_service.invalidate_project_stats(project_id)
-            logger.info(f"✅ [TaskAPI] 批量导入{created}个任务后,缓存已清除: project={project_id}, 所有视图已刷新")
-        
-        return {"success": True, "created": created, "failed": len(errors), "errors": errors, "message": f"成功导入{created}条，失败{len(errors)}条"}
-    except HTTPException:
-        raise
+        path = await task_import_service.save_upload(file)
     except Exception as e:
-        logging.exception("导入任务异常")
+        logging.exception("保存导入文件失败")
         raise HTTPException(status_code=500, detail=str(e))
 
+    job_id = task_import_service.create_job(current_user.id, file.filename or filename, project_id)
+    user_name = getattr(current_user, 'real_name', None) or getattr(current_user, 'username', None)
+    background_tasks.add_task(
+        task_import_service.run_job, job_id, path, filename, project_id, current_user.id, user_name
+    )
+    logger.info(f"📥 [TaskAPI] 导入任务已提交: job={job_id}, 文件={file.filename}, 用户={current_user.username}")
+    audit_logger.info(f"user_id={current_user.id} action=import_tasks job_id={job_id} file={file.filename}")
+    return {"success": True, "job_id": job_id, "status": "pending", "message": "导入任务已提交，正在后台处理"}
+
+@router.get("/import/{job_id}")
+def get_import_job(
+    job_id: str,
+    current_user = Depends(require_permission("TaskPool"))
+):
+    """查询批量导入进度：status 为 pending/running/completed/failed"""
+    job = task_import_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在或已过期")
+    # 只有提交者本人或管理员可以查看（包含错误行明细）
+    if current_user.role != "admin" and str(job.get("created_by")) != str(current_user.id):
+        raise HTTPException(status_code=403, detail="无权限查看此导入任务")
+    job["success"] = job.get("status") == "completed"
+    return job
+
 @router.post("/{task_id}/upload-review-images")
 async def upload_review_images(
     task_id: str,
@@ -774,7 +794,7 @@ def abandon_task(
     current_user = Depends(require_permission("MyWorkspace"))
 ):
     """放弃任务"""
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
     
@@ -789,23 +809,14 @@ def abandon_task(
     task.assigned_to_name = None
     task.assigned_at = None
     
-    # ✅ 更新项目统计字段
-    if task.project_id:
-        try:
-            update_project_stats(db, task.project_id)
-        except Exception as e:
-            logger.error(f"❌ [TaskAPI] 更新项目统计失败: {e}")
+    # ✅ 增量更新项目任务计数（与状态变更在同一事务内提交）
+    project_counter_service.record_task_change(db, task)
     
     db.commit()
     
-    # ✅ 清除缓存（重要：三重清除策略）
-    # 1. 清除放弃者的任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id, current_user.id)
-    # 2. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id)
-    # 3. 清除跨项目的任务缓存（任务池可能查看所有项目）
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 4. 清除任务详情
+    # 清除任务详情
     cache_service.invalidate_task_detail_cache(task_id)
     cache_service.invalidate_project_detail_cache(task.project_id)
     
@@ -827,7 +838,7 @@ def restart_task(
     """重新开始驳回的任务"""
     logger.info(f"🔄 [TaskAPI] 用户重新开始驳回任务: {current_user.username} -> {task_id}")
     
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if not task:
         logger.warning(f"❌ [TaskAPI] 任务不存在: {task_id}")
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -856,16 +867,14 @@ def restart_task(
     task.timeline = events
     flag_modified(task, 'timeline')  # 明确告诉SQLAlchemy字段已修改
     
+    # ✅ 增量更新项目任务计数（与状态变更在同一事务内提交）
+    project_counter_service.record_task_change(db, task)
+    
     db.commit()
     
-    # ✅ 清除缓存（重要：三重清除策略）
-    # 1. 清除重启者的任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id, current_user.id)
-    # 2. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id)
-    # 3. 清除跨项目的任务缓存（审核页面可能查看所有项目）
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 4. 清除任务详情
+    # 清除任务详情
     cache_service.invalidate_task_detail_cache(task_id)
     
     logger.info(f"✅ [TaskAPI] 驳回任务重新开始成功: {task_id} -> 状态: in_progress")
@@ -889,7 +898,7 @@ async def review_task(
     """审核任务（需菜单权限 TaskReview）"""
     logger.info(f"📋 [TaskAPI] 开始审核任务: {task_id}, 审核人: {current_user.username}")
     
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if not task:
         logger.warning(f"❌ [TaskAPI] 任务不存在: {task_id}")
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -947,24 +956,14 @@ async def review_task(
     
     logger.info(f"✅ [TaskAPI] 任务状态更新: {task_id} {original_status} -> {task.status}")
     
-    # ✅ 更新项目统计字段
-    if task.project_id:
-        try:
-            update_project_stats(db, task.project_id)
-        except Exception as e:
-            logger.error(f"❌ [TaskAPI] 更新项目统计失败: {e}")
-            # 不影响任务审核流程
+    # ✅ 增量更新项目任务计数（与状态变更在同一事务内提交）
+    project_counter_service.record_task_change(db, task)
     
     db.commit()
     
-    # ✅ 清除缓存（重要：三重清除策略）
-    # 1. 清除标注员的任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id, assigned_user_id)
-    # 2. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id)
-    # 3. 清除跨项目的任务缓存（审核员可能查看所有项目）
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 4. 清除任务详情和项目详情
+    # 清除任务详情和项目详情
     cache_service.invalidate_task_detail_cache(task_id)
     cache_service.invalidate_project_detail_cache(task.project_id)
     # 清除统计缓存
@@ -1059,7 +1058,7 @@ def skip_task(
     current_user = Depends(require_permission("TaskPool"))
 ):
     """跳过任务（软删除，需菜单权限 TaskPool）：记录原因与截图，状态置为 skipped"""
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
@@ -1085,14 +1084,14 @@ def skip_task(
     })
     task.timeline = events
     flag_modified(task, 'timeline')
+    # ✅ 增量更新项目任务计数（与状态变更在同一事务内提交）
+    project_counter_service.record_task_change(db, task)
+    
     db.commit()
     
-    # ✅ 清除缓存（三重清除策略）
-    # 1. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id)
-    # 2. 清除跨项目的任务缓存
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 3. 清除任务详情
+    # 清除任务详情
     cache_service.invalidate_task_detail_cache(task_id)
     logger.info(f"✅ [TaskAPI] 任务跳过缓存已清除: project={task.project_id}, 所有视图已刷新")
     
@@ -1108,7 +1107,7 @@ async def request_skip_task(
     """申请跳过任务"""
     logger.info(f"📋 [TaskAPI] 用户申请跳过任务: {current_user.username} -> {task_id}")
     
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if not task:
         logger.warning(f"❌ [TaskAPI] 任务不存在: {task_id}")
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -1144,16 +1143,14 @@ async def request_skip_task(
     task.timeline = events
     flag_modified(task, 'timeline')
     
+    # ✅ 增量更新项目任务计数（与状态变更在同一事务内提交）
+    project_counter_service.record_task_change(db, task)
+    
     db.commit()
     
-    # ✅ 清除缓存（重要：三重清除策略）
-    # 1. 清除申请者的任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id, current_user.id)
-    # 2. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id)
-    # 3. 清除跨项目的任务缓存（审核页面可能查看所有项目）
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 4. 清除任务详情
+    # 清除任务详情
     cache_service.invalidate_task_detail_cache(task_id)
     
     logger.info(f"✅ [TaskAPI] 跳过申请提交成功: {task_id} -> 等待审核")
@@ -1211,7 +1208,7 @@ async def review_skip_request(
     """审核跳过申请（需菜单权限 TaskReview）"""
     logger.info(f"📋 [TaskAPI] 审核跳过申请: {task_id}, 审核人: {current_user.username}, 结果: {'同意' if payload.approved else '拒绝'}")
     
-    task = db.query(Task).filter(Task.id == task_id).first()
+    task = db.query(Task).filter(Task.id == task_id).with_for_update().first()
     if not task:
         logger.warning(f"❌ [TaskAPI] 任务不存在: {task_id}")
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -1262,24 +1259,14 @@ async def review_skip_request(
     task.timeline = events
     flag_modified(task, 'timeline')
     
-    # ✅ 更新项目统计字段
-    if task.project_id:
-        try:
-            update_project_stats(db, task.project_id)
-        except Exception as e:
-            logger.error(f"❌ [TaskAPI] 更新项目统计失败: {e}")
+    # ✅ 增量更新项目任务计数（与状态变更在同一事务内提交）
+    project_counter_service.record_task_change(db, task)
     
     db.commit()
     
-    # ✅ 清除缓存（重要：三重清除策略）
-    # 1. 清除标注员的任务缓存
-    if assigned_user_id:
-        cache_service.invalidate_tasks_cache(task.project_id, assigned_user_id)
-    # 2. 清除项目的所有任务缓存
-    cache_service.invalidate_tasks_cache(task.project_id)
-    # 3. 清除跨项目的任务缓存（审核页面可能查看所有项目）
+    # ✅ 清除缓存
     cache_service.invalidate_tasks_cache()
-    # 4. 清除任务详情
+    # 清除任务详情
     cache_service.invalidate_task_detail_cache(task_id)
     cache_service.invalidate_project_detail_cache(task.project_id)
     
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
+from collections import defaultdict
 from app.database import get_db
 from app.schemas.user import UserResponse, UserUpdate, UserCreate, UserProfileUpdate, UserProfileResponse
 from app.models.user import User
@@ -10,6 +11,7 @@ from fastapi import UploadFile, File
 from app.utils.file_utils import file_service
 import logging
 from app.services.user_cache_service import user_cache_service
+from app.utils.principal_cache import principal_cache
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -52,6 +54,7 @@ def update_my_profile(payload: UserProfileUpdate, db: Session = Depends(get_db),
     
     # ✅ 清除用户缓存
     user_cache_service.invalidate_user_cache(user.id)
+    principal_cache.invalidate_user(user.id)
     
     # 返回包含解析后标签的数据
     user_dict = {
@@ -81,6 +84,7 @@ async def upload_my_avatar(file: UploadFile = File(...), db: Session = Depends(g
     
     # ✅ 清除用户缓存
     user_cache_service.invalidate_user_cache(user.id)
+    principal_cache.invalidate_user(user.id)
     
     # 返回简单的响应，避免 tags 字段的序列化问题
     return {
@@ -116,6 +120,7 @@ def change_my_password(
     
     # ✅ 清除用户缓存
     user_cache_service.invalidate_user_cache(user.id)
+    principal_cache.invalidate_user(user.id)
     
     return { "code": 200, "msg": "密码修改成功", "data": None }
 
@@ -378,6 +383,7 @@ def update_user(
     
     # ✅ 清除用户缓存
     user_cache_service.invalidate_user_cache(user_id)
+    principal_cache.invalidate_user(user_id)
     
     logger.info(f"✅ [UsersAPI] 更新后的 hire_date: {user.hire_date}")
     logger.info(f"✅ [UsersAPI] 用户更新完成: {user_id}")
@@ -414,6 +420,7 @@ def delete_user(
     from app.models.work_log import WorkLogEntry, WorkWeek
     from app.models.performance import PerformanceStats
     from app.models.collaboration import CollaborationDocument, DocumentCollaborator
+    from app.services.project_counter_service import project_counter_service
     
     # 查找系统管理员（用于接管被删除用户创建的数据）
     system_admin = db.query(User).filter(
@@ -572,6 +579,19 @@ def delete_user(
         
         # 6. 只将非完成状态的任务设为未分配（已完成的任务保留历史记录）
         if incomplete_tasks_count > 0:
+            # 先锁定受影响的任务并按 (项目, 状态) 汇总，同一事务内调整项目任务计数：
+            # 原状态 -n、已分配 -n，pending +n
+            affected = db.query(Task.project_id, Task.status).filter(
+                Task.assigned_to == user_id,
+                Task.status.in_(incomplete_statuses)
+            ).with_for_update().all()
+            deltas = defaultdict(lambda: [0, 0])
+            for project_id, task_status in affected:
+                deltas[(project_id, task_status)][0] -= 1
+                deltas[(project_id, task_status)][1] -= 1
+                deltas[(project_id, "pending")][0] += 1
+            project_counter_service.apply_deltas(db, {key: tuple(value) for key, value in deltas.items()})
+            
             updated_count = db.query(Task).filter(
                 Task.assigned_to == user_id,
                 Task.status.in_(incomplete_statuses)
@@ -615,6 +635,7 @@ def delete_user(
         
         # ✅ 清除用户缓存
         user_cache_service.invalidate_all_users_cache()
+        principal_cache.invalidate_user(user_id)
         
         # 同时撤销该用户的所有 Token（如果 Redis 可用）
         try:
@@ -655,6 +676,7 @@ def toggle_user_status(
     
     # ✅ 清除用户缓存
     user_cache_service.invalidate_user_cache(user_id)
+    principal_cache.invalidate_user(user_id)
     
     status_text = "启用" if user.status == "active" else "禁用"
     return {
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Body
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, func, desc
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import and_, or_, func, desc, select, insert, exists, literal, true, String, Date
 from typing import List, Optional
 from datetime import datetime, date, timedelta
 from app.utils.datetime_utils import utc_now
@@ -21,6 +21,7 @@ from app.schemas.work_log import (
 from app.utils.security import get_current_user
 from app.utils.permissions import require_permission
 from app.services.pdf_export_service import work_log_pdf_service
+from app.services.work_log_stats_service import work_log_stats_service, label_work_types, SUBMITTED_STATUSES
 
 logger = logging.getLogger(__name__)
 
@@ -730,72 +731,44 @@ async def get_work_week_statistics(
     if not work_week:
         raise HTTPException(status_code=404, detail="工作周不存在")
     
-    # 获取所有条目，按用户分组
-    entries = db.query(WorkLogEntry).options(
-        joinedload(WorkLogEntry.user)
-    ).filter(WorkLogEntry.work_week_id == week_id).all()
-    
-    # 按用户统计
-    user_stats = {}
-    for entry in entries:
-        user_id = entry.user_id
-        if user_id not in user_stats:
-            user_stats[user_id] = {
-                'user_id': user_id,
-                'user_name': getattr(entry.user, 'real_name', None) or getattr(entry.user, 'username', ''),
-                'entries': [],
-                'total_planned_hours': 0,
-                'total_actual_hours': 0,
-                'completion_rates': [],
-                'status_count': {'pending': 0, 'submitted': 0, 'approved': 0, 'rejected': 0},
-                'work_type_hours': {}  # 按工作类型统计工时
-            }
-        
-        user_stats[user_id]['entries'].append(entry)
-        user_stats[user_id]['total_planned_hours'] += entry.planned_hours
-        if entry.actual_hours:
-            user_stats[user_id]['total_actual_hours'] += entry.actual_hours
-            # 按工作类型统计实际工时
-            work_type = entry.work_type or '其他'
-            if work_type not in user_stats[user_id]['work_type_hours']:
-                user_stats[user_id]['work_type_hours'][work_type] = 0
-            user_stats[user_id]['work_type_hours'][work_type] += entry.actual_hours
-        user_stats[user_id]['completion_rates'].append(entry.completion_rate)
-        user_stats[user_id]['status_count'][entry.status] += 1
+    # 在数据库中按 用户/工作类型/状态 聚合，只取汇总结果
+    rollup = work_log_stats_service.aggregate(db, [week_id])
     
     # 生成用户汇总
     user_summaries = []
-    for user_id, stats in user_stats.items():
-        avg_completion = sum(stats['completion_rates']) / len(stats['completion_rates']) if stats['completion_rates'] else 0
-        submitted_days = stats['status_count']['submitted'] + stats['status_count']['approved']
+    for stats in rollup['users']:
+        status_count = {'pending': 0, 'submitted': 0, 'approved': 0, 'rejected': 0}
+        status_count.update(stats['status_count'])
+        total_entries = stats['total_entries']
+        avg_completion = stats['completion_rate_sum'] / total_entries if total_entries else 0
         
         summary_dict = {
             'work_week_id': week_id,
-            'user_id': user_id,
-            'user_name': stats['user_name'],
+            'user_id': stats['user_id'],
+            'user_name': stats['real_name'] or stats['username'] or '',
             'total_planned_hours': stats['total_planned_hours'],
             'total_actual_hours': stats['total_actual_hours'],
             'average_completion_rate': avg_completion,
-            'submitted_days': submitted_days,
-            'total_days': len(stats['entries']),
-            'status_summary': stats['status_count'],
-            'total_entries': len(stats['entries']),
-            'work_type_hours': stats['work_type_hours']
+            'submitted_days': sum(status_count.get(s, 0) for s in SUBMITTED_STATUSES),
+            'total_days': total_entries,
+            'status_summary': status_count,
+            'total_entries': total_entries,
+            'work_type_hours': label_work_types(stats['work_type_hours'], '其他')
         }
         user_summaries.append(WorkWeekSummary(**summary_dict))
     
     # 整体统计
-    total_entries = len(entries)
-    submitted_entries = len([e for e in entries if e.status in ['submitted', 'approved']])
+    total_entries = rollup['total_entries']
+    submitted_entries = sum(rollup['status_count'].get(s, 0) for s in SUBMITTED_STATUSES)
     overall_completion = (submitted_entries / total_entries * 100) if total_entries > 0 else 0
     
     overall_stats = {
-        'total_users': len(user_stats),
+        'total_users': len(rollup['users']),
         'total_entries': total_entries,
         'submitted_entries': submitted_entries,
         'completion_rate': overall_completion,
-        'total_planned_hours': sum(e.planned_hours for e in entries),
-        'total_actual_hours': sum(e.actual_hours or 0 for e in entries)
+        'total_planned_hours': rollup['total_planned_hours'],
+        'total_actual_hours': rollup['total_actual_hours']
     }
     
     return WorkWeekStatistics(
@@ -806,47 +779,47 @@ async def get_work_week_statistics(
 
 # ==================== 辅助函数 ====================
 
-async def _create_default_entries_for_week(db: Session, work_week: WorkWeek):
-    """为工作周创建默认的工作日志条目"""
-    
-    # 获取所有活跃用户
-    active_users = db.query(User).filter(User.status == "active").all()
-    
-    # 为每个用户创建5天的工作日志条目
-    for user in active_users:
-        for i in range(5):  # 周一到周五
-            work_date = work_week.week_start_date + timedelta(days=i)
-            day_of_week = i + 1  # 1=周一, 5=周五
-            
-            entry = WorkLogEntry(
-                id=str(uuid.uuid4()),
-                work_week_id=work_week.id,
-                user_id=user.id,
-                work_date=work_date,
-                day_of_week=day_of_week,
-                status="pending"
-            )
-            db.add(entry)
-    
+def _insert_week_entries(db: Session, work_week: WorkWeek, user_ids: Optional[List[str]] = None) -> int:
+    """
+    为工作周批量生成周一到周五的 pending 条目，返回新插入的条数
+    单条 INSERT ... SELECT（用户 × 5 个工作日），当天已有条目的（工作周, 用户, 日期）由 NOT EXISTS 跳过；
+    同一天允许多个工作项（create_work_log_entry 追加），因此不能用唯一索引 + ON CONFLICT。
+    未指定 user_ids 时为所有活跃用户生成
+    """
+    day = func.generate_series(0, 4).table_valued("day_offset").render_derived("d")
+    users = select(User.id).where(
+        User.id.in_(user_ids) if user_ids else User.status == "active"
+    ).subquery("u")
+    work_date = literal(work_week.week_start_date, Date) + day.c.day_offset
+    existing = aliased(WorkLogEntry, name="e")
+    rows = select(
+        func.gen_random_uuid().cast(String),
+        literal(work_week.id, String),
+        users.c.id,
+        work_date,
+        day.c.day_offset + 1,  # 1=周一, 5=周五
+        literal("pending", String),
+    ).select_from(users.join(day, true())).where(
+        ~exists().where(
+            existing.work_week_id == work_week.id,
+            existing.user_id == users.c.id,
+            existing.work_date == work_date,
+        )
+    )
+    stmt = insert(WorkLogEntry).from_select(
+        ["id", "work_week_id", "user_id", "work_date", "day_of_week", "status"], rows
+    )
+    inserted = db.execute(stmt).rowcount
     db.commit()
+    return inserted
+
+async def _create_default_entries_for_week(db: Session, work_week: WorkWeek):
+    """为工作周创建默认的工作日志条目（所有活跃用户）"""
+    _insert_week_entries(db, work_week)
 
 async def _generate_entries_for_specific_users(db: Session, work_week: WorkWeek, user_ids: list[str]):
-    from app.models.user import User
     # 仅为指定用户生成 5 天 pending 条目
-    for user_id in user_ids:
-        for i in range(5):
-            work_date = work_week.week_start_date + timedelta(days=i)
-            day_of_week = i + 1
-            entry = WorkLogEntry(
-                id=str(uuid.uuid4()),
-                work_week_id=work_week.id,
-                user_id=user_id,
-                work_date=work_date,
-                day_of_week=day_of_week,
-                status="pending"
-            )
-            db.add(entry)
-    db.commit()
+    _insert_week_entries(db, work_week, user_ids)
 
 @router.post("/weeks/{week_id}/generate-entries")
 async def generate_entries_for_week(
@@ -867,40 +840,51 @@ async def generate_entries_for_week(
     if not work_week:
         raise HTTPException(status_code=404, detail="工作周不存在")
     
-    # 如果没有指定用户，则为所有活跃用户生成
-    if not user_ids:
-        users = db.query(User).filter(User.status == "active").all()
-        user_ids = [user.id for user in users]
+    # 未指定用户时为所有活跃用户生成；已存在的条目跳过
+    generated_count = _insert_week_entries(db, work_week, user_ids)
     
-    # 为指定用户生成条目
-    generated_count = 0
-    for user_id in user_ids:
-        for i in range(5):  # 周一到周五
-            work_date = work_week.week_start_date + timedelta(days=i)
-            day_of_week = i + 1
-            
-            # 检查是否已存在
-            existing = db.query(WorkLogEntry).filter(
-                WorkLogEntry.work_week_id == week_id,
-                WorkLogEntry.user_id == user_id,
-                WorkLogEntry.work_date == work_date
-            ).first()
-            
-            if not existing:
-                entry = WorkLogEntry(
-                    id=str(uuid.uuid4()),
-                    work_week_id=week_id,
-                    user_id=user_id,
-                    work_date=work_date,
-                    day_of_week=day_of_week,
-                    status="pending"
-                )
-                db.add(entry)
-                generated_count += 1
+    return {"message": f"已生成 {generated_count} 个工作日志条目"}
+
+
+def _build_report_stats(rollup: dict, week_count: int):
+    """
+    由聚合结果生成 PDF 报告的整体统计、用户明细与工作类型统计
+    计划工时 = 用户数 × 工作周数 × 40 小时
+    """
+    total_users = len(rollup['users'])
+    total_actual_hours = float(rollup['total_actual_hours'])
+    total_planned_hours = total_users * week_count * 40
+    efficiency = round((total_actual_hours / total_planned_hours) * 100, 1) if total_planned_hours > 0 else 0
     
-    db.commit()
+    overall_stats = {
+        'total_users': total_users,
+        'total_planned_hours': total_planned_hours,
+        'total_actual_hours': round(total_actual_hours, 1),
+        'efficiency': efficiency
+    }
     
-    return {"message": f"已生成 {generated_count} 个工作日志条目"}
+    # 用户明细，按实际工时降序
+    user_summaries = sorted(
+        [
+            {
+                'user_name': stats['real_name'] or stats['username'] or '未知用户',
+                'total_actual_hours': round(float(stats['total_actual_hours']), 1),
+                'work_type_hours': {
+                    k: round(float(v), 1)
+                    for k, v in label_work_types(stats['work_type_hours'], '未分类').items()
+                },
+                'entries_count': stats['total_entries']
+            }
+            for stats in rollup['users']
+        ],
+        key=lambda x: x['total_actual_hours'],
+        reverse=True
+    )
+    
+    work_type_stats = {
+        k: round(float(v), 1) for k, v in label_work_types(rollup['work_type_hours'], '未分类').items()
+    }
+    return overall_stats, user_summaries, work_type_stats
 
 
 # ==================== 工作周导出 ====================
@@ -922,14 +906,10 @@ async def export_work_week_report(
         if not work_week:
             raise HTTPException(status_code=404, detail="工作周不存在")
         
-        # 2. 获取工作周统计数据（复用现有的统计接口逻辑）
-        entries = db.query(WorkLogEntry).filter(
-            WorkLogEntry.work_week_id == week_id
-        ).options(
-            joinedload(WorkLogEntry.user)
-        ).all()
+        # 2. 获取工作周统计数据（数据库聚合，与统计接口共用）
+        rollup = work_log_stats_service.aggregate(db, [week_id])
         
-        logger.info(f"📋 [WorkLogExport] 查询到工作日志条目数: {len(entries)}")
+        logger.info(f"📋 [WorkLogExport] 聚合工作日志条目数: {rollup['total_entries']}")
         
         # 3. 准备工作周信息
         status_text_map = {
@@ -953,75 +933,10 @@ async def export_work_week_report(
             'status_text': status_text_map.get(work_week.status, '未知')
         }
         
-        # 4. 计算整体统计
-        user_ids = set()
-        total_actual_hours = 0.0
-        work_type_hours_total = {}
-        
-        for entry in entries:
-            if entry.user_id:
-                user_ids.add(entry.user_id)
-            if entry.actual_hours:
-                total_actual_hours += entry.actual_hours
-                
-                # 统计工作类型工时（work_type 是字符串列，不是关系）
-                work_type_name = entry.work_type or '未分类'
-                work_type_hours_total[work_type_name] = work_type_hours_total.get(work_type_name, 0) + entry.actual_hours
-        
-        total_users = len(user_ids)
-        total_planned_hours = total_users * 40  # 每人40小时
-        efficiency = round((total_actual_hours / total_planned_hours) * 100, 1) if total_planned_hours > 0 else 0
-        
-        overall_stats = {
-            'total_users': total_users,
-            'total_planned_hours': total_planned_hours,
-            'total_actual_hours': round(total_actual_hours, 1),
-            'efficiency': efficiency
-        }
-        
-        # 5. 计算用户详细统计
-        user_stats_map = {}
-        for entry in entries:
-            if not entry.user_id:
-                continue
-            
-            user_id = entry.user_id
-            if user_id not in user_stats_map:
-                user_name = entry.user.real_name if entry.user and entry.user.real_name else (entry.user.username if entry.user else '未知用户')
-                user_stats_map[user_id] = {
-                    'user_id': user_id,
-                    'user_name': user_name,
-                    'total_actual_hours': 0.0,
-                    'work_type_hours': {},
-                    'entries_count': 0
-                }
-            
-            if entry.actual_hours:
-                user_stats_map[user_id]['total_actual_hours'] += entry.actual_hours
-                
-                work_type_name = entry.work_type or '未分类'
-                user_stats_map[user_id]['work_type_hours'][work_type_name] = \
-                    user_stats_map[user_id]['work_type_hours'].get(work_type_name, 0) + entry.actual_hours
-            
-            user_stats_map[user_id]['entries_count'] += 1
-        
-        # 转换为列表并排序
-        user_summaries = sorted(
-            [
-                {
-                    'user_name': stats['user_name'],
-                    'total_actual_hours': round(stats['total_actual_hours'], 1),
-                    'work_type_hours': {k: round(v, 1) for k, v in stats['work_type_hours'].items()},
-                    'entries_count': stats['entries_count']
-                }
-                for stats in user_stats_map.values()
-            ],
-            key=lambda x: x['total_actual_hours'],
-            reverse=True
-        )
-        
-        # 6. 工作类型统计（四舍五入）
-        work_type_stats = {k: round(v, 1) for k, v in work_type_hours_total.items()}
+        # 4-6. 整体统计、用户详细统计、工作类型统计
+        overall_stats, user_summaries, work_type_stats = _build_report_stats(rollup, 1)
+        total_users = overall_stats['total_users']
+        total_actual_hours = overall_stats['total_actual_hours']
         
         logger.info(f"📊 [WorkLogExport] 统计完成: 用户数={total_users}, 总工时={total_actual_hours}h")
         
@@ -1135,15 +1050,11 @@ async def export_work_log_report(
         
         logger.info(f"📋 [WorkLogExport] 找到 {len(work_weeks)} 个工作周")
         
-        # 查询所有工作日志条目
+        # 在数据库中聚合所有工作周的条目
         week_ids = [ww.id for ww in work_weeks]
-        entries = db.query(WorkLogEntry).filter(
-            WorkLogEntry.work_week_id.in_(week_ids)
-        ).options(
-            joinedload(WorkLogEntry.user)
-        ).all()
+        rollup = work_log_stats_service.aggregate(db, week_ids)
         
-        logger.info(f"📋 [WorkLogExport] 查询到工作日志条目数: {len(entries)}")
+        logger.info(f"📋 [WorkLogExport] 聚合工作日志条目数: {rollup['total_entries']}")
         
         # 准备报告信息
         work_week_info = {
@@ -1156,75 +1067,10 @@ async def export_work_log_report(
             'status_text': f'聚合报告（{len(work_weeks)}个工作周）'
         }
         
-        # 计算整体统计
-        user_ids = set()
-        total_actual_hours = 0.0
-        work_type_hours_total = {}
-        
-        for entry in entries:
-            if entry.user_id:
-                user_ids.add(entry.user_id)
-            if entry.actual_hours:
-                total_actual_hours += entry.actual_hours
-                
-                work_type_name = entry.work_type or '未分类'
-                work_type_hours_total[work_type_name] = work_type_hours_total.get(work_type_name, 0) + entry.actual_hours
-        
-        total_users = len(user_ids)
-        # 计划工时 = 用户数 × 工作周数 × 40小时
-        total_planned_hours = total_users * len(work_weeks) * 40
-        efficiency = round((total_actual_hours / total_planned_hours) * 100, 1) if total_planned_hours > 0 else 0
-        
-        overall_stats = {
-            'total_users': total_users,
-            'total_planned_hours': total_planned_hours,
-            'total_actual_hours': round(total_actual_hours, 1),
-            'efficiency': efficiency
-        }
-        
-        # 计算用户详细统计
-        user_stats_map = {}
-        for entry in entries:
-            if not entry.user_id:
-                continue
-            
-            user_id = entry.user_id
-            if user_id not in user_stats_map:
-                user_name = entry.user.real_name if entry.user and entry.user.real_name else (entry.user.username if entry.user else '未知用户')
-                user_stats_map[user_id] = {
-                    'user_id': user_id,
-                    'user_name': user_name,
-                    'total_actual_hours': 0.0,
-                    'work_type_hours': {},
-                    'entries_count': 0
-                }
-            
-            if entry.actual_hours:
-                user_stats_map[user_id]['total_actual_hours'] += entry.actual_hours
-                
-                work_type_name = entry.work_type or '未分类'
-                user_stats_map[user_id]['work_type_hours'][work_type_name] = \
-                    user_stats_map[user_id]['work_type_hours'].get(work_type_name, 0) + entry.actual_hours
-            
-            user_stats_map[user_id]['entries_count'] += 1
-        
-        # 转换为列表并排序
-        user_summaries = sorted(
-            [
-                {
-                    'user_name': stats['user_name'],
-                    'total_actual_hours': round(stats['total_actual_hours'], 1),
-                    'work_type_hours': {k: round(v, 1) for k, v in stats['work_type_hours'].items()},
-                    'entries_count': stats['entries_count']
-                }
-                for stats in user_stats_map.values()
-            ],
-            key=lambda x: x['total_actual_hours'],
-            reverse=True
-        )
-        
-        # 工作类型统计
-        work_type_stats = {k: round(v, 1) for k, v in work_type_hours_total.items()}
+        # 整体统计、用户详细统计、工作类型统计
+        overall_stats, user_summaries, work_type_stats = _build_report_stats(rollup, len(work_weeks))
+        total_users = overall_stats['total_users']
+        total_actual_hours = overall_stats['total_actual_hours']
         
         logger.info(f"📊 [WorkLogExport] 统计完成: {len(work_weeks)}个工作周, {total_users}个用户, 总工时={total_actual_hours}h")
         
@@ -11,9 +11,11 @@ import json
 import asyncio
 
 # 导入你的API路由模块
-from app.api import auth, users, projects, tasks, performance, menu, roles, work_logs, collaboration, upload, articles, files, project_categories, performance_export, notifications
+from app.api import auth, users, projects, tasks, performance, menu, roles, work_logs, collaboration, upload, articles, files, project_categories, performance_export, notifications, search
 from app.utils.redis_client import redis_ping
 from app.services.notification_ws import manager as ws_manager
+from app.services.notification_hub import notification_hub
+from app.services.collaboration_room_service import collaboration_rooms
 from app.services.scheduler_service import scheduler_service
 from app.utils.security import get_current_user
 # 导入你的配置和数据库设置
@@ -109,6 +111,7 @@ app.include_router(menu, prefix="/menu", tags=["菜单管理"])
 app.include_router(upload, tags=["文件上传"])
 app.include_router(articles, tags=["文章发布"])
 app.include_router(files, tags=["文件代理"])
+app.include_router(search, tags=["全文搜索"])
 app.include_router(notifications.router, tags=["通知管理"])
 logger.info("API路由注册完成。")
 
@@ -167,6 +170,18 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"❌ [Shutdown] 关闭定时任务失败: {e}")
     
+    # 写出协作文档房间快照
+    try:
+        await collaboration_rooms.close()
+    except Exception as e:
+        logger.error(f"❌ [Shutdown] 关闭协作房间失败: {e}")
+    
+    # 关闭通知扇出中心
+    try:
+        await notification_hub.close()
+    except Exception as e:
+        logger.error(f"❌ [Shutdown] 关闭通知扇出中心失败: {e}")
+    
     logger.info("✅ [Shutdown] 系统关闭完成")
 
 # --- 保留你的测试和根路由 ---
@@ -208,6 +223,15 @@ async def list_scheduled_jobs():
             "message": str(e)
         }
 
+@app.get("/api/ws/metrics", tags=["系统"], dependencies=[Depends(get_current_user)])
+async def websocket_metrics():
+    """通知 WebSocket 指标：连接数、出站队列深度、发送延迟与扇出统计"""
+    return {
+        "success": True,
+        "connections": ws_manager.get_metrics(),
+        "hub": notification_hub.get_stats()
+    }
+
 @app.post("/api/scheduler/trigger-work-reminder", tags=["定时任务"])
 async def trigger_work_reminder(current_user = Depends(get_current_user)):
     """
@@ -239,7 +263,6 @@ async def trigger_work_reminder(current_user = Depends(get_current_user)):
 async def notifications_ws(websocket: WebSocket):
     role = None
     user = {}
-    redis_listener_task = None
     
     try:
         # 首条消息应包含 {role, user:{id,username,real_name}}
@@ -256,42 +279,10 @@ async def notifications_ws(websocket: WebSocket):
         # 连接到 WebSocket 管理器（用于直接推送）
         await ws_manager.connect(websocket, role=role, user=user)
         
-        # 导入 Redis 通知服务
-        from app.services.redis_notification_service import redis_notifier
-        
-        # 如果 Redis 可用，订阅相关频道
-        if redis_notifier.enabled:
-            logger.info(f"🔔 [WS] Redis 可用，开始订阅频道...")
-            
-            # 定义消息回调函数
-            async def on_redis_message(channel: str, message: dict):
-                """处理 Redis 消息并转发到 WebSocket"""
-                try:
-                    logger.info(f"📨 [WS→Client] 从 Redis 收到消息: {channel} → {username}")
-                    # 发送消息到 WebSocket 客户端
-                    import json
-                    await websocket.send_text(json.dumps(message, ensure_ascii=False))
-                except Exception as e:
-                    logger.error(f"❌ [WS] 转发 Redis 消息失败: {e}")
-            
-            # 订阅用户个人频道
-            if user_id:
-                await redis_notifier.subscribe_user_channel(user_id, on_redis_message)
-                logger.info(f"✅ [WS] 已订阅用户频道: notify:user:{user_id}")
-            
-            # 订阅角色频道
-            if role:
-                await redis_notifier.subscribe_role_channel(role, on_redis_message)
-                logger.info(f"✅ [WS] 已订阅角色频道: notify:role:{role}")
-            
-            # 订阅全局频道
-            await redis_notifier.subscribe_global(on_redis_message)
-            logger.info(f"✅ [WS] 已订阅全局频道: notify:global")
-            
-            # 启动 Redis 监听任务（如果还没有运行）
-            if not redis_notifier.running:
-                redis_listener_task = asyncio.create_task(redis_notifier.listen())
-                logger.info(f"🚀 [WS] 启动 Redis 监听任务")
+        # 加入进程内扇出中心：每个频道每个 worker 只订阅一次 Redis
+        if notification_hub.enabled:
+            await notification_hub.join(websocket, notification_hub.channels_for(user_id, role))
+            logger.info(f"✅ [WS] 已加入通知频道 - {username}")
         else:
             logger.info(f"⚠️ [WS] Redis 不可用，仅使用直接 WebSocket 推送")
         
@@ -336,11 +327,7 @@ async def notifications_ws(websocket: WebSocket):
     finally:
         # 清理连接
         ws_manager.disconnect(websocket)
-        
-        # 取消 Redis 监听任务（如果是我们启动的）
-        if redis_listener_task and not redis_listener_task.done():
-            redis_listener_task.cancel()
-            logger.info(f"🛑 [WS] 取消 Redis 监听任务")
+        await notification_hub.leave(websocket)
         
         logger.info(f"✅ [WS] 连接清理完成 - {user.get('username', 'unknown')}")
 
@@ -1,5 +1,5 @@
 from .user import User
-from .project import Project
+from .project import Project, ProjectTaskCounter
 from .project_category import ProjectCategory
 from .task import Task, TaskAttachment
 from .performance import PerformanceStats, ProjectStats
@@ -7,6 +7,7 @@ from .performance import PerformanceStats, ProjectStats
 __all__ = [
     "User",
     "Project",
+    "ProjectTaskCounter",
     "ProjectCategory",
     "Task",
     "TaskAttachment",
@@ -1,7 +1,8 @@
 """
 文章发布模块数据模型
 """
-from sqlalchemy import Column, String, Text, Integer, DateTime, Boolean, JSON, ForeignKey
+from sqlalchemy import Column, String, Text, Integer, DateTime, Boolean, JSON, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -23,10 +24,10 @@ class Article(Base):
     category = Column(String(50), comment="文章分类标签")
     is_public = Column(Boolean, default=True, comment="是否公开可见")
 
-    # 访问与归属扩展
-    editable_user_ids = Column(JSON, default=list, comment="可编辑用户ID列表")
-    editable_roles = Column(JSON, default=list, comment="可编辑角色编码列表，如 reviewer/annotator/admin")
-    departments = Column(JSON, default=list, comment="文章所属部门（名称或编码）")
+    # 访问与归属扩展（JSONB + GIN 索引，列表权限过滤在数据库中用 ? 运算符完成）
+    editable_user_ids = Column(JSONB, default=list, comment="可编辑用户ID列表")
+    editable_roles = Column(JSONB, default=list, comment="可编辑角色编码列表（小写），如 reviewer/annotator/admin")
+    departments = Column(JSONB, default=list, comment="文章所属部门（名称或编码）")
 
     author_id = Column(String(50), ForeignKey("users.id"), nullable=False, comment="作者ID")
     author_name = Column(String(100), nullable=False, comment="作者姓名")
@@ -52,6 +53,13 @@ class Article(Base):
     # 关系：所属项目
     project = relationship("Project", backref="articles")
 
+    __table_args__ = (
+        Index("idx_articles_editable_user_ids", "editable_user_ids", postgresql_using="gin"),
+        Index("idx_articles_editable_roles", "editable_roles", postgresql_using="gin"),
+        Index("idx_articles_departments", "departments", postgresql_using="gin"),
+        Index("idx_articles_updated_at", "updated_at"),
+    )
+
 
 class ArticleEditHistory(Base):
     __tablename__ = "article_edit_history"
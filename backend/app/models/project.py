@@ -26,4 +26,17 @@ class Project(Base):
     # 关系
     creator = relationship("User", back_populates="created_projects", foreign_keys=[created_by])
     tasks = relationship("Task", back_populates="project", cascade="all, delete-orphan")
-    stats = relationship("ProjectStats", back_populates="project", uselist=False, cascade="all, delete-orphan") 
\ No newline at end of file
+    stats = relationship("ProjectStats", back_populates="project", uselist=False, cascade="all, delete-orphan") 
+
+class ProjectTaskCounter(Base):
+    """
+    项目任务计数器（按项目 + 状态）
+    任务状态流转时在同一事务内增量更新，定时任务按 GROUP BY 结果校准
+    """
+    __tablename__ = "project_task_counters"
+    
+    project_id = Column(String(36), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String(20), primary_key=True)
+    task_count = Column(Integer, nullable=False, default=0)  # 该状态下的任务数
+    assigned_count = Column(Integer, nullable=False, default=0)  # 其中已分配（assigned_to 非空）的任务数
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
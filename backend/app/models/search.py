@@ -0,0 +1,27 @@
+"""
+全文搜索索引模型
+文章与协作文档的纯文本及 tsvector 统一存放在一张表中，由 search_service 在保存时维护
+"""
+from sqlalchemy import Column, String, Text, DateTime, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class SearchEntry(Base):
+    """
+    搜索索引条目（按 实体类型 + 实体ID 唯一）
+    tsv 中标题权重为 A、正文为 D；中文按字二元组切分，英文/数字按词切分
+    """
+    __tablename__ = "search_index"
+
+    entity_type = Column(String(20), primary_key=True, comment="实体类型: article, document")
+    entity_id = Column(String(50), primary_key=True, comment="实体ID")
+    title = Column(String(200), comment="标题")
+    body = Column(Text, comment="纯文本正文（去除 HTML，用于摘要高亮）")
+    tsv = Column(TSVECTOR, comment="分词结果")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index("idx_search_index_tsv", "tsv", postgresql_using="gin"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, DateTime, Integer, Boolean, ForeignKey, JSON, Date
+from sqlalchemy import Column, String, Text, DateTime, Integer, Boolean, ForeignKey, JSON, Date, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -68,6 +68,11 @@ class WorkLogEntry(Base):
     user = relationship("User", foreign_keys=[user_id])
     reviewer = relationship("User", foreign_keys=[reviewed_by])
 
+    __table_args__ = (
+        # 批量生成条目时按（工作周, 用户, 日期）判断是否已有条目；同一天可有多个工作项，不设唯一约束
+        Index("idx_work_log_entries_week_user_date", "work_week_id", "user_id", "work_date"),
+    )
+
 class WorkLogType(Base):
     """工作日志类型配置表"""
     __tablename__ = "work_log_types"
@@ -129,6 +129,7 @@ class CollaborationDocumentUpdate(BaseModel):
     project_id: Optional[str] = None
     category: Optional[str] = Field(None, max_length=100)
     tags: Optional[List[str]] = None
+    version: Optional[int] = Field(None, ge=1, description="修改内容时的基准版本，提供时做冲突检测")
 
 
 class CollaborationDocumentResponse(CollaborationDocumentBase):
@@ -218,6 +219,22 @@ class DocumentContentUpdate(BaseModel):
     content: str = Field(..., description="文档内容")
 
 
+class ContentOperation(BaseModel):
+    pos: int = Field(..., ge=0, description="位置")
+    delete: int = Field(0, ge=0, alias="del", description="删除字符数")
+    ins: str = Field("", description="插入内容")
+
+    class Config:
+        populate_by_name = True
+
+
+# 增量保存：ops 与 content 二选一，content 由服务端换算成一次替换
+class DocumentContentDelta(BaseModel):
+    base_version: int = Field(..., ge=0, description="操作所基于的版本")
+    ops: Optional[List[ContentOperation]] = Field(None, max_length=1000, description="按顺序应用的操作")
+    content: Optional[str] = Field(None, description="整篇内容")
+
+
 # 锁定响应
 class DocumentLockResponse(BaseModel):
     message: str
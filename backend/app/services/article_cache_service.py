@@ -34,7 +34,7 @@ class ArticleCacheService:
     def set_article_detail(self, article_id: str, data: Dict):
         """设置文章详情缓存"""
         cache_key = f"article:detail:{article_id}"
-        self.cache.set(cache_key, data, expire=self.ARTICLE_DETAIL_TTL)
+        self.cache.set(cache_key, data, expire=self.ARTICLE_DETAIL_TTL, tags=["article"])
         logger.info(f"💾 文章详情已缓存: {article_id}, TTL={self.ARTICLE_DETAIL_TTL}s")
     
     def invalidate_article_detail(self, article_id: str):
@@ -75,7 +75,16 @@ class ArticleCacheService:
         cache_key = self._generate_list_cache_key(
             article_type, status, project_id, page, page_size
         )
-        self.cache.set(cache_key, data, expire=self.ARTICLE_LIST_TTL)
+        type_part = article_type or "all"
+        project_part = project_id or "all"
+        tags = [
+            "article",
+            "article:list",
+            f"article:list:type:{type_part}",
+            f"article:list:project:{project_part}",
+            f"article:list:type:{type_part}:project:{project_part}",
+        ]
+        self.cache.set(cache_key, data, expire=self.ARTICLE_LIST_TTL, tags=tags)
         logger.info(f"💾 文章列表已缓存: {cache_key}, TTL={self.ARTICLE_LIST_TTL}s")
     
     def _generate_list_cache_key(
@@ -100,19 +109,19 @@ class ArticleCacheService:
         """清除文章列表缓存"""
         if article_type and project_id:
             # 清除特定类型和项目的列表
-            pattern = f"article:list:{article_type}:*:{project_id}:*"
+            tag = f"article:list:type:{article_type}:project:{project_id}"
         elif article_type:
             # 清除特定类型的所有列表
-            pattern = f"article:list:{article_type}:*"
+            tag = f"article:list:type:{article_type}"
         elif project_id:
             # 清除特定项目的所有列表
-            pattern = f"article:list:*:*:{project_id}:*"
+            tag = f"article:list:project:{project_id}"
         else:
             # 清除所有文章列表
-            pattern = "article:list:*"
+            tag = "article:list"
         
-        self.cache.delete_pattern(pattern)
-        logger.info(f"🗑️ 文章列表缓存已清除: {pattern}")
+        self.cache.invalidate_tags(tag)
+        logger.info(f"🗑️ 文章列表缓存已清除: {tag}")
     
     # ==================== 文章导航树缓存 ====================
     
@@ -127,7 +136,7 @@ class ArticleCacheService:
     def set_article_tree(self, article_type: str, data: Dict):
         """设置文章导航树缓存"""
         cache_key = f"article:tree:{article_type}"
-        self.cache.set(cache_key, data, expire=self.ARTICLE_TREE_TTL)
+        self.cache.set(cache_key, data, expire=self.ARTICLE_TREE_TTL, tags=["article", "article:tree"])
         logger.info(f"💾 文章导航树已缓存: {article_type}, TTL={self.ARTICLE_TREE_TTL}s")
     
     def invalidate_article_tree(self, article_type: str = None):
@@ -137,7 +146,7 @@ class ArticleCacheService:
             self.cache.delete(cache_key)
             logger.info(f"🗑️ 文章导航树缓存已清除: {article_type}")
         else:
-            self.cache.delete_pattern("article:tree:*")
+            self.cache.invalidate_tags("article:tree")
             logger.info("🗑️ 所有文章导航树缓存已清除")
     
     # ==================== 文章编辑历史缓存 ====================
@@ -153,7 +162,7 @@ class ArticleCacheService:
     def set_article_history(self, article_id: str, data: List):
         """设置文章编辑历史缓存"""
         cache_key = f"article:history:{article_id}"
-        self.cache.set(cache_key, data, expire=self.ARTICLE_HISTORY_TTL)
+        self.cache.set(cache_key, data, expire=self.ARTICLE_HISTORY_TTL, tags=["article"])
         logger.info(f"💾 文章编辑历史已缓存: {article_id}, TTL={self.ARTICLE_HISTORY_TTL}s")
     
     def invalidate_article_history(self, article_id: str):
@@ -178,7 +187,7 @@ class ArticleCacheService:
     
     def invalidate_all_articles(self):
         """清除所有文章缓存"""
-        self.cache.delete_pattern("article:*")
+        self.cache.invalidate_tags("article")
         logger.info("🗑️ 所有文章缓存已清除")
 
 
@@ -6,12 +6,23 @@ Redis 缓存服务
 import redis
 import json
 import hashlib
-from typing import Optional, Any, List
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+from typing import Optional, Any, List, Iterable, Callable
 from datetime import datetime, date, timezone
 from decimal import Decimal
 from functools import wraps
 import logging
 from app.config import settings
+try:
+    import orjson  # 可选：更快的JSON序列化
+except Exception:
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +67,116 @@ def json_serializer(obj):
         # 其他类型使用str()
         return str(obj)
 
+
+def dumps_json(value: Any) -> bytes:
+    """
+    序列化为 UTF-8 JSON 字节
+    
+    安装了 orjson 时优先使用；时间/Decimal 等类型统一交给 json_serializer，
+    保证两种实现的输出格式一致
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            value,
+            default=json_serializer,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(value, ensure_ascii=False, default=json_serializer).encode("utf-8")
+
+
+def loads_json(data) -> Any:
+    """反序列化JSON（str 或 bytes）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# 标签失效脚本：一次往返内读取标签集合成员并 UNLINK，全程不扫描 keyspace
+# KEYS: 标签集合键列表；返回被删除的缓存键数量
+_INVALIDATE_TAGS_LUA = """
+local deleted = 0
+for _, tag in ipairs(KEYS) do
+    local members = redis.call('SMEMBERS', tag)
+    for i = 1, #members, 500 do
+        deleted = deleted + redis.call('UNLINK', unpack(members, i, math.min(i + 499, #members)))
+    end
+    redis.call('UNLINK', tag)
+end
+return deleted
+"""
+
+# 释放分布式锁：值与持有者令牌一致时才删除，锁已过期并被其他 worker 获取时不误删
+# KEYS: 锁键；ARGV: 令牌；返回是否删除
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# L1 失效广播频道
+L1_INVALIDATION_CHANNEL = "cache:l1:invalidate"
+
+_MISSING = object()
+
+# L1 中原始JSON字节副本的键后缀（与反序列化副本分开存放）
+_RAW_SUFFIX = "#raw"
+
+
+class LocalCache:
+    """
+    进程内 LRU + TTL 缓存（L1）
+    
+    存放已反序列化的对象（或原始JSON字节），命中时既省去网络往返也省去反序列化。
+    调用方不得修改取回的对象。线程安全（同步路由运行在线程池中）。
+    """
+    
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Any:
+        """获取缓存，未命中或已过期返回 _MISSING"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: Any, expire: Optional[int] = None):
+        """写入缓存，TTL 取 L1 TTL 与 Redis TTL 中较小者"""
+        ttl = min(self.ttl, expire) if expire else self.ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+    
+    def delete(self, keys: Iterable[str]):
+        """删除指定键（连同其原始JSON字节副本）"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+                self._data.pop(key + _RAW_SUFFIX, None)
+    
+    def delete_patterns(self, patterns: Iterable[str]):
+        """删除匹配 glob 模式的键"""
+        patterns = list(patterns)
+        with self._lock:
+            for key in [k for k in self._data if any(fnmatchcase(k, p) for p in patterns)]:
+                del self._data[key]
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
 class CacheService:
     """统一的Redis缓存服务"""
     
@@ -64,6 +185,23 @@ class CacheService:
         self.redis_client = None
         self.enabled = False
         self.default_ttl = 300  # 5分钟默认过期时间
+        # 标签集合过期时间：需大于所有被标记缓存的TTL，每次写入时刷新
+        self.tag_ttl = 3600
+        self._invalidate_tags_script = None
+        # 不做解码的连接，用于直接返回缓存中的JSON字节
+        self._raw_client = None
+        
+        # L1（进程内）与 L2（Redis）命中统计
+        self.local_cache: Optional[LocalCache] = None
+        self._instance_id = uuid.uuid4().hex
+        self._stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+        
+        # 防击穿：同一个key同一时刻只允许一个请求重算（key -> 重算完成事件）
+        self._flights: dict = {}
+        self._flights_lock = threading.Lock()
+        self.flight_lock_ttl = 30  # 跨进程重算锁的过期时间（秒）
+        self.flight_wait_timeout = 3  # 跟随者等待重算结果的最长时间（秒）
+        self.early_refresh_beta = 1.0  # 提前刷新系数，越大越早刷新，0表示关闭
         
         try:
             # 从配置文件读取 Redis URL
@@ -75,11 +213,30 @@ class CacheService:
             )
             # 测试连接
             self.redis_client.ping()
+            self._invalidate_tags_script = self.redis_client.register_script(_INVALIDATE_TAGS_LUA)
+            self._release_lock_script = self.redis_client.register_script(_RELEASE_LOCK_LUA)
+            self._raw_client = redis.from_url(
+                settings.REDIS_URL,
+                decode_responses=False,
+                socket_connect_timeout=2,
+                socket_timeout=2
+            )
             self.enabled = True
             logger.info(f"✅ Redis连接成功，缓存服务已启用 ({settings.REDIS_URL})")
         except Exception as e:
             logger.warning(f"⚠️ Redis不可用，缓存服务已禁用: {e}")
             self.enabled = False
+        
+        if self.enabled and settings.CACHE_L1_ENABLED:
+            self.local_cache = LocalCache(settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_TTL)
+            threading.Thread(
+                target=self._listen_l1_invalidations,
+                name="cache-l1-invalidation",
+                daemon=True
+            ).start()
+            logger.info(
+                f"✅ L1进程内缓存已启用 (容量: {settings.CACHE_L1_MAX_ENTRIES}, TTL: {settings.CACHE_L1_TTL}秒)"
+            )
     
     # ==================== 基础操作 ====================
     
@@ -96,18 +253,31 @@ class CacheService:
         if not self.enabled:
             return None
         
+        if self.local_cache is not None:
+            value = self.local_cache.get(key)
+            if value is not _MISSING:
+                self._stats["l1_hits"] += 1
+                logger.debug(f"🎯 L1缓存命中: {key}")
+                return value
+            self._stats["l1_misses"] += 1
+        
         try:
             data = self.redis_client.get(key)
             if data:
+                self._stats["l2_hits"] += 1
                 logger.debug(f"🎯 缓存命中: {key}")
-                return json.loads(data)
+                value = loads_json(data)
+                if self.local_cache is not None:
+                    self.local_cache.set(key, value)
+                return value
+            self._stats["l2_misses"] += 1
             logger.debug(f"❌ 缓存未命中: {key}")
             return None
         except Exception as e:
             logger.error(f"Redis GET失败 {key}: {e}")
             return None
     
-    def set(self, key: str, value: Any, expire: int = None) -> bool:
+    def set(self, key: str, value: Any, expire: int = None, tags: Optional[List[str]] = None) -> bool:
         """
         设置缓存数据
         
@@ -115,6 +285,8 @@ class CacheService:
             key: 缓存键
             value: 要缓存的数据（将自动JSON序列化）
             expire: 过期时间（秒），None则使用默认值
+            tags: 失效标签列表，缓存键会登记到对应的标签集合中，
+                  之后可通过 invalidate_tags 精确批量清除
             
         Returns:
             是否设置成功
@@ -122,14 +294,44 @@ class CacheService:
         if not self.enabled:
             return False
         
+        try:
+            return self._write(key, dumps_json(value), expire, tags)
+        except Exception as e:
+            logger.error(f"Redis SET失败 {key}: {e}")
+            return False
+    
+    def _write(
+        self,
+        key: str,
+        serialized: bytes,
+        expire: Optional[int],
+        tags: Optional[List[str]],
+        compute_ms: Optional[int] = None,
+        raw: bool = False
+    ) -> bool:
+        """
+        写入已序列化的缓存数据
+        
+        compute_ms 为重算耗时，供提前刷新判断使用；
+        raw 表示调用方按原始字节读取，L1 中相应存放字节副本
+        """
         try:
             expire = expire or self.default_ttl
-            self.redis_client.setex(
-                key,
-                expire,
-                json.dumps(value, ensure_ascii=False, default=json_serializer)
-            )
-            logger.debug(f"💾 缓存写入: {key} (过期时间: {expire}秒)")
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, expire, serialized)
+            if compute_ms is not None:
+                pipe.setex(self._compute_time_key(key), expire, compute_ms)
+            self._register_tags(pipe, key, tags, expire)
+            pipe.execute()
+            if self.local_cache is not None:
+                # 覆盖写入：丢弃本进程另一形态的副本，并通知其他 worker 丢弃旧的 L1 副本
+                self._broadcast_l1_invalidation(keys=[key])
+                if raw:
+                    self.local_cache.set(key + _RAW_SUFFIX, serialized, expire)
+                else:
+                    # L1 存放与 L2 读取结果一致的反序列化对象，避免持有 ORM 实例
+                    self.local_cache.set(key, loads_json(serialized), expire)
+            logger.debug(f"💾 缓存写入: {key} (过期时间: {expire}秒, 标签: {tags or []})")
             return True
         except Exception as e:
             logger.error(f"Redis SET失败 {key}: {e}")
@@ -150,6 +352,7 @@ class CacheService:
         
         try:
             self.redis_client.delete(key)
+            self._broadcast_l1_invalidation(keys=[key])
             logger.debug(f"🗑️ 缓存删除: {key}")
             return True
         except Exception as e:
@@ -160,6 +363,10 @@ class CacheService:
         """
         批量删除匹配的缓存
         
+        使用 SCAN 增量遍历，避免 KEYS 阻塞 Redis。
+        遍历开销与 keyspace 大小成正比，仅用于运维脚本等低频场景；
+        业务代码的缓存失效请使用 invalidate_tags。
+        
         Args:
             pattern: 匹配模式，如 "tasks:list:*"
             
@@ -170,12 +377,19 @@ class CacheService:
             return 0
         
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                count = self.redis_client.delete(*keys)
+            count = 0
+            batch = []
+            for key in self.redis_client.scan_iter(match=pattern, count=1000):
+                batch.append(key)
+                if len(batch) >= 500:
+                    count += self.redis_client.unlink(*batch)
+                    batch = []
+            if batch:
+                count += self.redis_client.unlink(*batch)
+            self._broadcast_l1_invalidation(patterns=[pattern])
+            if count:
                 logger.info(f"🗑️ 批量删除缓存: {pattern} ({count} 个key)")
-                return count
-            return 0
+            return count
         except Exception as e:
             logger.error(f"Redis DELETE_PATTERN失败 {pattern}: {e}")
             return 0
@@ -278,15 +492,373 @@ class CacheService:
             logger.error(f"Redis LRANGE失败: {e}")
             return []
     
+    # ==================== 标签索引失效 ====================
+    
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        """标签集合的Redis键"""
+        return f"tag:{tag}"
+    
+    def _register_tags(self, pipe, key: str, tags: Optional[List[str]], expire: int):
+        """在管道中把缓存键登记到各标签集合"""
+        if not tags:
+            return
+        tag_ttl = max(expire, self.tag_ttl)
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            pipe.sadd(tag_key, key)
+            pipe.expire(tag_key, tag_ttl)
+    
+    def invalidate_tags(self, *tags: str) -> int:
+        """
+        按标签批量清除缓存
+        
+        通过Lua脚本一次往返完成 SMEMBERS + UNLINK，
+        开销只与标签下的缓存数量有关，与 keyspace 总大小无关。
+        标签须以其缓存键的顶级命名空间开头（如 stats:dashboard 对应 stats:*），
+        L1 据此丢弃本地副本。
+        
+        Args:
+            tags: 一个或多个标签
+            
+        Returns:
+            删除的缓存键数量
+        """
+        if not self.enabled or not tags:
+            return 0
+        
+        try:
+            count = self._invalidate_tags_script(keys=[self._tag_key(t) for t in tags])
+            # L1 不记录标签归属：按标签所属顶级命名空间（如 stats:*、article:*）整体丢弃
+            self._broadcast_l1_invalidation(
+                patterns=sorted({f"{t.split(':', 1)[0]}:*" for t in tags})
+            )
+            logger.debug(f"🗑️ 按标签清除缓存: {list(tags)} ({count} 个key)")
+            return count
+        except Exception as e:
+            logger.error(f"Redis 标签失效失败 {list(tags)}: {e}")
+            return 0
+    
+    # ==================== 命名空间代数（版本化缓存键） ====================
+    
+    @staticmethod
+    def _generation_key(namespace: str) -> str:
+        """命名空间代数计数器的Redis键"""
+        return f"gen:{namespace}"
+    
+    def get_generations(self, *namespaces: str) -> List[int]:
+        """
+        批量读取命名空间代数（一次MGET）
+        
+        Args:
+            namespaces: 命名空间列表
+            
+        Returns:
+            与命名空间一一对应的代数，不存在或Redis不可用时为0
+        """
+        if not self.enabled or not namespaces:
+            return [0] * len(namespaces)
+        
+        gen_keys = [self._generation_key(ns) for ns in namespaces]
+        generations = [_MISSING] * len(gen_keys)
+        if self.local_cache is not None:
+            generations = [self.local_cache.get(k) for k in gen_keys]
+            if _MISSING not in generations:
+                return generations
+        
+        try:
+            missing = [i for i, g in enumerate(generations) if g is _MISSING]
+            values = self.redis_client.mget([gen_keys[i] for i in missing])
+            for i, v in zip(missing, values):
+                generations[i] = int(v) if v else 0
+                if self.local_cache is not None:
+                    self.local_cache.set(gen_keys[i], generations[i])
+            return generations
+        except Exception as e:
+            logger.error(f"Redis 读取代数失败 {list(namespaces)}: {e}")
+            return [0] * len(namespaces)
+    
+    def bump_generation(self, *namespaces: str) -> bool:
+        """
+        递增命名空间代数
+        
+        嵌入旧代数的缓存键不再被读取，随自身TTL自然过期，无需删除。
+        
+        Args:
+            namespaces: 命名空间列表
+            
+        Returns:
+            是否成功
+        """
+        if not self.enabled or not namespaces:
+            return False
+        
+        try:
+            if len(namespaces) == 1:
+                self.redis_client.incr(self._generation_key(namespaces[0]))
+            else:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for ns in namespaces:
+                    pipe.incr(self._generation_key(ns))
+                pipe.execute()
+            self._broadcast_l1_invalidation(keys=[self._generation_key(ns) for ns in namespaces])
+            logger.debug(f"🔢 命名空间代数已递增: {list(namespaces)}")
+            return True
+        except Exception as e:
+            logger.error(f"Redis 递增代数失败 {list(namespaces)}: {e}")
+            return False
+    
+    def task_list_cache_key(
+        self,
+        project_id: Optional[str],
+        status: Optional[str],
+        assigned_to: Optional[str],
+        skip: int,
+        limit: int,
+        include_completed_projects: bool,
+        variant: str = ""
+    ) -> str:
+        """
+        生成任务列表缓存键
+        
+        键中嵌入任务列表代数，invalidate_tasks_cache 递增后旧键即失效。
+        variant 区分同一筛选条件下的不同返回形态（如游标分页、计数方式）。
+        """
+        version = self.get_generations("tasks:list")[0]
+        variant_part = f":{variant}" if variant else ""
+        return (
+            f"tasks:list:{project_id or 'all'}:{status or 'all'}:{assigned_to or 'all'}"
+            f":{skip}:{limit}:{include_completed_projects}{variant_part}:v{version}"
+        )
+    
+    # ==================== 防击穿（single-flight）与提前刷新 ====================
+    
+    @staticmethod
+    def _compute_time_key(key: str) -> str:
+        """记录重算耗时（毫秒）的伴随键"""
+        return f"{key}:xf"
+    
+    def get_or_set(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        expire: int = None,
+        tags: Optional[List[str]] = None
+    ) -> Any:
+        """
+        读取缓存，未命中时只由一个请求重算并回填
+        
+        - 同进程内并发的未命中请求共享同一次重算结果
+        - 跨 worker 通过 Redis 锁协调，未抢到锁的请求有旧值则直接返回旧值，
+          否则轮询等待回填，超时后自行计算
+        - 按 XFetch 算法在TTL到期前概率性地提前刷新，重算越慢、越临近过期，
+          越可能提前刷新，避免热点key同时过期
+        
+        Args:
+            key: 缓存键
+            compute: 重算函数（无参数），返回 None 时不写缓存
+            expire: 过期时间（秒）
+            tags: 失效标签列表
+            
+        Returns:
+            缓存值或重算结果
+        """
+        return self._get_or_set(key, compute, expire, tags, raw=False)
+    
+    def get_or_set_raw(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        expire: int = None,
+        tags: Optional[List[str]] = None
+    ) -> bytes:
+        """
+        与 get_or_set 相同，但返回序列化好的JSON字节
+        
+        命中时不经过反序列化与再序列化，可直接作为HTTP响应体返回。
+        """
+        return self._get_or_set(key, compute, expire, tags, raw=True)
+    
+    def _get_or_set(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        expire: Optional[int],
+        tags: Optional[List[str]],
+        raw: bool
+    ) -> Any:
+        if not self.enabled:
+            result = compute()
+            return dumps_json(result) if raw else result
+        
+        l1_key = key + _RAW_SUFFIX if raw else key
+        if self.local_cache is not None:
+            value = self.local_cache.get(l1_key)
+            if value is not _MISSING:
+                self._stats["l1_hits"] += 1
+                return value
+            self._stats["l1_misses"] += 1
+        
+        stale = None
+        try:
+            client = self._raw_client if raw else self.redis_client
+            pipe = client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            pipe.get(self._compute_time_key(key))
+            data, ttl_ms, compute_ms = pipe.execute()
+            if data:
+                self._stats["l2_hits"] += 1
+                value = data if raw else loads_json(data)
+                if not self._should_refresh_early(ttl_ms, compute_ms):
+                    if self.local_cache is not None:
+                        self.local_cache.set(l1_key, value)
+                    return value
+                logger.debug(f"⏳ 缓存提前刷新: {key} (剩余 {ttl_ms}ms)")
+                stale = value
+            else:
+                self._stats["l2_misses"] += 1
+        except Exception as e:
+            logger.error(f"Redis GET失败 {key}: {e}")
+        
+        return self._single_flight(key, compute, expire, tags, stale, raw)
+    
+    def _should_refresh_early(self, ttl_ms: Optional[int], compute_ms) -> bool:
+        """XFetch：-delta * beta * ln(rand) >= 剩余TTL 时提前刷新"""
+        if not self.early_refresh_beta or not compute_ms or ttl_ms is None or ttl_ms < 0:
+            return False
+        delta = int(compute_ms)
+        return -delta * self.early_refresh_beta * math.log(1.0 - random.random()) >= ttl_ms
+    
+    def _single_flight(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        expire: Optional[int],
+        tags: Optional[List[str]],
+        stale: Any,
+        raw: bool = False
+    ) -> Any:
+        """同一key只允许一个请求重算，其余请求等待结果或返回旧值"""
+        with self._flights_lock:
+            done = self._flights.get(key)
+            is_leader = done is None
+            if is_leader:
+                done = threading.Event()
+                self._flights[key] = done
+        
+        if not is_leader:
+            if stale is not None:
+                return stale
+            # 从缓存读取回填结果，而不是共享重算线程的对象（可能含ORM实例）
+            done.wait(self.flight_wait_timeout)
+            value = self._read(key, raw)
+            if value is not None:
+                return value
+            result = compute()
+            return dumps_json(result) if raw else result
+        
+        lock_key = f"lock:flight:{key}"
+        lock_token = uuid.uuid4().hex
+        lock_acquired = False
+        try:
+            lock_acquired = self.acquire_lock(lock_key, expire=self.flight_lock_ttl, token=lock_token)
+            if not lock_acquired:
+                # 其他 worker 正在重算
+                if stale is not None:
+                    return stale
+                deadline = time.monotonic() + self.flight_wait_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = self._read(key, raw)
+                    if value is not None:
+                        return value
+                logger.warning(f"⚠️ 等待缓存回填超时，自行计算: {key}")
+            
+            start = time.perf_counter()
+            result = compute()
+            compute_ms = int((time.perf_counter() - start) * 1000)
+            serialized = dumps_json(result)
+            if result is not None:
+                self._write(key, serialized, expire, tags, compute_ms=max(compute_ms, 1), raw=raw)
+            return serialized if raw else result
+        finally:
+            if lock_acquired:
+                # 重算可能超过锁 TTL，只释放自己持有的锁
+                self.release_lock(lock_key, token=lock_token)
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            done.set()
+    
+    def _read(self, key: str, raw: bool) -> Any:
+        """读取缓存：raw 时返回原始JSON字节"""
+        if not raw:
+            return self.get(key)
+        try:
+            return self._raw_client.get(key)
+        except Exception as e:
+            logger.error(f"Redis GET失败 {key}: {e}")
+            return None
+    
+    # ==================== L1 失效广播 ====================
+    
+    def _broadcast_l1_invalidation(self, keys: List[str] = None, patterns: List[str] = None):
+        """丢弃本进程的L1副本，并通知其他 worker 丢弃"""
+        if self.local_cache is None:
+            return
+        
+        if keys:
+            self.local_cache.delete(keys)
+        if patterns:
+            self.local_cache.delete_patterns(patterns)
+        try:
+            self.redis_client.publish(L1_INVALIDATION_CHANNEL, json.dumps({
+                "origin": self._instance_id,
+                "keys": keys or [],
+                "patterns": patterns or []
+            }))
+        except Exception as e:
+            logger.error(f"L1失效广播失败: {e}")
+    
+    def _listen_l1_invalidations(self):
+        """后台线程：订阅失效频道并丢弃对应的L1副本"""
+        while True:
+            try:
+                client = redis.from_url(
+                    settings.REDIS_URL,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    health_check_interval=30
+                )
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(L1_INVALIDATION_CHANNEL)
+                # 订阅建立前可能漏掉消息，清空本地副本
+                self.local_cache.delete_patterns(["*"])
+                for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") == self._instance_id:
+                        continue
+                    if payload.get("keys"):
+                        self.local_cache.delete(payload["keys"])
+                    if payload.get("patterns"):
+                        self.local_cache.delete_patterns(payload["patterns"])
+            except Exception as e:
+                logger.warning(f"⚠️ L1失效订阅中断，5秒后重连: {e}")
+                self.local_cache.delete_patterns(["*"])
+                time.sleep(5)
+    
     # ==================== 分布式锁 ====================
     
-    def acquire_lock(self, key: str, expire: int = 10) -> bool:
+    def acquire_lock(self, key: str, expire: int = 10, token: str = "1") -> bool:
         """
         获取分布式锁
         
         Args:
             key: 锁的键
             expire: 锁的过期时间（秒），防止死锁
+            token: 锁的值，释放时传入同一令牌可避免误删他人持有的锁
             
         Returns:
             是否获取成功
@@ -295,42 +867,38 @@ class CacheService:
             return True  # Redis不可用时，不阻塞业务
         
         try:
-            return self.redis_client.set(key, "1", nx=True, ex=expire)
+            return bool(self.redis_client.set(key, token, nx=True, ex=expire))
         except Exception:
             return True  # 失败时不阻塞业务
     
-    def release_lock(self, key: str):
-        """释放分布式锁"""
-        self.delete(key)
+    def release_lock(self, key: str, token: Optional[str] = None):
+        """
+        释放分布式锁
+        
+        传入 token 时比较后删除（锁已过期并被其他持有者获取时不删除），否则直接删除
+        """
+        if token is None:
+            self.delete(key)
+            return
+        if not self.enabled:
+            return
+        try:
+            self._release_lock_script(keys=[key], args=[token])
+        except Exception as e:
+            logger.error(f"释放锁失败 {key}: {e}")
     
     # ==================== 缓存失效辅助方法 ====================
     
-    def invalidate_tasks_cache(self, project_id: str = None, user_id: str = None):
+    def invalidate_tasks_cache(self):
         """
-        清除任务相关缓存
+        清除任务列表缓存（递增代数，单次原子INCR）
         
-        Args:
-            project_id: 如果指定，则只清除该项目的任务缓存
-            user_id: 如果指定，则清除该用户相关的任务缓存
-        """
-        if project_id and user_id:
-            # 清除特定项目和用户的任务缓存
-            self.delete_pattern(f"tasks:list:{project_id}:*:{user_id}:*")
-            self.delete_pattern(f"tasks:list:{project_id}:*:all:*")
-            self.delete_pattern(f"tasks:list:all:*:{user_id}:*")
-            logger.info(f"🗑️ 任务缓存已清除 (项目: {project_id}, 用户: {user_id})")
-        elif project_id:
-            # 清除特定项目的所有任务缓存
-            self.delete_pattern(f"tasks:list:{project_id}:*")
-            logger.info(f"🗑️ 任务缓存已清除 (项目: {project_id})")
-        elif user_id:
-            # 清除特定用户的所有任务缓存
-            self.delete_pattern(f"tasks:list:*:*:{user_id}:*")
-            logger.info(f"🗑️ 任务缓存已清除 (用户: {user_id})")
-        else:
-            # 清除所有任务列表缓存
-            self.delete_pattern("tasks:list:*")
-            logger.info("🗑️ 所有任务缓存已清除")
+        任务的任何变更都可能出现在未按项目/领取人筛选的列表（任务池、全部任务）中，
+        且领取人变更会同时影响新旧两人的列表，因此只维护一个全局代数：
+        所有任务列表缓存随之失效，读取时也只需取一个代数
+        """
+        self.bump_generation("tasks:list")
+        logger.info("🗑️ 任务列表缓存已失效")
     
     def invalidate_task_detail_cache(self, task_id: str):
         """清除任务详情缓存"""
@@ -339,7 +907,7 @@ class CacheService:
     
     def invalidate_projects_cache(self):
         """清除项目相关缓存"""
-        self.delete_pattern("projects:*")
+        self.invalidate_tags("projects")
         logger.info("🗑️ 项目缓存已清除")
     
     def invalidate_project_detail_cache(self, project_id: str):
@@ -350,7 +918,7 @@ class CacheService:
     
     def invalidate_users_cache(self):
         """清除用户相关缓存"""
-        self.delete_pattern("users:*")
+        self.invalidate_tags("users")
         logger.info("🗑️ 用户缓存已清除")
     
     def invalidate_user_detail_cache(self, user_id: str):
@@ -381,21 +949,14 @@ class CacheService:
                 # 生成缓存key
                 cache_key = self._generate_cache_key(key_prefix, args, kwargs)
                 
-                # 尝试从缓存获取
-                cached_result = self.get(cache_key)
-                if cached_result is not None:
-                    logger.info(f"🎯 缓存命中: {cache_key}")
-                    return cached_result
-                
-                # 执行函数
-                result = func(*args, **kwargs)
-                
-                # 写入缓存
-                if result is not None:
-                    self.set(cache_key, result, expire)
-                    logger.info(f"💾 缓存写入: {cache_key}")
-                
-                return result
+                # 读取缓存，未命中时单飞重算并回填
+                # （以键前缀作为标签，可用 invalidate_tags(key_prefix) 整体清除）
+                return self.get_or_set(
+                    cache_key,
+                    lambda: func(*args, **kwargs),
+                    expire,
+                    tags=[key_prefix]
+                )
             return wrapper
         return decorator
     
@@ -432,13 +993,29 @@ class CacheService:
             misses = info.get('keyspace_misses', 0)
             hit_rate = (hits / (hits + misses) * 100) if (hits + misses) > 0 else 0
             
+            l1_total = self._stats["l1_hits"] + self._stats["l1_misses"]
+            l2_total = self._stats["l2_hits"] + self._stats["l2_misses"]
+            
             return {
                 "enabled": True,
                 "used_memory": info.get('used_memory_human', 'N/A'),
                 "total_keys": dbsize,
                 "hit_rate": round(hit_rate, 2),
                 "ops_per_sec": info.get('instantaneous_ops_per_sec', 0),
-                "connected_clients": info.get('connected_clients', 0)
+                "connected_clients": info.get('connected_clients', 0),
+                # 本进程的分层命中统计（L2 只统计穿透L1后的请求）
+                "l1": {
+                    "enabled": self.local_cache is not None,
+                    "size": len(self.local_cache) if self.local_cache is not None else 0,
+                    "hits": self._stats["l1_hits"],
+                    "misses": self._stats["l1_misses"],
+                    "hit_rate": round(self._stats["l1_hits"] / l1_total * 100, 2) if l1_total else 0
+                },
+                "l2": {
+                    "hits": self._stats["l2_hits"],
+                    "misses": self._stats["l2_misses"],
+                    "hit_rate": round(self._stats["l2_hits"] / l2_total * 100, 2) if l2_total else 0
+                }
             }
         except Exception as e:
             logger.error(f"获取Redis统计信息失败: {e}")
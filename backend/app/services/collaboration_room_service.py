@@ -0,0 +1,662 @@
+"""
+协作文档房间引擎（OT）
+- 文档内容保存在分块文本缓冲（TextRope）中，每次操作只改动受影响的块
+- 操作日志按版本号索引，压缩（只保留最近 N 条）后仍能正确定位，过旧的客户端版本触发重新同步
+- 多 worker 通过 Redis Stream 分发操作：提交时用 Lua 按版本号做乐观并发控制，
+  版本号就是 Stream 条目 ID，其他 worker 按 ID 顺序追加应用
+- 定期把快照写回 Redis 与 CollaborationDocument.content（经 document_saves 记录差异历史），最后一个连接离开时也会写一次
+- 下发按 COLLAB_BATCH_WINDOW_MS 窗口合并：操作按版本顺序、光标按用户去重，每个连接一帧并发发送
+Redis 不可用时房间退化为进程内模式
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+import redis.asyncio as aioredis
+from fastapi import WebSocket
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.collaboration import CollaborationDocument
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# 房间 Redis 键的过期时间：无人编辑 7 天后清理（内容已落库）
+ROOM_KEY_TTL = 7 * 24 * 60 * 60
+# 读取 Stream 的阻塞时间（毫秒）
+STREAM_BLOCK_MS = 5000
+# 提交时因版本落后重新变换的最大次数
+MAX_SUBMIT_RETRIES = 5
+
+# 初始化共享房间：版本键或快照缺失时以数据库内容为准
+# KEYS: version, snapshot, ops  ARGV: db_version, db_content, ttl
+INIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 or redis.call('EXISTS', KEYS[2]) == 0 then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    redis.call('DEL', KEYS[2], KEYS[3])
+    redis.call('HSET', KEYS[2], 'version', ARGV[1], 'content', ARGV[2])
+    redis.call('EXPIRE', KEYS[2], ARGV[3])
+end
+return redis.call('HMGET', KEYS[2], 'version', 'content')
+"""
+
+# 提交操作：只有基于当前最新版本的操作才能写入，版本号作为 Stream 条目 ID
+# KEYS: version, ops  ARGV: expected_version, op_json, ttl
+# 返回 {1, 新版本} 成功；{0, 当前版本} 版本落后；{-1, 0} 房间已过期
+_SUBMIT_SCRIPT = """
+local head = tonumber(redis.call('GET', KEYS[1]))
+if head == nil then
+    return {-1, 0}
+end
+if head ~= tonumber(ARGV[1]) then
+    return {0, head}
+end
+local version = head + 1
+redis.call('SET', KEYS[1], version, 'EX', ARGV[3])
+redis.call('XADD', KEYS[2], version .. '-0', 'op', ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return {1, version}
+"""
+
+# 写快照：只前进不后退，并裁剪快照之前超出保留窗口的操作
+# KEYS: snapshot, ops, version  ARGV: version, content, ttl, keep
+SNAPSHOT_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+local version = tonumber(ARGV[1])
+if version <= current then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'content', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+local min_version = version - tonumber(ARGV[4])
+if min_version > 0 then
+    redis.call('XTRIM', KEYS[2], 'MINID', min_version .. '-0')
+end
+return 1
+"""
+
+
+# ==================== 文本缓冲 ====================
+
+class TextRope:
+    """
+    分块文本缓冲
+    文本按固定大小切块存储，插入/删除只重建受影响的块，不再整体切片拼接整篇文档
+    """
+
+    CHUNK_SIZE = 2048
+
+    def __init__(self, text: str = ""):
+        self._chunks: List[str] = self._split(text) or [""]
+        self._length = len(text)
+        self._cache: Optional[str] = text
+
+    def __len__(self) -> int:
+        return self._length
+
+    @classmethod
+    def _split(cls, text: str) -> List[str]:
+        return [text[i:i + cls.CHUNK_SIZE] for i in range(0, len(text), cls.CHUNK_SIZE)]
+
+    def _locate(self, pos: int) -> Tuple[int, int]:
+        """返回 (块下标, 块内偏移)；pos 等于文档长度时落在最后一块末尾"""
+        for index, chunk in enumerate(self._chunks):
+            if pos <= len(chunk):
+                return index, pos
+            pos -= len(chunk)
+        last = len(self._chunks) - 1
+        return last, len(self._chunks[last])
+
+    def splice(self, pos: int, dele: int, ins: str) -> Tuple[int, int]:
+        """删除 [pos, pos+dele) 并在 pos 插入 ins，返回裁剪到合法范围后的 (pos, dele)"""
+        pos = max(0, min(self._length, pos))
+        dele = max(0, min(self._length - pos, dele))
+        if not dele and not ins:
+            return pos, dele
+        start_index, start_offset = self._locate(pos)
+        end_index, end_offset = self._locate(pos + dele)
+        middle = (
+            self._chunks[start_index][:start_offset]
+            + ins
+            + self._chunks[end_index][end_offset:]
+        )
+        # 过小的块与相邻块合并，避免反复编辑后碎片化
+        if len(middle) < self.CHUNK_SIZE // 2:
+            if end_index + 1 < len(self._chunks):
+                end_index += 1
+                middle += self._chunks[end_index]
+            elif start_index > 0:
+                start_index -= 1
+                middle = self._chunks[start_index] + middle
+        self._chunks[start_index:end_index + 1] = self._split(middle)
+        if not self._chunks:
+            self._chunks = [""]
+        self._length += len(ins) - dele
+        self._cache = None
+        return pos, dele
+
+    def to_string(self) -> str:
+        if self._cache is None:
+            self._cache = "".join(self._chunks)
+        return self._cache
+
+
+# ==================== 操作日志与变换 ====================
+
+class OpLog:
+    """
+    按版本号索引的操作日志（只保留最近 capacity 条）
+    每条操作记录其产生的版本号，head_version 为当前最新版本
+    """
+
+    def __init__(self, head_version: int, capacity: int):
+        self.head_version = head_version
+        self._ops: Deque[dict] = deque(maxlen=capacity)
+
+    def append(self, op: dict):
+        self._ops.append(op)
+        self.head_version = op["version"]
+
+    def since(self, version: int) -> Optional[List[dict]]:
+        """返回产生版本大于 version 的操作；需要的操作已被压缩时返回 None"""
+        if version >= self.head_version:
+            return []
+        first_version = self.head_version - len(self._ops) + 1
+        if version + 1 < first_version:
+            return None
+        return list(islice(self._ops, version + 1 - first_version, None))
+
+
+def _map_index(index: int, op: dict) -> int:
+    """把旧版本上的位置映射到应用 op 之后的位置"""
+    pos = op["pos"]
+    dele = op["del"]
+    if index <= pos:
+        return index
+    if index >= pos + dele:
+        return index - dele + len(op["ins"])
+    # 落在对方删除的区间内，收缩到对方插入内容之后
+    return pos + len(op["ins"])
+
+
+def transform_op(pos: int, dele: int, prior_ops: List[dict]) -> Tuple[int, int]:
+    """把基于旧版本的 (pos, del) 依次变换到 prior_ops 之后"""
+    start, end = pos, pos + dele
+    for op in prior_ops:
+        start = _map_index(start, op)
+        end = max(start, _map_index(end, op))
+    return start, end - start
+
+
+# ==================== 房间 ====================
+
+class CollaborationRoom:
+    """单个文档在本 worker 内的房间状态"""
+
+    def __init__(self, document_id: str, content: str, version: int):
+        self.document_id = document_id
+        self.text = TextRope(content)
+        self.version = version
+        self.log = OpLog(version, settings.COLLAB_OP_LOG_SIZE)
+        self.clients: Set[WebSocket] = set()
+        # 已占位但尚未完成 init 的加入者（占位期间房间不会被关闭）
+        self.pending_joins = 0
+        # 串行化本房间的操作提交与远端操作应用
+        self.lock = asyncio.Lock()
+        self.distributed = False
+        self.persisted_version = version
+        # 最近一条操作的提交者，落库时记为编辑者
+        self.last_editor: Tuple[Optional[str], Optional[str]] = (None, None)
+        self.tasks: List[asyncio.Task] = []
+        # 出站合并：窗口内的消息按顺序暂存，光标/选区按用户只保留最新一条
+        self.outbox: List[Tuple[str, Optional[int], Optional[WebSocket]]] = []
+        self.presence: Dict[str, Tuple[str, Optional[WebSocket]]] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+        # 保证同一连接上的帧按顺序发出
+        self.send_lock = asyncio.Lock()
+        # 每个连接已拿到的基准版本（init 时刻），版本不超过它的操作不再下发
+        self.client_versions: Dict[WebSocket, int] = {}
+        # 接收合并帧的连接（其余连接逐条接收）
+        self.batch_clients: Set[WebSocket] = set()
+
+        prefix = f"collab:doc:{document_id}"
+        self.version_key = f"{prefix}:version"
+        self.snapshot_key = f"{prefix}:snapshot"
+        self.ops_key = f"{prefix}:ops"
+
+    def reset(self, content: str, version: int):
+        """用快照整体替换（远端操作缺失时重新同步）"""
+        self.text = TextRope(content)
+        self.version = version
+        self.log = OpLog(version, settings.COLLAB_OP_LOG_SIZE)
+
+    def apply(self, version: int, op: dict) -> dict:
+        """应用一条已定序的操作，返回广播消息"""
+        pos, dele = self.text.splice(op["pos"], op["del"], op["ins"])
+        self.version = version
+        self.last_editor = (op.get("user_id"), op.get("user_name"))
+        self.log.append({"version": version, "pos": pos, "del": dele, "ins": op["ins"]})
+        return {
+            "type": "op",
+            "version": version,
+            "pos": pos,
+            "del": dele,
+            "ins": op["ins"],
+            "user_id": op.get("user_id"),
+            "user_name": op.get("user_name")
+        }
+
+    def init_message(self) -> dict:
+        return {
+            "type": "init",
+            "version": self.version,
+            "content": self.text.to_string(),
+        }
+
+
+class CollaborationRoomManager:
+    """本 worker 的房间管理器"""
+
+    def __init__(self):
+        self._rooms: Dict[str, CollaborationRoom] = {}
+        self._room_locks: Dict[str, asyncio.Lock] = {}
+        self._client: Optional[aioredis.Redis] = None
+        self._scripts = {}
+
+    # ==================== Redis ====================
+
+    def _get_client(self) -> Optional[aioredis.Redis]:
+        if not redis_client.is_available():
+            return None
+        if self._client is None:
+            self._client = aioredis.from_url(
+                settings.REDIS_URL,
+                decode_responses=True,
+                socket_connect_timeout=2,
+                health_check_interval=30
+            )
+            self._scripts = {
+                "init": self._client.register_script(INIT_SCRIPT),
+                "submit": self._client.register_script(_SUBMIT_SCRIPT),
+                "snapshot": self._client.register_script(SNAPSHOT_SCRIPT),
+            }
+        return self._client
+
+    # ==================== 加入/离开 ====================
+
+    async def join(self, document_id: str, websocket: WebSocket, batch: bool = False) -> CollaborationRoom:
+        """
+        加入房间（必要时加载），在房间锁内发送 init 并记录基准版本，
+        之后只下发版本更新的操作；batch=True 的连接按窗口接收合并帧
+        """
+        while True:
+            lock = self._room_locks.setdefault(document_id, asyncio.Lock())
+            async with lock:
+                if self._room_locks.get(document_id) is not lock:
+                    # 等待期间房间已关闭、锁条目已删除：换用新锁重试
+                    continue
+                room = self._rooms.get(document_id)
+                if room is None:
+                    try:
+                        room = await self._open_room(document_id)
+                    except Exception:
+                        self._room_locks.pop(document_id, None)
+                        raise
+                    self._rooms[document_id] = room
+                # 在管理器锁内占位，避免最后一个连接此时离开而关闭房间
+                room.pending_joins += 1
+                break
+        try:
+            async with room.lock:
+                await self._send_init(room, websocket)
+                room.clients.add(websocket)
+                if batch:
+                    room.batch_clients.add(websocket)
+        finally:
+            room.pending_joins -= 1
+            if websocket not in room.clients:
+                await self._close_if_idle(room)
+        return room
+
+    async def _send_init(self, room: CollaborationRoom, websocket: WebSocket):
+        """
+        给单个连接发送 init（调用方持有房间锁）
+        与出站合并共用 send_lock：正在发送的合并帧先发完，init 之后不会再收到版本不超过基准的旧操作
+        """
+        async with room.send_lock:
+            await websocket.send_json(room.init_message())
+            room.client_versions[websocket] = room.version
+
+    async def leave(self, room: CollaborationRoom, websocket: WebSocket):
+        """离开房间；最后一个连接离开时写快照并释放房间"""
+        self._drop_client(room, websocket)
+        await self._close_if_idle(room)
+
+    async def _close_if_idle(self, room: CollaborationRoom):
+        """房间没有连接也没有占位的加入者时关闭，并删除对应的锁条目"""
+        if room.clients or room.pending_joins:
+            return
+        lock = self._room_locks.get(room.document_id)
+        if lock is None:
+            return
+        async with lock:
+            if room.clients or room.pending_joins or self._rooms.get(room.document_id) is not room:
+                return
+            self._rooms.pop(room.document_id, None)
+            self._cancel_tasks(room)
+            try:
+                await self._snapshot(room)
+            finally:
+                self._room_locks.pop(room.document_id, None)
+            logger.info(f"📄 [Collab] 房间已关闭: {room.document_id} (v{room.version})")
+
+    async def _open_room(self, document_id: str) -> CollaborationRoom:
+        content, version = await asyncio.to_thread(self._load_document, document_id)
+        room = CollaborationRoom(document_id, content, version)
+        if self._get_client() is None:
+            logger.info(f"📄 [Collab] 房间已打开（进程内模式）: {document_id} (v{version})")
+        else:
+            await self._attach_shared(room, content, version)
+        room.tasks.append(asyncio.create_task(self._snapshot_loop(room)))
+        return room
+
+    async def _attach_shared(self, room: CollaborationRoom, content: str, version: int):
+        """接入 Redis 共享房间：读取快照、追上 Stream，并启动读取任务"""
+        try:
+            snapshot_version, snapshot_content = await self._scripts["init"](
+                keys=[room.version_key, room.snapshot_key, room.ops_key],
+                args=[version, content, ROOM_KEY_TTL]
+            )
+            room.reset(snapshot_content or "", int(snapshot_version))
+            room.persisted_version = min(room.persisted_version, room.version)
+            room.distributed = True
+            await self._catch_up(room)
+            room.tasks.append(asyncio.create_task(self._read_stream(room)))
+            logger.info(f"📄 [Collab] 房间已打开: {room.document_id} (v{room.version})")
+        except Exception as e:
+            room.distributed = False
+            logger.warning(f"⚠️ [Collab] 共享房间不可用，退化为进程内模式: {room.document_id}: {e}")
+
+    @staticmethod
+    def _load_document(document_id: str) -> Tuple[str, int]:
+        db = SessionLocal()
+        try:
+            row = db.query(CollaborationDocument.content, CollaborationDocument.version).filter(
+                CollaborationDocument.id == document_id
+            ).first()
+            if row is None:
+                return "", 1
+            return row[0] or "", row[1] or 1
+        finally:
+            db.close()
+
+    # ==================== 提交操作 ====================
+
+    async def submit(
+        self,
+        room: CollaborationRoom,
+        websocket: WebSocket,
+        client_version: int,
+        pos: int,
+        dele: int,
+        ins: str,
+        user_id=None,
+        user_name=None
+    ):
+        """
+        变换并提交一条客户端操作，然后广播给房间内所有连接（包含发送者）
+        客户端版本已超出操作日志窗口（或多次重试仍无法定序）时，丢弃该操作并给该连接重新发送 init
+        """
+        async with room.lock:
+            for _ in range(MAX_SUBMIT_RETRIES):
+                prior = room.log.since(client_version)
+                if prior is None:
+                    break
+                op_pos, op_del = transform_op(pos, dele, prior)
+                op = {"pos": op_pos, "del": op_del, "ins": ins, "user_id": user_id, "user_name": user_name}
+                version = await self._sequence(room, op)
+                if version is not None:
+                    message = room.apply(version, op)
+                    break
+            else:
+                prior = None
+            if prior is None:
+                # 无法定序：丢弃该操作，让客户端按最新内容重新开始
+                await self._send_init(room, websocket)
+                return
+        await self.broadcast(room, message)
+
+    async def _sequence(self, room: CollaborationRoom, op: dict) -> Optional[int]:
+        """为操作分配版本号；返回 None 表示已追上远端操作，需要重新变换（调用方持有房间锁）"""
+        if not room.distributed:
+            return room.version + 1
+        try:
+            status, head = await self._scripts["submit"](
+                keys=[room.version_key, room.ops_key],
+                args=[room.version, json.dumps(op, ensure_ascii=False), ROOM_KEY_TTL]
+            )
+        except Exception as e:
+            room.distributed = False
+            logger.error(f"❌ [Collab] 提交操作到 Redis 失败，房间退化为进程内模式: {e}")
+            return room.version + 1
+        if status == 1:
+            return int(head)
+        if status == -1:
+            # 共享房间已过期：以本地状态重新建立
+            await self._scripts["init"](
+                keys=[room.version_key, room.snapshot_key, room.ops_key],
+                args=[room.version, room.text.to_string(), ROOM_KEY_TTL]
+            )
+        await self._catch_up(room)
+        return None
+
+    # ==================== 远端操作 ====================
+
+    async def _catch_up(self, room: CollaborationRoom):
+        """读取并应用本地版本之后的全部远端操作（调用方持有房间锁或房间尚未公开）"""
+        entries = await self._client.xrange(room.ops_key, min=f"{room.version + 1}-0", max="+")
+        await self._apply_entries(room, entries)
+
+    async def _apply_entries(self, room: CollaborationRoom, entries):
+        messages = []
+        for entry_id, fields in entries:
+            version = int(entry_id.split("-")[0])
+            if version <= room.version:
+                continue
+            if version != room.version + 1:
+                await self._resync(room)
+                return
+            messages.append(room.apply(version, json.loads(fields["op"])))
+        for message in messages:
+            await self.broadcast(room, message)
+
+    async def _resync(self, room: CollaborationRoom):
+        """所需操作已被裁剪：从快照重新加载并通知本地连接"""
+        snapshot_version, snapshot_content = await self._client.hmget(room.snapshot_key, "version", "content")
+        if snapshot_version is None:
+            return
+        room.reset(snapshot_content or "", int(snapshot_version))
+        entries = await self._client.xrange(room.ops_key, min=f"{room.version + 1}-0", max="+")
+        for entry_id, fields in entries:
+            room.apply(int(entry_id.split("-")[0]), json.loads(fields["op"]))
+        logger.warning(f"🔄 [Collab] 房间已从快照重新同步: {room.document_id} (v{room.version})")
+        for ws in room.clients:
+            room.client_versions[ws] = room.version
+        await self.broadcast(room, room.init_message())
+
+    async def _read_stream(self, room: CollaborationRoom):
+        """后台任务：阻塞读取其他 worker 写入的操作"""
+        while True:
+            try:
+                response = await self._client.xread(
+                    {room.ops_key: f"{room.version}-0"}, block=STREAM_BLOCK_MS, count=500
+                )
+                if not response:
+                    continue
+                async with room.lock:
+                    for _, entries in response:
+                        await self._apply_entries(room, entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ [Collab] 读取操作流失败，1秒后重试: {room.document_id}: {e}")
+                await asyncio.sleep(1)
+
+    # ==================== 广播 ====================
+
+    async def broadcast(self, room: CollaborationRoom, message: dict, exclude: Optional[WebSocket] = None):
+        """
+        下发消息给房间内连接（exclude 除外）
+        开启合并窗口时只入队，窗口结束后每个连接一帧；窗口为 0 时立即发送
+        """
+        version = message.get("version") if message.get("type") == "op" else None
+        room.outbox.append((json.dumps(message, ensure_ascii=False), version, exclude))
+        await self._schedule_flush(room)
+
+    async def broadcast_presence(self, room: CollaborationRoom, message: dict, source: WebSocket):
+        """光标/选区更新：同一用户在窗口内只保留最新一条，不回发给来源连接"""
+        user_key = str(message.get("user_id") or id(source))
+        room.presence[user_key] = (json.dumps(message, ensure_ascii=False), source)
+        await self._schedule_flush(room)
+
+    async def _schedule_flush(self, room: CollaborationRoom):
+        window_ms = settings.COLLAB_BATCH_WINDOW_MS
+        if window_ms <= 0:
+            await self._flush(room)
+            return
+        if room.flush_task is None or room.flush_task.done():
+            room.flush_task = asyncio.create_task(self._flush_later(room, window_ms / 1000))
+
+    async def _flush_later(self, room: CollaborationRoom, delay: float):
+        # 发送期间新到的消息由同一任务在下一个窗口发出
+        while True:
+            await asyncio.sleep(delay)
+            await self._flush(room)
+            if not room.outbox and not room.presence:
+                return
+
+    async def _flush(self, room: CollaborationRoom):
+        """把暂存的消息按连接组帧并发发送，发送失败的连接移出房间"""
+        async with room.send_lock:
+            await self._flush_locked(room)
+
+    async def _flush_locked(self, room: CollaborationRoom):
+        outbox, room.outbox = room.outbox, []
+        presence, room.presence = list(room.presence.values()), {}
+        if not outbox and not presence:
+            return
+        targets = []
+        for ws in list(room.clients):
+            baseline = room.client_versions.get(ws, 0)
+            texts = [
+                text for text, version, exclude in outbox
+                if exclude is not ws and (version is None or version > baseline)
+            ]
+            texts.extend(text for text, source in presence if source is not ws)
+            if texts:
+                targets.append((ws, texts))
+        if not targets:
+            return
+        results = await asyncio.gather(
+            *(self._send_texts(room, ws, texts) for ws, texts in targets), return_exceptions=True
+        )
+        for (ws, _), result in zip(targets, results):
+            if isinstance(result, Exception):
+                self._drop_client(room, ws)
+
+    @staticmethod
+    async def _send_texts(room: CollaborationRoom, websocket: WebSocket, texts: List[str]):
+        if websocket in room.batch_clients:
+            frame = '{"type":"batch","messages":[' + ",".join(texts) + "]}"
+            await asyncio.wait_for(websocket.send_text(frame), timeout=settings.WS_SEND_TIMEOUT)
+            return
+        for text in texts:
+            await asyncio.wait_for(websocket.send_text(text), timeout=settings.WS_SEND_TIMEOUT)
+
+    @staticmethod
+    def _drop_client(room: CollaborationRoom, websocket: WebSocket):
+        room.clients.discard(websocket)
+        room.batch_clients.discard(websocket)
+        room.client_versions.pop(websocket, None)
+
+    @staticmethod
+    def _cancel_tasks(room: CollaborationRoom):
+        for task in room.tasks:
+            task.cancel()
+        if room.flush_task is not None:
+            room.flush_task.cancel()
+
+    # ==================== 快照 ====================
+
+    async def _snapshot_loop(self, room: CollaborationRoom):
+        while True:
+            await asyncio.sleep(settings.COLLAB_SNAPSHOT_INTERVAL_SECONDS)
+            try:
+                await self._snapshot(room)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ [Collab] 写快照失败: {room.document_id}: {e}")
+
+    async def _snapshot(self, room: CollaborationRoom):
+        """把当前内容写回 Redis 快照与数据库（版本未前进时跳过）"""
+        if room.version <= room.persisted_version:
+            return
+        version = room.version
+        content = room.text.to_string()
+        if room.distributed:
+            try:
+                await self._scripts["snapshot"](
+                    keys=[room.snapshot_key, room.ops_key, room.version_key],
+                    args=[version, content, ROOM_KEY_TTL, settings.COLLAB_OP_LOG_SIZE]
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ [Collab] 写 Redis 快照失败: {room.document_id}: {e}")
+        editor_id, editor_name = room.last_editor
+        await asyncio.to_thread(self._persist_document, room.document_id, version, content, editor_id, editor_name)
+        room.persisted_version = version
+
+    @staticmethod
+    def _persist_document(document_id: str, version: int, content: str, editor_id=None, editor_name=None):
+        """写回数据库并记录差异历史；只在数据库版本更旧时覆盖，多个 worker 重复写入无副作用"""
+        from app.services.document_save_service import document_saves
+
+        db = SessionLocal()
+        try:
+            document_saves.persist(db, document_id, version, content, editor_id, editor_name)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # ==================== 生命周期 ====================
+
+    async def close(self):
+        """应用关闭时写出所有房间快照"""
+        for room in list(self._rooms.values()):
+            self._cancel_tasks(room)
+            try:
+                await self._snapshot(room)
+            except Exception as e:
+                logger.error(f"❌ [Collab] 关闭时写快照失败: {room.document_id}: {e}")
+        self._rooms.clear()
+        self._room_locks.clear()
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def get_stats(self) -> dict:
+        return {
+            "rooms": len(self._rooms),
+            "clients": sum(len(room.clients) for room in self._rooms.values()),
+        }
+
+
+# 全局实例
+collaboration_rooms = CollaborationRoomManager()
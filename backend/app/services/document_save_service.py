@@ -0,0 +1,424 @@
+"""
+协作文档增量保存服务
+- 客户端提交基于某个版本的操作（或整篇内容，由服务端换算成一次替换），按版本号做冲突检测
+- 保存写入协作房间共用的 Redis 版本键与操作 Stream（打开着的房间会实时收到），
+  并登记到脏文档索引，由定时任务合并落库
+- 落库时 DocumentEditHistory.content_diff 只记录紧凑差异，每隔若干条记录一次全文快照，
+  任意版本都可以从最近的快照加若干差异重建
+Redis 不可用时直接在数据库行锁内应用并落库
+"""
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.collaboration import CollaborationDocument, DocumentEditHistory
+from app.models.user import User
+from app.services.collaboration_room_service import (
+    ROOM_KEY_TTL, TextRope, INIT_SCRIPT, SNAPSHOT_SCRIPT
+)
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# 有未落库保存的文档，score 为首次变脏的时间
+DIRTY_INDEX_KEY = "collab:docs:dirty"
+
+# 历史记录类型
+ACTION_DIFF = "edit_content"
+ACTION_SNAPSHOT = "content_snapshot"
+
+# 增量保存：只有基于最新版本的保存才能写入，每个操作占一个版本号（与房间操作共用 Stream）
+# KEYS: version, ops, dirty  ARGV: base_version, ttl, 文档ID, now, op_json...
+# 返回 {1, 新版本} 成功；{0, 当前版本} 版本冲突；{-1, 0} 共享状态不存在
+_DELTA_SAVE_SCRIPT = """
+local head = tonumber(redis.call('GET', KEYS[1]))
+if head == nil then
+    return {-1, 0}
+end
+if head ~= tonumber(ARGV[1]) then
+    return {0, head}
+end
+local version = head
+for i = 5, #ARGV do
+    version = version + 1
+    redis.call('XADD', KEYS[2], version .. '-0', 'op', ARGV[i])
+end
+redis.call('SET', KEYS[1], version, 'EX', ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('ZADD', KEYS[3], 'NX', ARGV[4], ARGV[3])
+return {1, version}
+"""
+
+# 落库完成后清除脏标记：期间又有新保存则保留，等下一轮
+# KEYS: version, dirty  ARGV: 已落库版本, 文档ID
+_CLEAR_DIRTY_SCRIPT = """
+local head = tonumber(redis.call('GET', KEYS[1]) or '0')
+if head <= tonumber(ARGV[1]) then
+    redis.call('ZREM', KEYS[2], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class VersionConflict(Exception):
+    """保存所基于的版本不是最新版本"""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"版本冲突，当前版本 {current_version}")
+        self.current_version = current_version
+
+
+class DocumentNotFound(Exception):
+    """保存过程中文档已被删除"""
+
+    def __init__(self, document_id: str):
+        super().__init__(f"文档不存在: {document_id}")
+        self.document_id = document_id
+
+
+def diff_splice(old: str, new: str) -> Tuple[int, int, str]:
+    """去掉公共前后缀，把 old -> new 表示为一次替换 (pos, del, ins)"""
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[len(old) - 1 - suffix] == new[len(new) - 1 - suffix]:
+        suffix += 1
+    return prefix, len(old) - prefix - suffix, new[prefix:len(new) - suffix]
+
+
+def apply_ops(content: str, ops: List[dict]) -> str:
+    """按顺序应用操作（越界位置会被裁剪，与房间引擎一致）"""
+    text = TextRope(content)
+    for op in ops:
+        text.splice(op["pos"], op["del"], op["ins"])
+    return text.to_string()
+
+
+class DocumentSaveService:
+    """增量保存、合并落库与历史版本重建"""
+
+    def __init__(self):
+        self._scripts = None
+        self._stats = {"saves": 0, "conflicts": 0, "flushed": 0, "snapshots": 0}
+
+    @staticmethod
+    def _keys(document_id: str) -> Tuple[str, str, str]:
+        prefix = f"collab:doc:{document_id}"
+        return f"{prefix}:version", f"{prefix}:snapshot", f"{prefix}:ops"
+
+    def _client(self):
+        if not redis_client.is_available():
+            return None
+        client = redis_client.get_instance()
+        if self._scripts is None and client is not None:
+            self._scripts = {
+                "init": client.register_script(INIT_SCRIPT),
+                "delta": client.register_script(_DELTA_SAVE_SCRIPT),
+                "snapshot": client.register_script(SNAPSHOT_SCRIPT),
+                "clear": client.register_script(_CLEAR_DIRTY_SCRIPT),
+            }
+        return client
+
+    # ==================== 保存 ====================
+
+    def save(
+        self,
+        db: Session,
+        document: CollaborationDocument,
+        base_version: int,
+        ops: List[dict],
+        editor: User,
+    ) -> int:
+        """
+        提交基于 base_version 的操作，返回保存后的版本号
+
+        base_version 不是最新版本时抛出 VersionConflict
+        """
+        editor_name = editor.real_name or editor.username
+        ops = [
+            {"pos": op["pos"], "del": op["del"], "ins": op["ins"], "user_id": editor.id, "user_name": editor_name}
+            for op in ops
+        ]
+        client = self._client()
+        if client is not None:
+            try:
+                version = self._save_shared(document, base_version, ops)
+                self._stats["saves"] += 1
+                return version
+            except VersionConflict:
+                self._stats["conflicts"] += 1
+                raise
+            except Exception as e:
+                logger.error(f"❌ [DocSave] 写入 Redis 失败，直接落库: {e}")
+                redis_client.mark_disconnected()
+        version = self._save_direct(db, document.id, base_version, ops, editor)
+        self._stats["saves"] += 1
+        return version
+
+    def save_content(
+        self,
+        db: Session,
+        document: CollaborationDocument,
+        content: str,
+        editor: User,
+        base_version: Optional[int] = None,
+    ) -> int:
+        """
+        整篇内容保存：与最新内容比较换算成一次替换后按增量保存
+
+        未提供 base_version 时以最新版本为基准（后写覆盖，兼容旧接口）
+        """
+        current, version = self.current(db, document)
+        if base_version is not None and base_version != version:
+            self._stats["conflicts"] += 1
+            raise VersionConflict(version)
+        pos, dele, ins = diff_splice(current, content)
+        if not dele and not ins:
+            return version
+        return self.save(db, document, version, [{"pos": pos, "del": dele, "ins": ins}], editor)
+
+    def _save_shared(self, document: CollaborationDocument, base_version: int, ops: List[dict]) -> int:
+        version_key, snapshot_key, ops_key = self._keys(document.id)
+        args = [base_version, ROOM_KEY_TTL, document.id, int(time.time())]
+        args.extend(json.dumps(op, ensure_ascii=False) for op in ops)
+        for _ in range(2):
+            status, head = self._scripts["delta"](keys=[version_key, ops_key, DIRTY_INDEX_KEY], args=args)
+            if status == 1:
+                return int(head)
+            if status == 0:
+                raise VersionConflict(int(head))
+            # 共享状态尚未建立（或已过期）：以数据库内容为准初始化后重试
+            self._scripts["init"](
+                keys=[version_key, snapshot_key, ops_key],
+                args=[document.version or 1, document.content or "", ROOM_KEY_TTL]
+            )
+        raise RuntimeError("初始化共享文档状态失败")
+
+    def _save_direct(self, db: Session, document_id: str, base_version: int, ops: List[dict], editor: User) -> int:
+        """Redis 不可用：行锁内校验版本并立即落库"""
+        document = db.query(CollaborationDocument).filter(
+            CollaborationDocument.id == document_id
+        ).with_for_update().first()
+        if document is None:
+            db.rollback()
+            raise DocumentNotFound(document_id)
+        current_version = document.version or 1
+        if current_version != base_version:
+            db.rollback()
+            self._stats["conflicts"] += 1
+            raise VersionConflict(current_version)
+        version = current_version + len(ops)
+        content = apply_ops(document.content or "", ops)
+        self._write_version(db, document, version, content, editor.id, editor.real_name or editor.username)
+        db.commit()
+        return version
+
+    # ==================== 读取 ====================
+
+    def current(self, db: Session, document: CollaborationDocument) -> Tuple[str, int]:
+        """返回 (最新内容, 最新版本)：Redis 中有未落库的保存时以其为准"""
+        client = self._client()
+        if client is not None:
+            try:
+                head = self._shared_head(client, document.id)
+                if head is not None and head[1] >= (document.version or 1):
+                    return head
+            except Exception as e:
+                logger.warning(f"⚠️ [DocSave] 读取共享文档状态失败: {e}")
+                redis_client.mark_disconnected()
+        return document.content or "", document.version or 1
+
+    def _shared_head(self, client, document_id: str) -> Optional[Tuple[str, int]]:
+        """Redis 快照 + 其后的操作 = 最新内容"""
+        _, snapshot_key, ops_key = self._keys(document_id)
+        snapshot_version, content = client.hmget(snapshot_key, "version", "content")
+        if snapshot_version is None:
+            return None
+        version = int(snapshot_version)
+        entries = client.xrange(ops_key, min=f"{version + 1}-0", max="+")
+        ops = []
+        for entry_id, fields in entries:
+            entry_version = int(entry_id.split("-")[0])
+            if entry_version != version + 1:
+                break
+            ops.append(json.loads(fields["op"]))
+            version = entry_version
+        return apply_ops(content or "", ops), version
+
+    # ==================== 合并落库 ====================
+
+    def flush(self, db: Session) -> int:
+        """把脏文档的最新内容写回数据库（每个文档一条历史记录），返回落库文档数"""
+        client = self._client()
+        if client is None:
+            return 0
+        flushed = 0
+        for document_id in client.zrange(DIRTY_INDEX_KEY, 0, -1):
+            try:
+                if self._flush_document(db, client, document_id):
+                    flushed += 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"❌ [DocSave] 文档落库失败: {document_id}: {e}")
+        if flushed:
+            self._stats["flushed"] += flushed
+            logger.info(f"💾 [DocSave] 已合并落库 {flushed} 个文档")
+        return flushed
+
+    def _flush_document(self, db: Session, client, document_id: str) -> bool:
+        version_key, snapshot_key, ops_key = self._keys(document_id)
+        head = self._shared_head(client, document_id)
+        if head is None:
+            client.zrem(DIRTY_INDEX_KEY, document_id)
+            return False
+        content, version = head
+        # 最后一个操作的提交者记为本次编辑者
+        last = client.xrevrange(ops_key, max=f"{version}-0", min="-", count=1)
+        editor_id = editor_name = None
+        if last:
+            op = json.loads(last[0][1]["op"])
+            editor_id, editor_name = op.get("user_id"), op.get("user_name")
+        written = self.persist(db, document_id, version, content, editor_id, editor_name)
+        # 推进 Redis 快照并裁剪操作流，下次读取最新内容时不必重放
+        self._scripts["snapshot"](
+            keys=[snapshot_key, ops_key, version_key],
+            args=[version, content, ROOM_KEY_TTL, settings.COLLAB_OP_LOG_SIZE]
+        )
+        self._scripts["clear"](keys=[version_key, DIRTY_INDEX_KEY], args=[version, document_id])
+        return written
+
+    def persist(
+        self,
+        db: Session,
+        document_id: str,
+        version: int,
+        content: str,
+        editor_id: Optional[str] = None,
+        editor_name: Optional[str] = None,
+    ) -> bool:
+        """
+        把某个版本的内容写回数据库并记录历史（只前进不后退，多处重复写入无副作用）
+
+        房间快照与合并落库都走这里，返回是否写入
+        """
+        document = db.query(CollaborationDocument).filter(
+            CollaborationDocument.id == document_id
+        ).with_for_update().first()
+        if document is None or (document.version or 0) >= version:
+            db.rollback()
+            return False
+        # 编辑者来自操作内容，不是有效用户时记到文档所有者名下
+        if not editor_id or db.query(User.id).filter(User.id == editor_id).first() is None:
+            editor_id, editor_name = document.owner_id, document.owner_name
+        self._write_version(db, document, version, content, editor_id, editor_name or editor_id)
+        db.commit()
+        return True
+
+    def _write_version(
+        self,
+        db: Session,
+        document: CollaborationDocument,
+        version: int,
+        content: str,
+        editor_id: str,
+        editor_name: str,
+    ):
+        """更新文档行并追加一条差异（或快照）历史，调用方持有行锁并负责提交"""
+        previous_version = document.version or 1
+        previous_content = document.content or ""
+        if self._needs_snapshot(db, document.id):
+            action = ACTION_SNAPSHOT
+            content_diff = json.dumps({"content": content}, ensure_ascii=False)
+            summary = "编辑内容（全文快照）"
+            self._stats["snapshots"] += 1
+        else:
+            pos, dele, ins = diff_splice(previous_content, content)
+            action = ACTION_DIFF
+            content_diff = json.dumps({"ops": [[pos, dele, ins]]}, ensure_ascii=False)
+            summary = f"编辑内容（-{dele} +{len(ins)} 字符）"
+        db.add(DocumentEditHistory(
+            id=str(uuid.uuid4()),
+            document_id=document.id,
+            editor_id=editor_id,
+            editor_name=editor_name,
+            action=action,
+            changes_summary=summary,
+            content_diff=content_diff,
+            version_before=previous_version,
+            version_after=version
+        ))
+        document.content = content
+        document.version = version
+        document.last_edited_by = editor_name
+        document.last_edited_at = datetime.now()
+        document.edit_count = (document.edit_count or 0) + 1
+
+    @staticmethod
+    def _needs_snapshot(db: Session, document_id: str) -> bool:
+        """还没有快照，或距上次快照已累计 COLLAB_HISTORY_SNAPSHOT_EVERY 条差异"""
+        last_snapshot = db.query(func.max(DocumentEditHistory.version_after)).filter(
+            DocumentEditHistory.document_id == document_id,
+            DocumentEditHistory.action == ACTION_SNAPSHOT
+        ).scalar()
+        if last_snapshot is None:
+            return True
+        diffs = db.query(func.count(DocumentEditHistory.id)).filter(
+            DocumentEditHistory.document_id == document_id,
+            DocumentEditHistory.action == ACTION_DIFF,
+            DocumentEditHistory.version_after > last_snapshot
+        ).scalar()
+        return diffs + 1 >= settings.COLLAB_HISTORY_SNAPSHOT_EVERY
+
+    # ==================== 历史版本 ====================
+
+    def reconstruct(self, db: Session, document_id: str, version: int) -> Optional[str]:
+        """
+        重建某个已落库版本的内容：最近的快照 + 其后的差异
+
+        合并落库会把多个操作版本记为一条历史，只有历史记录中实际存在的版本（version_after）可以重建；
+        中间版本或早于首个快照的版本返回 None
+        """
+        stored = db.query(DocumentEditHistory.id).filter(
+            DocumentEditHistory.document_id == document_id,
+            DocumentEditHistory.action.in_((ACTION_SNAPSHOT, ACTION_DIFF)),
+            DocumentEditHistory.version_after == version
+        ).first()
+        if stored is None:
+            return None
+        snapshot = db.query(DocumentEditHistory.version_after, DocumentEditHistory.content_diff).filter(
+            DocumentEditHistory.document_id == document_id,
+            DocumentEditHistory.action == ACTION_SNAPSHOT,
+            DocumentEditHistory.version_after <= version
+        ).order_by(DocumentEditHistory.version_after.desc()).first()
+        if snapshot is None:
+            return None
+        content = json.loads(snapshot.content_diff)["content"]
+        diffs = db.query(DocumentEditHistory.content_diff).filter(
+            DocumentEditHistory.document_id == document_id,
+            DocumentEditHistory.action == ACTION_DIFF,
+            DocumentEditHistory.version_after > snapshot.version_after,
+            DocumentEditHistory.version_after <= version
+        ).order_by(DocumentEditHistory.version_after).all()
+        ops = [
+            {"pos": pos, "del": dele, "ins": ins}
+            for (content_diff,) in diffs
+            for pos, dele, ins in json.loads(content_diff)["ops"]
+        ]
+        return apply_ops(content, ops)
+
+    def get_stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+# 全局实例
+document_saves = DocumentSaveService()
@@ -0,0 +1,203 @@
+"""
+通知 Pub/Sub 扇出中心
+每个 worker 只持有一个 redis.asyncio 订阅连接，每个频道只订阅一次；
+本地维护 频道 -> WebSocket 集合 的索引，收到消息后把原始 JSON 文本放入各连接的出站队列，
+读取循环阻塞等待消息而不是轮询；频道的最后一个连接离开时取消订阅
+"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+import redis.asyncio as aioredis
+from fastapi import WebSocket
+
+from app.config import settings
+from app.services.notification_ws import manager as ws_manager
+from app.services.redis_notification_service import redis_notifier
+
+logger = logging.getLogger(__name__)
+
+# 订阅连接断开后的重连间隔（秒）
+RECONNECT_DELAY = 1
+
+
+class NotificationHub:
+    """进程内通知扇出中心"""
+
+    def __init__(self):
+        self._sockets: Dict[str, Set[WebSocket]] = {}
+        self._channels_of: Dict[WebSocket, Set[str]] = {}
+        self._client: Optional[aioredis.Redis] = None
+        self._pubsub = None
+        self._reader_task: Optional[asyncio.Task] = None
+        # 有订阅时才运行读取循环
+        self._has_channels: Optional[asyncio.Event] = None
+        # 串行化 SUBSCRIBE/UNSUBSCRIBE，保证同一频道的命令按调用顺序发出
+        self._command_lock: Optional[asyncio.Lock] = None
+        self._stats = {"received": 0, "delivered": 0, "failed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return redis_notifier.enabled
+
+    @staticmethod
+    def channels_for(user_id: Optional[str], role: Optional[str]) -> List[str]:
+        """一个通知连接需要订阅的频道"""
+        channels = ["notify:global"]
+        if user_id:
+            channels.append(f"notify:user:{user_id}")
+        if role:
+            channels.append(f"notify:role:{role.lower()}")
+        return channels
+
+    # ==================== 连接管理 ====================
+
+    async def join(self, websocket: WebSocket, channels: Iterable[str]):
+        """把连接加入频道，频道首次出现时向 Redis 订阅"""
+        if not self.enabled:
+            return
+        self._ensure_started()
+        new_channels = []
+        joined = self._channels_of.setdefault(websocket, set())
+        for channel in channels:
+            sockets = self._sockets.get(channel)
+            if sockets is None:
+                sockets = self._sockets[channel] = set()
+                new_channels.append(channel)
+            sockets.add(websocket)
+            joined.add(channel)
+        if new_channels:
+            async with self._command_lock:
+                try:
+                    await self._pubsub.subscribe(*new_channels)
+                    logger.info(f"📥 [Hub] 订阅频道: {', '.join(new_channels)}")
+                except Exception as e:
+                    # 读取循环重连时会按本地索引重新订阅
+                    logger.error(f"❌ [Hub] 订阅失败 {new_channels}: {e}")
+            self._has_channels.set()
+
+    async def leave(self, websocket: WebSocket):
+        """连接离开全部频道，频道变空时取消订阅"""
+        channels = self._channels_of.pop(websocket, None)
+        if not channels:
+            return
+        empty = []
+        for channel in channels:
+            sockets = self._sockets.get(channel)
+            if sockets is None:
+                continue
+            sockets.discard(websocket)
+            if not sockets:
+                del self._sockets[channel]
+                empty.append(channel)
+        if empty and self._pubsub is not None:
+            async with self._command_lock:
+                # 等待期间可能有新连接重新加入
+                empty = [channel for channel in empty if channel not in self._sockets]
+                if not empty:
+                    return
+                try:
+                    await self._pubsub.unsubscribe(*empty)
+                    logger.info(f"📤 [Hub] 取消订阅频道: {', '.join(empty)}")
+                except Exception as e:
+                    logger.error(f"❌ [Hub] 取消订阅失败 {empty}: {e}")
+
+    # ==================== 读取与分发 ====================
+
+    def _ensure_started(self):
+        """在事件循环内懒加载订阅连接与读取任务"""
+        if self._reader_task is not None and not self._reader_task.done():
+            return
+        self._has_channels = asyncio.Event()
+        self._command_lock = asyncio.Lock()
+        self._client = aioredis.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            socket_connect_timeout=2,
+            health_check_interval=30
+        )
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._reader_task = asyncio.create_task(self._reader())
+        logger.info("🚀 [Hub] 通知扇出中心已启动")
+
+    async def _reader(self):
+        """读取循环：阻塞等待 Redis 消息并分发到本地连接"""
+        while True:
+            try:
+                await self._has_channels.wait()
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    self._stats["received"] += 1
+                    await self._dispatch(message["channel"], message["data"])
+                # 所有频道都已取消订阅，listen 退出，等待下次订阅
+                if not self._sockets:
+                    self._has_channels.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ [Hub] 订阅连接中断，{RECONNECT_DELAY}秒后重连: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+                await self._resubscribe()
+
+    async def _resubscribe(self):
+        """重建订阅连接并按本地索引重新订阅"""
+        async with self._command_lock:
+            try:
+                await self._pubsub.reset()
+            except Exception:
+                pass
+            self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            if self._sockets:
+                try:
+                    await self._pubsub.subscribe(*self._sockets.keys())
+                    logger.info(f"🔄 [Hub] 已重新订阅 {len(self._sockets)} 个频道")
+                except Exception as e:
+                    logger.error(f"❌ [Hub] 重新订阅失败: {e}")
+
+    async def _dispatch(self, channel: str, data: str):
+        """把原始 JSON 文本放入频道内每个连接的出站队列，不等待慢连接"""
+        sockets = self._sockets.get(channel)
+        if not sockets:
+            return
+        for ws in list(sockets):
+            if ws_manager.enqueue_text(ws, data):
+                self._stats["delivered"] += 1
+            else:
+                self._stats["failed"] += 1
+                await self.leave(ws)
+
+    # ==================== 生命周期 ====================
+
+    async def close(self):
+        """应用关闭时停止读取任务并释放连接"""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.reset()
+            except Exception as e:
+                logger.error(f"❌ [Hub] 关闭订阅失败: {e}")
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        self._sockets.clear()
+        self._channels_of.clear()
+        logger.info("🛑 [Hub] 通知扇出中心已停止")
+
+    def get_stats(self) -> dict:
+        return {
+            "channels": len(self._sockets),
+            "sockets": len(self._channels_of),
+            **self._stats
+        }
+
+
+# 全局实例
+notification_hub = NotificationHub()
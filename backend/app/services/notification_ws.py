@@ -1,11 +1,63 @@
-from typing import Dict, Set
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Set
 from fastapi import WebSocket
 import logging
+from app.config import settings
 from app.services.redis_notification_service import redis_notifier
 from app.services.redis_notification_storage import redis_notification_storage
 
 logger = logging.getLogger(__name__)
 
+# 发送延迟采样窗口
+_LATENCY_WINDOW = 1024
+
+
+class _Outbound:
+    """
+    单个连接的出站队列
+    广播只做非阻塞入队，由独立的写任务逐条发送；队列满时丢弃最旧的消息，
+    连续丢弃达到一整个队列长度视为慢消费者，由管理器断开
+    """
+
+    def __init__(self, manager: "NotificationManager", websocket: WebSocket, maxsize: int):
+        self.manager = manager
+        self.websocket = websocket
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self._overflow = 0
+        self.task = asyncio.create_task(self._writer())
+
+    def put(self, text: str) -> bool:
+        """入队，返回 False 表示该连接已是慢消费者"""
+        try:
+            self.queue.put_nowait(text)
+            self._overflow = 0
+            return True
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait(text)
+            self.dropped += 1
+            self._overflow += 1
+            return self._overflow < self.queue.maxsize
+
+    async def _writer(self):
+        while True:
+            text = await self.queue.get()
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=settings.WS_SEND_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"🔔 [WS] 发送给 {self.manager.ws_user.get(self.websocket)} 失败: {e}")
+                self.manager._record_failure()
+                self.manager.disconnect(self.websocket)
+                return
+            self.manager._record_latency(time.perf_counter() - start)
+
 
 class NotificationManager:
     def __init__(self) -> None:
@@ -13,6 +65,14 @@ class NotificationManager:
         self.active_connections: Set[WebSocket] = set()
         self.ws_role: Dict[WebSocket, str] = {}
         self.ws_user: Dict[WebSocket, Dict[str, str]] = {}
+        # 按用户ID、角色建立的连接索引
+        self.by_user: Dict[str, Set[WebSocket]] = {}
+        self.by_role: Dict[str, Set[WebSocket]] = {}
+        # 每个连接的出站队列
+        self._outbound: Dict[WebSocket, _Outbound] = {}
+        # 指标
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._metrics = {"enqueued": 0, "sent": 0, "failed": 0, "slow_disconnects": 0}
         
         # Redis Pub/Sub 支持
         self.redis_enabled = redis_notifier.enabled
@@ -20,16 +80,97 @@ class NotificationManager:
             logger.info("✅ WebSocket管理器已启用Redis Pub/Sub支持")
 
     async def connect(self, websocket: WebSocket, role: str, user: Dict[str, str]) -> None:
+        role_lc = (role or '').lower()
+        user_id = str(user.get('id') or '')
         self.active_connections.add(websocket)
-        self.ws_role[websocket] = (role or '').lower()
+        self.ws_role[websocket] = role_lc
         self.ws_user[websocket] = user
-        logger.info(f"🔔 [WS] 已连接: role={self.ws_role[websocket]} user={user.get('username') or user.get('real_name')}")
+        self.by_role.setdefault(role_lc, set()).add(websocket)
+        if user_id:
+            self.by_user.setdefault(user_id, set()).add(websocket)
+        self._outbound[websocket] = _Outbound(self, websocket, settings.WS_OUTBOUND_QUEUE_SIZE)
+        logger.info(f"🔔 [WS] 已连接: role={role_lc} user={user.get('username') or user.get('real_name')}")
 
     def disconnect(self, websocket: WebSocket) -> None:
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        self.ws_role.pop(websocket, None)
-        self.ws_user.pop(websocket, None)
+        self.active_connections.discard(websocket)
+        role_lc = self.ws_role.pop(websocket, None)
+        user = self.ws_user.pop(websocket, None) or {}
+        self._discard_index(self.by_role, role_lc, websocket)
+        self._discard_index(self.by_user, str(user.get('id') or ''), websocket)
+        outbound = self._outbound.pop(websocket, None)
+        if outbound is not None and outbound.task is not asyncio.current_task():
+            outbound.task.cancel()
+
+    @staticmethod
+    def _discard_index(index: Dict[str, Set[WebSocket]], key: Optional[str], websocket: WebSocket) -> None:
+        if key is None:
+            return
+        sockets = index.get(key)
+        if sockets is not None:
+            sockets.discard(websocket)
+            if not sockets:
+                index.pop(key, None)
+
+    # ==================== 出站 ====================
+
+    def enqueue_text(self, websocket: WebSocket, text: str) -> bool:
+        """把已序列化的消息放入连接的出站队列（不等待发送）"""
+        outbound = self._outbound.get(websocket)
+        if outbound is None:
+            return False
+        self._metrics["enqueued"] += 1
+        if not outbound.put(text):
+            # 慢消费者：断开并关闭，客户端重连后可从离线通知补齐
+            self._metrics["slow_disconnects"] += 1
+            logger.warning(f"🐢 [WS] 慢消费者已断开: {self.ws_user.get(websocket)}")
+            self.disconnect(websocket)
+            asyncio.create_task(self._close_quietly(websocket))
+            return False
+        return True
+
+    def _enqueue_many(self, targets, message: dict) -> int:
+        """序列化一次后入队到多个连接，返回成功入队数量"""
+        text = json.dumps(message, ensure_ascii=False, default=str)
+        return sum(1 for ws in list(targets) if self.enqueue_text(ws, text))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def _record_latency(self, seconds: float) -> None:
+        self._metrics["sent"] += 1
+        self._latencies.append(seconds)
+
+    def _record_failure(self) -> None:
+        self._metrics["failed"] += 1
+
+    def get_metrics(self) -> dict:
+        """连接数、出站队列深度与发送延迟"""
+        depths = [outbound.queue.qsize() for outbound in self._outbound.values()]
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+        return {
+            "connections": len(self.active_connections),
+            "users": len(self.by_user),
+            "roles": len(self.by_role),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "dropped": sum(outbound.dropped for outbound in self._outbound.values()),
+            "send_latency_ms": {
+                "avg": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+                "p50": percentile(0.5),
+                "p99": percentile(0.99),
+            },
+            **self._metrics
+        }
 
     async def broadcast_to_role(self, role: str, message: dict) -> None:
         """
@@ -47,18 +188,10 @@ class NotificationManager:
             if receivers > 0:
                 return
         
-        # Redis不可用或无订阅者，回退到直接WebSocket发送
-        dead: Set[WebSocket] = set()
-        targets = [ws for ws in list(self.active_connections) if self.ws_role.get(ws) == role_lc]
-        logger.info(f"🔔 [WS] 向角色 {role_lc} 直接广播，连接数: {len(self.active_connections)}，匹配接收者: {len(targets)}")
-        for ws in targets:
-            try:
-                await ws.send_json(message)
-            except Exception as e:
-                logger.warning(f"🔔 [WS] 发送给 {self.ws_user.get(ws)} 失败: {e}")
-                dead.add(ws)
-        for ws in dead:
-            self.disconnect(ws)
+        # Redis不可用或无订阅者，回退到直接WebSocket发送（按角色索引入队）
+        targets = self.by_role.get(role_lc, ())
+        sent = self._enqueue_many(targets, message)
+        logger.info(f"🔔 [WS] 向角色 {role_lc} 直接广播，连接数: {len(self.active_connections)}，匹配接收者: {sent}")
 
     def _save_notification_to_redis(self, user_id: str, message: dict) -> None:
         """
@@ -77,6 +210,29 @@ class NotificationManager:
         except Exception as e:
             logger.error(f"❌ [Redis] 保存通知到 Redis 失败: {e}", exc_info=True)
     
+    def _save_offline_for_active_users(self, message: dict) -> None:
+        """只查询在职用户ID，然后按批一次 Lua 调用写入离线通知"""
+        from app.database import SessionLocal
+        from app.models.user import User
+
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            user_ids = [row[0] for row in db.query(User.id).filter(User.status == "active").all()]
+        finally:
+            db.close()
+
+        saved = redis_notification_storage.save_notification_bulk(
+            user_ids,
+            notification_type=message.get('type', 'unknown'),
+            title=message.get('title', '系统通知'),
+            content=message.get('content', ''),
+            data=message.get('data') or {},
+            priority=message.get('priority', 'normal')
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"✅ [Redis] 定时通知已保存给 {max(saved, 0)}/{len(user_ids)} 个用户，耗时 {elapsed_ms:.1f}ms")
+
     async def send_to_user_id(self, user_id: str, message: dict) -> None:
         """
         向指定用户发送消息
@@ -95,20 +251,8 @@ class NotificationManager:
             if receivers > 0:
                 return
         
-        # Redis不可用或无订阅者，回退到直接WebSocket发送
-        dead: Set[WebSocket] = set()
-        sent = 0
-        for ws in list(self.active_connections):
-            try:
-                info = self.ws_user.get(ws) or {}
-                if info.get('id') == user_id:
-                    await ws.send_json(message)
-                    sent += 1
-            except Exception as e:
-                logger.warning(f"🔔 [WS] 发送到用户 {user_id} 失败: {e}")
-                dead.add(ws)
-        for ws in dead:
-            self.disconnect(ws)
+        # Redis不可用或无订阅者，回退到直接WebSocket发送（按用户索引入队）
+        sent = self._enqueue_many(self.by_user.get(str(user_id), ()), message)
         logger.info(f"🔔 [WS] 向用户 {user_id} 直接发送通知，成功连接数: {sent}")
 
     async def broadcast_to_all(self, message: dict, save_offline: bool = False) -> None:
@@ -120,31 +264,10 @@ class NotificationManager:
             message: 消息内容
             save_offline: 是否保存给离线用户（默认False，兼容旧代码）
         """
-        # ✅ 1. 如果需要保存给离线用户
+        # ✅ 1. 如果需要保存给离线用户（同步查库与批量写入放到线程池，不阻塞事件循环）
         if save_offline:
             try:
-                from app.database import get_db
-                from app.models.user import User
-                
-                db = next(get_db())
-                try:
-                    # 获取所有活跃用户
-                    users = db.query(User).filter(User.is_active == True).all()
-                    
-                    logger.info(f"💾 [Redis] 开始保存定时通知给 {len(users)} 个活跃用户")
-                    
-                    # 批量保存通知
-                    saved_count = 0
-                    for user in users:
-                        try:
-                            self._save_notification_to_redis(str(user.id), message)
-                            saved_count += 1
-                        except Exception as e:
-                            logger.error(f"❌ [Redis] 保存通知给用户 {user.id} 失败: {e}")
-                    
-                    logger.info(f"✅ [Redis] 定时通知已保存给 {saved_count}/{len(users)} 个用户")
-                finally:
-                    db.close()
+                await asyncio.to_thread(self._save_offline_for_active_users, message)
             except Exception as e:
                 logger.error(f"❌ [Redis] 批量保存通知失败: {e}", exc_info=True)
         
@@ -157,27 +280,10 @@ class NotificationManager:
             if receivers > 0:
                 return
         
-        # 3. Redis不可用或无订阅者，回退到直接WebSocket发送
-        dead: Set[WebSocket] = set()
+        # 3. Redis不可用或无订阅者，回退到直接WebSocket发送（并发入队，不等待慢连接）
         total = len(self.active_connections)
-        sent = 0
-        logger.info(f"🔔 [WS] 开始向所有在线用户直接广播，当前连接数: {total}")
-        
-        for ws in list(self.active_connections):
-            try:
-                await ws.send_json(message)
-                sent += 1
-            except Exception as e:
-                user_info = self.ws_user.get(ws, {})
-                username = user_info.get('username') or user_info.get('real_name') or 'unknown'
-                logger.warning(f"🔔 [WS] 广播到用户 {username} 失败: {e}")
-                dead.add(ws)
-        
-        # 清理失败的连接
-        for ws in dead:
-            self.disconnect(ws)
-        
-        logger.info(f"🔔 [WS] 直接广播完成，成功: {sent}/{total}，失败: {len(dead)}")
+        sent = self._enqueue_many(self.active_connections, message)
+        logger.info(f"🔔 [WS] 直接广播完成，成功入队: {sent}/{total}")
 
 
 manager = NotificationManager()
@@ -1,6 +1,9 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Tuple
+import uuid
 from app.models.performance import PerformanceStats, ProjectStats
 from app.models.task import Task
 from app.models.project import Project
@@ -71,14 +74,9 @@ class PerformanceService:
             "completed_tasks": performance.completed_tasks,
             "average_score": float(performance.average_score)
         }
-    def calculate_user_performance(
-        self, 
-        db: Session, 
-        user_id: str, 
-        period: str = "monthly"
-    ) -> dict:
-        """计算用户绩效"""
-        # 获取时间范围
+    @staticmethod
+    def _period_window(period: str) -> Tuple[datetime, datetime, str]:
+        """返回统计周期的 (开始时间, 结束时间, 周期标识)"""
         end_date = datetime.now()
         if period == "daily":
             start_date = end_date - timedelta(days=1)
@@ -92,105 +90,178 @@ class PerformanceService:
         else:  # yearly
             start_date = end_date - timedelta(days=365)
             date_format = "%Y"
+        return start_date, end_date, end_date.strftime(date_format)
+    
+    def calculate_user_performance(
+        self, 
+        db: Session, 
+        user_id: str, 
+        period: str = "monthly"
+    ) -> dict:
+        """计算用户绩效"""
+        return self.calculate_users_performance(db, [user_id], period)[user_id]
+    
+    def calculate_users_performance(
+        self,
+        db: Session,
+        user_ids: List[str],
+        period: str = "monthly"
+    ) -> Dict[str, dict]:
+        """
+        批量计算用户绩效：一条 GROUP BY assigned_to 聚合查询覆盖所有用户
         
-        # 查询任务统计
-        tasks = db.query(Task).filter(
-            Task.assigned_to == user_id,
+        Returns:
+            {user_id: 绩效数据}，周期内没有任务的用户各项为 0
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        start_date, end_date, date_str = self._period_window(period)
+        
+        # 查询任务统计（数据库端聚合，不加载任务行）
+        rows = db.query(
+            Task.assigned_to,
+            func.count(Task.id),
+            func.count(Task.id).filter(Task.status == "approved"),
+            func.count(Task.id).filter(Task.status == "rejected"),
+            func.coalesce(func.sum(Task.score).filter(Task.status == "approved"), 0)
+        ).filter(
+            Task.assigned_to.in_(user_ids),
             Task.created_at >= start_date,
             Task.created_at <= end_date
-        ).all()
+        ).group_by(Task.assigned_to).all()
+        aggregates = {row[0]: row[1:] for row in rows}
         
-        # 计算绩效
-        total_tasks = len(tasks)
-        completed_tasks = len([t for t in tasks if t.status == "approved"])
+        existing = {
+            stat.user_id: stat
+            for stat in db.query(PerformanceStats).filter(
+                PerformanceStats.user_id.in_(user_ids),
+                PerformanceStats.period == period,
+                PerformanceStats.date == date_str
+            ).all()
+        }
         
-        # 每完成一个任务+1分
-        total_score = completed_tasks
-        average_score = 1 if completed_tasks > 0 else 0
+        results = {}
+        for user_id in user_ids:
+            total_tasks, completed_tasks, rejected_tasks, score_sum = aggregates.get(user_id, (0, 0, 0, 0))
+            
+            # 每完成一个任务+1分
+            total_score = completed_tasks
+            average_score = 1 if completed_tasks > 0 else 0
+            
+            # 保存或更新绩效统计
+            performance = existing.get(user_id)
+            if not performance:
+                performance = PerformanceStats(
+                    user_id=user_id,
+                    period=period,
+                    date=date_str,
+                    total_tasks=total_tasks,
+                    completed_tasks=completed_tasks,
+                    approved_tasks=completed_tasks,
+                    rejected_tasks=rejected_tasks,
+                    total_score=total_score,
+                    average_score=average_score
+                )
+                db.add(performance)
+            else:
+                performance.total_tasks = total_tasks
+                performance.completed_tasks = completed_tasks
+                performance.approved_tasks = completed_tasks
+                performance.rejected_tasks = rejected_tasks
+                performance.total_score = total_score
+                performance.average_score = average_score
+            
+            results[user_id] = {
+                "total_tasks": total_tasks,
+                "completed_tasks": completed_tasks,
+                "rejected_tasks": rejected_tasks,
+                "total_score": total_score,
+                "task_score_sum": int(score_sum),
+                "average_score": average_score,
+                "completion_rate": (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+            }
         
-        # 保存或更新绩效统计
-        performance = db.query(PerformanceStats).filter(
-            PerformanceStats.user_id == user_id,
-            PerformanceStats.period == period,
-            PerformanceStats.date == end_date.strftime(date_format)
-        ).first()
+        db.commit()
+        return results
+    
+    def calculate_project_stats(self, db: Session, project_id: str) -> dict:
+        """计算项目统计（返回字段与 ProjectStatsResponse 一致的字典）"""
+        return self.calculate_projects_stats(db, [project_id]).get(project_id)
+    
+    def calculate_projects_stats(self, db: Session, project_ids: List[str]) -> Dict[str, dict]:
+        """
+        批量计算项目统计：一条 GROUP BY project_id 聚合查询，
+        各状态计数用 FILTER 子句，平均分用 SUM(score)
         
-        if not performance:
-            performance = PerformanceStats(
-                user_id=user_id,
-                period=period,
-                date=end_date.strftime(date_format),
-                total_tasks=total_tasks,
-                completed_tasks=completed_tasks,
-                approved_tasks=completed_tasks,
-                total_score=total_score,
-                average_score=average_score
-            )
-            db.add(performance)
-        else:
-            performance.total_tasks = total_tasks
-            performance.completed_tasks = completed_tasks
-            performance.approved_tasks = completed_tasks
-            performance.total_score = total_score
-            performance.average_score = average_score
+        Returns:
+            {project_id: 统计字典}，不存在的项目不在结果中；
+            在提交前由聚合结果构建，不返回提交后已过期的 ORM 对象（否则逐个访问会各自回查一次）
+        """
+        project_ids = list(dict.fromkeys(project_ids))
+        if not project_ids:
+            return {}
+        found_ids = [pid for (pid,) in db.query(Project.id).filter(Project.id.in_(project_ids)).all()]
+        if not found_ids:
+            return {}
         
-        db.commit()
+        # 查询项目任务统计（数据库端聚合，不加载任务行）
+        rows = db.query(
+            Task.project_id,
+            func.count(Task.id),
+            func.count(Task.id).filter(Task.status == "pending"),
+            func.count(Task.id).filter(Task.status == "in_progress"),
+            func.count(Task.id).filter(Task.status.in_(["submitted", "approved"])),
+            func.count(Task.id).filter(Task.status == "approved"),
+            func.count(Task.id).filter(Task.status == "rejected"),
+            func.coalesce(func.sum(Task.score), 0)
+        ).filter(Task.project_id.in_(found_ids)).group_by(Task.project_id).all()
+        aggregates = {row[0]: row[1:] for row in rows}
         
-        return {
-            "total_tasks": total_tasks,
-            "completed_tasks": completed_tasks,
-            "total_score": total_score,
-            "average_score": average_score,
-            "completion_rate": (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+        existing = {
+            stats.project_id: stats
+            for stats in db.query(ProjectStats).filter(ProjectStats.project_id.in_(found_ids)).all()
         }
-    
-    def calculate_project_stats(self, db: Session, project_id: str) -> ProjectStats:
-        """计算项目统计"""
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
-            return None
-        
-        # 查询项目任务
-        tasks = db.query(Task).filter(Task.project_id == project_id).all()
-        
-        # 计算统计
-        total_tasks = len(tasks)
-        pending_tasks = len([t for t in tasks if t.status == "pending"])
-        in_progress_tasks = len([t for t in tasks if t.status == "in_progress"])
-        completed_tasks = len([t for t in tasks if t.status in ["submitted", "approved"]])
-        approved_tasks = len([t for t in tasks if t.status == "approved"])
-        rejected_tasks = len([t for t in tasks if t.status == "rejected"])
-        
-        completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-        average_score = sum(t.score or 0 for t in tasks) / total_tasks if total_tasks > 0 else 0
-        
-        # 保存或更新项目统计
-        stats = db.query(ProjectStats).filter(ProjectStats.project_id == project_id).first()
-        if not stats:
-            stats = ProjectStats(
-                project_id=project_id,
-                total_tasks=total_tasks,
-                pending_tasks=pending_tasks,
-                in_progress_tasks=in_progress_tasks,
-                completed_tasks=completed_tasks,
-                approved_tasks=approved_tasks,
-                rejected_tasks=rejected_tasks,
-                completion_rate=completion_rate,
-                average_score=average_score
-            )
-            db.add(stats)
-        else:
-            stats.total_tasks = total_tasks
-            stats.pending_tasks = pending_tasks
-            stats.in_progress_tasks = in_progress_tasks
-            stats.completed_tasks = completed_tasks
-            stats.approved_tasks = approved_tasks
-            stats.rejected_tasks = rejected_tasks
-            stats.completion_rate = completion_rate
-            stats.average_score = average_score
+        
+        results = {}
+        now = datetime.now()
+        for project_id in found_ids:
+            (total_tasks, pending_tasks, in_progress_tasks, completed_tasks,
+             approved_tasks, rejected_tasks, score_sum) = aggregates.get(project_id, (0, 0, 0, 0, 0, 0, 0))
+            
+            # 与 DECIMAL(5, 2) 列保持一致的精度
+            completion_rate = Decimal(str(round(completed_tasks / total_tasks * 100, 2))) if total_tasks > 0 else Decimal("0")
+            average_score = Decimal(str(round(score_sum / total_tasks, 2))) if total_tasks > 0 else Decimal("0")
+            values = {
+                "total_tasks": total_tasks,
+                "pending_tasks": pending_tasks,
+                "in_progress_tasks": in_progress_tasks,
+                "completed_tasks": completed_tasks,
+                "approved_tasks": approved_tasks,
+                "rejected_tasks": rejected_tasks,
+                "completion_rate": completion_rate,
+                "average_score": average_score,
+                "updated_at": now,
+            }
+            
+            # 保存或更新项目统计
+            stats = existing.get(project_id)
+            if not stats:
+                stats = ProjectStats(id=str(uuid.uuid4()), project_id=project_id, created_at=now, total_hours=0, **values)
+                db.add(stats)
+            else:
+                for field, value in values.items():
+                    setattr(stats, field, value)
+            results[project_id] = {
+                "id": stats.id,
+                "project_id": project_id,
+                "total_hours": stats.total_hours or Decimal("0"),
+                "created_at": stats.created_at or now,
+                **values,
+            }
         
         db.commit()
-        return stats
+        return results
 
 # 全局绩效服务实例
 performance_service = PerformanceService() 
\ No newline at end of file
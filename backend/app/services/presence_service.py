@@ -0,0 +1,302 @@
+"""
+协作文档在线状态服务
+在线状态只存在 Redis：每个文档一个按心跳时间打分的 ZSET，光标/选区放在同名 :meta Hash，
+一次心跳只发一个 pipeline；CollaborationSession 表只在加入/离开时回写（write-behind），
+心跳超时的离开由定时清扫批量落库
+"""
+import json
+import time
+import logging
+import redis
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.collaboration import CollaborationSession
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# ==================== 存储布局 ====================
+# 旧版 presence:doc:{doc_id} 为 HASH，新布局使用 v2 前缀，滚动升级期间新旧进程互不干扰
+# presence:v2:doc:{doc_id}       ZSET  用户ID，score 为最后心跳时间（秒）
+# presence:v2:doc:{doc_id}:meta  HASH  用户ID -> {user_name, cursor_position, selection_start, selection_end}
+# presence:v2:docs               ZSET  有在线用户的文档ID，score 为最近心跳时间，供清扫遍历
+# presence:user:{uid}         STRING 全局在线标记（TTL 为在线超时）
+
+# 清扫一个文档中心跳超时的用户：原子地取出并移除，多个 worker 同时清扫时每个用户只会被领取一次
+# KEYS: 文档 ZSET, 文档 meta, 文档索引
+# ARGV: 截止时间, 文档ID
+# 返回: 扁平数组 (用户ID, 最后心跳, meta JSON) ...
+_SWEEP_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES')
+local result = {}
+for i = 1, #expired, 2 do
+    local uid = expired[i]
+    result[#result + 1] = uid
+    result[#result + 1] = expired[i + 1]
+    result[#result + 1] = redis.call('HGET', KEYS[2], uid) or ''
+    redis.call('HDEL', KEYS[2], uid)
+end
+if #expired > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+end
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('DEL', KEYS[1], KEYS[2])
+    redis.call('ZREM', KEYS[3], ARGV[2])
+end
+return result
+"""
+
+DOCS_INDEX_KEY = "presence:v2:docs"
+
+
+class PresenceService:
+    """协作文档在线状态（Redis ZSET + 会话表 write-behind）"""
+
+    def __init__(self, ttl: int, key_ttl: int = 3600):
+        # 超过 ttl 秒没有心跳视为离线
+        self.ttl = ttl
+        # 键的兜底过期时间：远大于 ttl，保证清扫有机会把离开写回数据库
+        self.key_ttl = key_ttl
+        self._sweep_script = None
+        self._stats = {"heartbeats": 0, "joins": 0, "leaves": 0, "swept": 0}
+
+    @staticmethod
+    def _doc_keys(document_id: str):
+        base = f"presence:v2:doc:{document_id}"
+        return base, f"{base}:meta"
+
+    def _client(self):
+        if not redis_client.is_available():
+            return None
+        return redis_client.get_instance()
+
+    @staticmethod
+    def _redis_error(action: str, e: Exception):
+        """只有连接/超时错误才标记 Redis 断开；WRONGTYPE 等命令错误不影响缓存、令牌等其他功能"""
+        logger.error(f"❌ [Presence] {action}: {e}")
+        if isinstance(e, (redis.ConnectionError, redis.TimeoutError)):
+            redis_client.mark_disconnected()
+
+    # ==================== 心跳 ====================
+
+    def heartbeat(
+        self,
+        document_id: str,
+        user_id: str,
+        user_name: str,
+        cursor_position: Optional[int] = None,
+        selection_start: Optional[int] = None,
+        selection_end: Optional[int] = None,
+    ) -> Optional[bool]:
+        """
+        记录一次心跳（单个 pipeline）
+
+        返回是否为新加入（之前不在线或已超时）；Redis 不可用时返回 None，由调用方走数据库兜底
+        """
+        client = self._client()
+        if client is None:
+            return None
+        zset_key, meta_key = self._doc_keys(document_id)
+        uid = str(user_id)
+        now = time.time()
+        meta = json.dumps({
+            "user_name": user_name,
+            "cursor_position": cursor_position,
+            "selection_start": selection_start,
+            "selection_end": selection_end,
+        }, ensure_ascii=False)
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.zscore(zset_key, uid)
+            pipe.zadd(zset_key, {uid: now})
+            pipe.hset(meta_key, uid, meta)
+            pipe.expire(zset_key, self.key_ttl)
+            pipe.expire(meta_key, self.key_ttl)
+            pipe.zadd(DOCS_INDEX_KEY, {document_id: now})
+            pipe.set(f"presence:user:{uid}", int(now), ex=self.ttl)
+            previous = pipe.execute()[0]
+        except Exception as e:
+            self._redis_error("心跳写入失败", e)
+            return None
+        self._stats["heartbeats"] += 1
+        return previous is None or now - float(previous) > self.ttl
+
+    def leave(self, document_id: str, user_id: str) -> Optional[bool]:
+        """主动离开文档，返回是否确实从在线集合中移除；Redis 不可用时返回 None"""
+        client = self._client()
+        if client is None:
+            return None
+        zset_key, meta_key = self._doc_keys(document_id)
+        uid = str(user_id)
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.zrem(zset_key, uid)
+            pipe.hdel(meta_key, uid)
+            removed = pipe.execute()[0]
+        except Exception as e:
+            self._redis_error("离开写入失败", e)
+            return None
+        return bool(removed)
+
+    # ==================== 查询 ====================
+
+    def online(self, document_id: str) -> Optional[List[Dict]]:
+        """
+        文档当前在线用户（一次 ZRANGEBYSCORE + HGETALL）
+
+        返回按最后心跳倒序的列表；Redis 不可用时返回 None
+        """
+        client = self._client()
+        if client is None:
+            return None
+        zset_key, meta_key = self._doc_keys(document_id)
+        cutoff = time.time() - self.ttl
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.zrevrangebyscore(zset_key, "+inf", cutoff, withscores=True)
+            pipe.hgetall(meta_key)
+            members, metas = pipe.execute()
+        except Exception as e:
+            self._redis_error("读取在线用户失败", e)
+            return None
+        result = []
+        for uid, score in members:
+            meta = self._decode_meta(metas.get(uid))
+            result.append({
+                "user_id": uid,
+                "user_name": meta.get("user_name"),
+                "cursor_position": meta.get("cursor_position"),
+                "selection_start": meta.get("selection_start"),
+                "selection_end": meta.get("selection_end"),
+                "last_heartbeat": datetime.fromtimestamp(score),
+            })
+        return result
+
+    @staticmethod
+    def _decode_meta(raw: Optional[str]) -> Dict:
+        if not raw:
+            return {}
+        try:
+            return json.loads(raw)
+        except (TypeError, ValueError):
+            return {}
+
+    # ==================== 会话表回写 ====================
+
+    def record_join(
+        self,
+        db: Session,
+        document_id: str,
+        user_id: str,
+        user_name: str,
+        cursor_position: Optional[int] = None,
+        selection_start: Optional[int] = None,
+        selection_end: Optional[int] = None,
+    ):
+        """加入文档时写入/激活会话行（心跳不再写库，只有加入时调用）"""
+        session = db.query(CollaborationSession).filter(
+            CollaborationSession.document_id == document_id,
+            CollaborationSession.user_id == user_id
+        ).first()
+        if not session:
+            session = CollaborationSession(
+                id=str(uuid.uuid4()),
+                document_id=document_id,
+                user_id=user_id,
+                user_name=user_name,
+                session_id=str(uuid.uuid4()),
+            )
+            db.add(session)
+        session.is_active = True
+        session.last_heartbeat = datetime.now()
+        if cursor_position is not None:
+            session.cursor_position = cursor_position
+        if selection_start is not None:
+            session.selection_start = selection_start
+        if selection_end is not None:
+            session.selection_end = selection_end
+        db.commit()
+        self._stats["joins"] += 1
+
+    def record_leaves(self, db: Session, leaves: List[Dict]) -> int:
+        """
+        把离开批量写回会话表（一次 executemany）
+
+        只覆盖 last_heartbeat 不晚于离开时刻的行，避免清扫晚于用户重新加入时把会话误置为非活跃
+        """
+        if not leaves:
+            return 0
+        table = CollaborationSession.__table__
+        stmt = (
+            update(table)
+            .where(table.c.document_id == bindparam("b_document_id"))
+            .where(table.c.user_id == bindparam("b_user_id"))
+            .where(or_(table.c.last_heartbeat.is_(None), table.c.last_heartbeat <= bindparam("b_seen")))
+            .values(
+                is_active=False,
+                last_heartbeat=bindparam("b_seen"),
+                cursor_position=bindparam("b_cursor"),
+                selection_start=bindparam("b_sel_start"),
+                selection_end=bindparam("b_sel_end"),
+            )
+        )
+        db.execute(stmt, [
+            {
+                "b_document_id": leave["document_id"],
+                "b_user_id": leave["user_id"],
+                "b_seen": leave["last_heartbeat"],
+                "b_cursor": leave.get("cursor_position"),
+                "b_sel_start": leave.get("selection_start"),
+                "b_sel_end": leave.get("selection_end"),
+            }
+            for leave in leaves
+        ])
+        db.commit()
+        self._stats["leaves"] += len(leaves)
+        return len(leaves)
+
+    # ==================== 清扫 ====================
+
+    def sweep(self, db: Session) -> int:
+        """清扫所有文档中心跳超时的用户，并把离开批量写回数据库，返回清扫人数"""
+        client = self._client()
+        if client is None:
+            return 0
+        if self._sweep_script is None:
+            self._sweep_script = client.register_script(_SWEEP_SCRIPT)
+        cutoff = time.time() - self.ttl
+        leaves = []
+        try:
+            for document_id in client.zrange(DOCS_INDEX_KEY, 0, -1):
+                zset_key, meta_key = self._doc_keys(document_id)
+                flat = self._sweep_script(keys=[zset_key, meta_key, DOCS_INDEX_KEY], args=[cutoff, document_id])
+                for i in range(0, len(flat), 3):
+                    meta = self._decode_meta(flat[i + 2])
+                    leaves.append({
+                        "document_id": document_id,
+                        "user_id": flat[i],
+                        "last_heartbeat": datetime.fromtimestamp(float(flat[i + 1])),
+                        "cursor_position": meta.get("cursor_position"),
+                        "selection_start": meta.get("selection_start"),
+                        "selection_end": meta.get("selection_end"),
+                    })
+        except Exception as e:
+            self._redis_error("清扫在线状态失败", e)
+        if leaves:
+            self.record_leaves(db, leaves)
+            self._stats["swept"] += len(leaves)
+            logger.info(f"🧹 [Presence] 已清扫 {len(leaves)} 个超时在线用户")
+        return len(leaves)
+
+    def get_stats(self) -> dict:
+        return dict(self._stats)
+
+
+# 全局实例
+presence_service = PresenceService(ttl=settings.COLLAB_PRESENCE_TTL_SECONDS)
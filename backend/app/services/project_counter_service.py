@@ -0,0 +1,209 @@
+"""
+项目任务计数服务
+按 (项目, 状态) 维护任务计数，任务创建/状态流转时在业务事务内增量更新，
+项目的 total_tasks / assigned_tasks / completed_tasks 同步做原子加减，读取为 O(1)；
+定时校准任务用一条 GROUP BY 重算，修正历史数据或异常路径造成的偏差
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Tuple
+import logging
+
+from sqlalchemy import func, inspect
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.project import Project, ProjectTaskCounter
+from app.models.task import Task
+
+logger = logging.getLogger(__name__)
+
+# 计入项目 completed_tasks 的状态
+COMPLETED_STATUS = "approved"
+
+
+def _attr_change(state, name: str) -> Tuple[object, object]:
+    """读取属性在本次事务中的 (旧值, 新值)，未修改时两者相同"""
+    attr = state.attrs[name]
+    history = attr.history
+    new_value = attr.value
+    old_value = history.deleted[0] if history.deleted else new_value
+    return old_value, new_value
+
+
+class ProjectCounterService:
+    """项目任务计数服务"""
+    
+    def record_task_change(self, db: Session, task: Task):
+        """
+        根据任务对象未提交的修改更新计数（需在 db.commit() 之前调用）
+        
+        新建任务计入新状态；已有任务比较 status / assigned_to 的旧值与新值，
+        只有发生变化时才写库。调用方应以 SELECT ... FOR UPDATE 读取任务，
+        保证并发流转时旧状态读取与更新串行化。
+        """
+        state = inspect(task)
+        if state.pending or state.transient:
+            self.apply_deltas(db, {
+                (task.project_id, task.status or "pending"): (1, 1 if task.assigned_to else 0)
+            })
+            return
+        
+        old_status, new_status = _attr_change(state, "status")
+        old_assigned, new_assigned = _attr_change(state, "assigned_to")
+        if old_status == new_status and bool(old_assigned) == bool(new_assigned):
+            return
+        
+        deltas = defaultdict(lambda: [0, 0])
+        deltas[(task.project_id, old_status)][0] -= 1
+        deltas[(task.project_id, old_status)][1] -= 1 if old_assigned else 0
+        deltas[(task.project_id, new_status)][0] += 1
+        deltas[(task.project_id, new_status)][1] += 1 if new_assigned else 0
+        self.apply_deltas(db, {key: tuple(value) for key, value in deltas.items()})
+    
+    def record_created(self, db: Session, tasks: Iterable[Task]):
+        """批量创建任务后按 (项目, 状态) 汇总计数（导入等批量路径使用）"""
+        deltas = defaultdict(lambda: [0, 0])
+        for task in tasks:
+            key = (task.project_id, task.status or "pending")
+            deltas[key][0] += 1
+            deltas[key][1] += 1 if task.assigned_to else 0
+        self.apply_deltas(db, {key: tuple(value) for key, value in deltas.items()})
+    
+    def apply_deltas(self, db: Session, deltas: Dict[Tuple[str, str], Tuple[int, int]]):
+        """
+        应用计数增量 {(project_id, status): (任务数增量, 已分配数增量)}
+        
+        先以 col = col + delta 更新项目行（同时取得项目行锁，与校准任务串行），
+        再用 INSERT ... ON CONFLICT DO UPDATE 原子累加计数行；
+        均在调用方事务内执行，随业务一起提交或回滚
+        """
+        by_project: Dict[str, Dict[str, Tuple[int, int]]] = defaultdict(dict)
+        for (project_id, status), (task_delta, assigned_delta) in deltas.items():
+            if project_id and (task_delta or assigned_delta):
+                by_project[project_id][status] = (task_delta, assigned_delta)
+        
+        for project_id in sorted(by_project):  # 固定加锁顺序，避免批量路径互相死锁
+            status_deltas = by_project[project_id]
+            total_delta = sum(d for d, _ in status_deltas.values())
+            assigned_delta = sum(d for _, d in status_deltas.values())
+            completed_delta = status_deltas.get(COMPLETED_STATUS, (0, 0))[0]
+            db.query(Project).filter(Project.id == project_id).update({
+                Project.total_tasks: func.coalesce(Project.total_tasks, 0) + total_delta,
+                Project.assigned_tasks: func.coalesce(Project.assigned_tasks, 0) + assigned_delta,
+                Project.completed_tasks: func.coalesce(Project.completed_tasks, 0) + completed_delta,
+            }, synchronize_session=False)
+            
+            for status, (task_delta, status_assigned_delta) in status_deltas.items():
+                stmt = insert(ProjectTaskCounter).values(
+                    project_id=project_id,
+                    status=status,
+                    task_count=task_delta,
+                    assigned_count=status_assigned_delta
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[ProjectTaskCounter.project_id, ProjectTaskCounter.status],
+                    set_={
+                        "task_count": ProjectTaskCounter.task_count + stmt.excluded.task_count,
+                        "assigned_count": ProjectTaskCounter.assigned_count + stmt.excluded.assigned_count,
+                        "updated_at": func.now()
+                    }
+                )
+                db.execute(stmt)
+        
+        if by_project:
+            logger.debug(f"📊 [ProjectCounter] 计数已更新: {dict(by_project)}")
+    
+    def get_status_counts(self, db: Session, project_id: str) -> Dict[str, int]:
+        """读取项目各状态任务数（单次主键范围查询）"""
+        rows = db.query(ProjectTaskCounter.status, ProjectTaskCounter.task_count).filter(
+            ProjectTaskCounter.project_id == project_id
+        ).all()
+        return {status: count for status, count in rows}
+    
+    def get_all_status_counts(self, db: Session) -> Dict[str, Dict[str, int]]:
+        """读取所有项目的各状态任务数 {project_id: {status: count}}"""
+        result: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for project_id, status, count in db.query(
+            ProjectTaskCounter.project_id, ProjectTaskCounter.status, ProjectTaskCounter.task_count
+        ).all():
+            result[project_id][status] = count
+        return result
+    
+    def reconcile(self, db: Session, project_id: Optional[str] = None) -> int:
+        """
+        按 tasks 表重算计数，修正计数表与项目字段
+        
+        逐个项目加行锁（SELECT ... FOR UPDATE）后聚合并提交，
+        与并发的状态流转串行化，不会覆盖掉校准期间提交的增量
+        
+        Args:
+            project_id: 只校准指定项目；为空时校准全部项目
+            
+        Returns:
+            计数发生偏差并被修正的项目数量
+        """
+        if project_id:
+            project_ids = [project_id]
+        else:
+            project_ids = [pid for (pid,) in db.query(Project.id).order_by(Project.id).all()]
+        
+        fixed = 0
+        for pid in project_ids:
+            try:
+                if self._reconcile_project(db, pid):
+                    fixed += 1
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"❌ [ProjectCounter] 校准项目计数失败: {pid} | 错误: {e}")
+        
+        logger.info(f"✅ [ProjectCounter] 计数校准完成，检查项目: {len(project_ids)}，修正项目: {fixed}")
+        return fixed
+    
+    def _reconcile_project(self, db: Session, project_id: str) -> bool:
+        """校准单个项目（调用方负责提交），返回是否发生修正"""
+        project = db.query(Project).filter(Project.id == project_id).with_for_update().first()
+        if not project:
+            return False
+        
+        expected: Dict[str, Tuple[int, int]] = {}
+        for status, task_count, assigned_count in db.query(
+            Task.status, func.count(Task.id), func.count(Task.assigned_to)
+        ).filter(Task.project_id == project_id).group_by(Task.status).all():
+            expected[status or "pending"] = (task_count, assigned_count)
+        
+        stored = {
+            counter.status: (counter.task_count, counter.assigned_count)
+            for counter in db.query(ProjectTaskCounter).filter(ProjectTaskCounter.project_id == project_id).all()
+            if (counter.task_count, counter.assigned_count) != (0, 0)
+        }
+        
+        total = sum(count for count, _ in expected.values())
+        assigned = sum(count for _, count in expected.values())
+        completed = expected.get(COMPLETED_STATUS, (0, 0))[0]
+        if stored == expected and (project.total_tasks, project.assigned_tasks, project.completed_tasks) == (total, assigned, completed):
+            return False
+        
+        logger.warning(
+            f"⚠️ [ProjectCounter] 计数偏差已修正: {project_id} | "
+            f"总数:{project.total_tasks}->{total} 已分配:{project.assigned_tasks}->{assigned} 已完成:{project.completed_tasks}->{completed}"
+        )
+        db.query(ProjectTaskCounter).filter(
+            ProjectTaskCounter.project_id == project_id
+        ).delete(synchronize_session=False)
+        for status, (task_count, assigned_count) in expected.items():
+            db.add(ProjectTaskCounter(
+                project_id=project_id,
+                status=status,
+                task_count=task_count,
+                assigned_count=assigned_count
+            ))
+        project.total_tasks = total
+        project.assigned_tasks = assigned
+        project.completed_tasks = completed
+        return True
+
+
+# 全局实例
+project_counter_service = ProjectCounterService()
@@ -1,11 +1,10 @@
 """
 Redis Pub/Sub 实时通知服务
 使用Redis的发布订阅功能实现实时通知，支持多服务器部署
+订阅端由 app.services.notification_hub 负责（每个 worker 每个频道只订阅一次）
 """
 import redis
 import json
-import asyncio
-from typing import Callable, Dict, Optional
 import logging
 from app.config import settings
 
@@ -31,10 +30,6 @@ class RedisNotificationService:
         except Exception as e:
             self.enabled = False
             logger.warning(f"⚠️ Redis通知服务不可用，将使用直接WebSocket: {e}")
-        
-        self.pubsub = None
-        self.subscribers: Dict[str, Callable] = {}
-        self.running = False
     
     # ==================== 发布消息 ====================
     
@@ -130,125 +125,6 @@ class RedisNotificationService:
             logger.error(f"❌ 发布消息失败 {channel}: {e}")
             return 0
     
-    # ==================== 订阅频道 ====================
-    
-    async def subscribe_user_channel(self, user_id: str, callback: Callable):
-        """
-        订阅用户个人频道
-        
-        Args:
-            user_id: 用户ID
-            callback: 回调函数 async def callback(channel, message)
-        """
-        channel = f"notify:user:{user_id}"
-        await self._subscribe(channel, callback)
-    
-    async def subscribe_role_channel(self, role: str, callback: Callable):
-        """
-        订阅角色频道
-        
-        Args:
-            role: 角色名称
-            callback: 回调函数 async def callback(channel, message)
-        """
-        channel = f"notify:role:{role.lower()}"
-        await self._subscribe(channel, callback)
-    
-    async def subscribe_project_channel(self, project_id: str, callback: Callable):
-        """
-        订阅项目频道
-        
-        Args:
-            project_id: 项目ID
-            callback: 回调函数 async def callback(channel, message)
-        """
-        channel = f"notify:project:{project_id}"
-        await self._subscribe(channel, callback)
-    
-    async def subscribe_global(self, callback: Callable):
-        """
-        订阅全局广播
-        
-        Args:
-            callback: 回调函数 async def callback(channel, message)
-        """
-        await self._subscribe("notify:global", callback)
-    
-    async def _subscribe(self, channel: str, callback: Callable):
-        """
-        内部订阅方法
-        
-        Args:
-            channel: 频道名称
-            callback: 回调函数
-        """
-        if not self.enabled:
-            logger.debug(f"⚠️ Redis不可用，跳过订阅 {channel}")
-            return
-        
-        try:
-            if not self.pubsub:
-                self.pubsub = self.redis_client.pubsub()
-            
-            self.subscribers[channel] = callback
-            self.pubsub.subscribe(channel)
-            logger.info(f"📥 订阅频道: {channel}")
-        except Exception as e:
-            logger.error(f"❌ 订阅失败 {channel}: {e}")
-    
-    # ==================== 监听消息 ====================
-    
-    async def listen(self):
-        """
-        启动消息监听循环
-        这个方法应该在后台任务中运行
-        """
-        if not self.enabled:
-            logger.warning("⚠️ Redis不可用，监听循环未启动")
-            return
-        
-        self.running = True
-        logger.info("👂 开始监听Redis消息...")
-        
-        try:
-            while self.running:
-                # 获取消息（非阻塞）
-                message = self.pubsub.get_message(ignore_subscribe_messages=True)
-                
-                if message and message['type'] == 'message':
-                    channel = message['channel']
-                    data = json.loads(message['data'])
-                    
-                    # 调用回调函数
-                    if channel in self.subscribers:
-                        callback = self.subscribers[channel]
-                        try:
-                            if asyncio.iscoroutinefunction(callback):
-                                await callback(channel, data)
-                            else:
-                                callback(channel, data)
-                        except Exception as e:
-                            logger.error(f"❌ 回调函数执行失败 {channel}: {e}")
-                
-                # 短暂休眠，避免CPU占用过高
-                await asyncio.sleep(0.01)
-                
-        except Exception as e:
-            logger.error(f"❌ 监听消息出错: {e}")
-        finally:
-            self.running = False
-            logger.info("🛑 停止监听Redis消息")
-    
-    def stop(self):
-        """停止监听"""
-        self.running = False
-        if self.pubsub:
-            try:
-                self.pubsub.close()
-            except Exception as e:
-                logger.error(f"❌ 关闭pubsub失败: {e}")
-        logger.info("🛑 Redis通知服务已停止")
-    
     # ==================== 辅助方法 ====================
     
     def create_notification_message(
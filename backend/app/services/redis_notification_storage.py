@@ -1,17 +1,158 @@
 """
 基于 Redis 的离线通知存储服务
-使用 Redis List 存储用户未读通知，支持 TTL 自动过期
+每个用户一个通知 Hash + 按时间排序的 ZSET 索引 + 已读集合，支持 TTL 自动过期、
+按 ID 标记/删除和游标分页
 """
 import redis
 import json
 import uuid
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
 import logging
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# ==================== 存储布局 ====================
+# notifications:user:{uid}:items  HASH  通知ID -> 通知 JSON
+# notifications:user:{uid}:index  ZSET  通知ID，score 为毫秒时间戳
+# notifications:user:{uid}:read   SET   已读通知ID
+# 三个键共用同一 TTL（每次写入刷新），标记/删除只按 ID 操作，不再解码整个列表
+
+# 批量写入通知：一次 EVAL 处理一批用户（去重 + HSET/ZADD + 超量截断 + EXPIRE）
+# KEYS: 每个用户 items, index, read（开启去重时后面紧跟该用户的去重键）
+# ARGV: ttl, 最大条数, 去重TTL（0 表示不去重）, 时间戳, 每个用户的 (通知ID, 通知 JSON)
+_BULK_SAVE_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+local max_len = tonumber(ARGV[2])
+local dedup_ttl = tonumber(ARGV[3])
+local score = ARGV[4]
+local step = 3
+if dedup_ttl > 0 then step = 4 end
+local saved = 0
+local n = 0
+for i = 1, #KEYS, step do
+    local items, index, read = KEYS[i], KEYS[i + 1], KEYS[i + 2]
+    local id, payload = ARGV[5 + n * 2], ARGV[6 + n * 2]
+    n = n + 1
+    local fresh = true
+    if dedup_ttl > 0 then
+        fresh = redis.call('SET', KEYS[i + 3], '1', 'NX', 'EX', dedup_ttl)
+    end
+    if fresh then
+        redis.call('HSET', items, id, payload)
+        redis.call('ZADD', index, score, id)
+        local overflow = redis.call('ZCARD', index) - max_len
+        if overflow > 0 then
+            local old = redis.call('ZRANGE', index, 0, overflow - 1)
+            redis.call('HDEL', items, unpack(old))
+            redis.call('SREM', read, unpack(old))
+            redis.call('ZREMRANGEBYRANK', index, 0, overflow - 1)
+        end
+        redis.call('EXPIRE', items, ttl)
+        redis.call('EXPIRE', index, ttl)
+        redis.call('EXPIRE', read, ttl)
+        saved = saved + 1
+    end
+end
+return saved
+"""
+
+# 按时间倒序分页读取
+# 同一批写入的通知共用同一 score，游标为 (score, 通知ID)：从游标 score 起包含边界读取，
+# 跳过同 score 下已返回的 ID（同 score 成员按 ID 字典序倒序排列，已返回的即 ID >= 游标 ID 的）
+# KEYS: items, index, read
+# ARGV: 游标 score 上界（'+inf'、毫秒时间戳，或旧版游标 '(毫秒时间戳'）, 条数, 是否包含已读（'1'/'0'）, 游标通知ID（'' 表示无）
+# 返回: {下一页游标 'score:ID' 或 '', 通知 JSON, 已读标记, 通知 JSON, 已读标记, ...}
+_LIST_SCRIPT = """
+local upper = ARGV[1]
+local limit = tonumber(ARGV[2])
+local include_read = ARGV[3] == '1'
+local after_id = ARGV[4]
+local boundary = tonumber(upper)
+local out = {''}
+local count = 0
+local offset = 0
+while count < limit do
+    local rows = redis.call('ZREVRANGEBYSCORE', KEYS[2], upper, '-inf', 'WITHSCORES', 'LIMIT', offset, limit)
+    if #rows == 0 then
+        out[1] = ''
+        return out
+    end
+    offset = offset + #rows / 2
+    for j = 1, #rows, 2 do
+        local id = rows[j]
+        local score = rows[j + 1]
+        local seen = after_id ~= '' and tonumber(score) == boundary and id >= after_id
+        if not seen then
+            local is_read = redis.call('SISMEMBER', KEYS[3], id) == 1
+            if include_read or not is_read then
+                local payload = redis.call('HGET', KEYS[1], id)
+                if payload then
+                    table.insert(out, payload)
+                    table.insert(out, is_read and '1' or '0')
+                    count = count + 1
+                    out[1] = score .. ':' .. id
+                    if count >= limit then
+                        return out
+                    end
+                end
+            end
+        end
+    end
+end
+return out
+"""
+
+# 标记已读：通知存在时加入已读集合，并让已读集合与索引同时过期
+_MARK_READ_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('SADD', KEYS[3], ARGV[1])
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[3], ttl)
+end
+return 1
+"""
+
+# 全部标记已读：返回新标记的数量
+_MARK_ALL_READ_SCRIPT = """
+local ids = redis.call('ZRANGE', KEYS[2], 0, -1)
+if #ids == 0 then
+    return 0
+end
+local marked = redis.call('SADD', KEYS[3], unpack(ids))
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[3], ttl)
+end
+return marked
+"""
+
+# 删除单条通知
+_DELETE_SCRIPT = """
+if redis.call('HDEL', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('SREM', KEYS[3], ARGV[1])
+return 1
+"""
+
+# 清空已读通知：返回删除数量
+_CLEAR_READ_SCRIPT = """
+local ids = redis.call('SMEMBERS', KEYS[3])
+if #ids == 0 then
+    return 0
+end
+redis.call('HDEL', KEYS[1], unpack(ids))
+redis.call('ZREM', KEYS[2], unpack(ids))
+redis.call('DEL', KEYS[3])
+return #ids
+"""
+
 
 class RedisNotificationStorage:
     """Redis 通知存储服务"""
@@ -27,6 +168,12 @@ class RedisNotificationStorage:
             )
             # 测试连接
             self.redis_client.ping()
+            self._bulk_save_script = self.redis_client.register_script(_BULK_SAVE_SCRIPT)
+            self._list_script = self.redis_client.register_script(_LIST_SCRIPT)
+            self._mark_read_script = self.redis_client.register_script(_MARK_READ_SCRIPT)
+            self._mark_all_read_script = self.redis_client.register_script(_MARK_ALL_READ_SCRIPT)
+            self._delete_script = self.redis_client.register_script(_DELETE_SCRIPT)
+            self._clear_read_script = self.redis_client.register_script(_CLEAR_READ_SCRIPT)
             self.enabled = True
             logger.info(f"✅ Redis通知存储服务初始化成功 ({settings.REDIS_URL})")
         except Exception as e:
@@ -49,10 +196,19 @@ class RedisNotificationStorage:
         self.NOTIFICATION_TTL = 7 * 24 * 60 * 60  # 604800 秒
         # 每个用户最多保留的通知数量
         self.MAX_NOTIFICATIONS_PER_USER = 50
+        # 去重键有效期：24小时
+        self.DEDUP_TTL = 24 * 60 * 60
+        # 批量写入时每次 EVAL 处理的用户数
+        self.BULK_CHUNK_SIZE = 1000
     
     def _get_user_notification_key(self, user_id: str) -> str:
-        """获取用户通知的 Redis key"""
+        """获取用户通知的 Redis key 前缀（旧版 List 布局也使用该键）"""
         return f"notifications:user:{user_id}"
+
+    def _get_user_keys(self, user_id: str) -> List[str]:
+        """获取用户通知的 items / index / read 三个键"""
+        prefix = self._get_user_notification_key(user_id)
+        return [f"{prefix}:items", f"{prefix}:index", f"{prefix}:read"]
     
     def save_notification(
         self,
@@ -86,102 +242,164 @@ class RedisNotificationStorage:
             logger.warning(f"⚠️ Redis不可用，无法保存通知")
             return False
         
+        saved = self.save_notification_bulk(
+            [user_id],
+            notification_type=notification_type,
+            title=title,
+            content=content,
+            data=data,
+            priority=priority,
+            custom_ttl=custom_ttl,
+            dedup_key=dedup_key
+        )
+        if saved < 0:
+            return False
+        if saved == 0:
+            logger.info(f"⏭️ [Redis] 跳过重复通知: user={user_id}, dedup_key={dedup_key}")
+        else:
+            logger.info(f"💾 [Redis] 通知已保存: user={user_id}, type={notification_type}, dedup={dedup_key or 'N/A'}")
+        return True
+
+    def _resolve_ttl(self, notification_type: str, custom_ttl: Optional[int]) -> int:
+        """使用类型特定的TTL，可被自定义TTL覆盖"""
+        if custom_ttl is not None:
+            return custom_ttl
+        return self.NOTIFICATION_TTL_MAP.get(notification_type, self.NOTIFICATION_TTL_MAP["default"])
+
+    def save_notification_bulk(
+        self,
+        user_ids: Iterable[str],
+        notification_type: str,
+        title: str,
+        content: str,
+        data: Optional[Dict] = None,
+        priority: str = "normal",
+        custom_ttl: Optional[int] = None,
+        dedup_key: Optional[str] = None
+    ) -> int:
+        """
+        批量保存同一条通知给多个用户
+
+        按 BULK_CHUNK_SIZE 分批，每批一次 Lua 调用完成去重、写入、截断和过期，
+        几千个用户只需几次往返
+
+        Args:
+            user_ids: 用户ID列表
+            其余参数同 save_notification
+
+        Returns:
+            实际写入的用户数（去重跳过的不计入），Redis 不可用或出错返回 -1
+        """
+        if not self.enabled:
+            logger.warning(f"⚠️ Redis不可用，无法保存通知")
+            return -1
+
+        ttl = self._resolve_ttl(notification_type, custom_ttl)
+        dedup_ttl = self.DEDUP_TTL if dedup_key else 0
+        now = datetime.now()
+        base = {
+            "type": notification_type,
+            "title": title,
+            "content": content,
+            "data": data or {},
+            "priority": priority,
+            "timestamp": int(now.timestamp() * 1000),
+            "created_at": now.isoformat()
+        }
+
+        user_ids = [str(user_id) for user_id in user_ids]
+        saved = 0
         try:
-            # ✅ 1. 检查是否需要去重
-            if dedup_key:
-                dedup_cache_key = f"notif_dedup:{user_id}:{dedup_key}"
-                if self.redis_client.exists(dedup_cache_key):
-                    logger.info(f"⏭️ [Redis] 跳过重复通知: user={user_id}, dedup_key={dedup_key}")
-                    return True  # 视为成功
-                # 设置去重缓存，24小时过期
-                self.redis_client.setex(dedup_cache_key, 24 * 60 * 60, "1")
-            
-            # 2. 构建通知对象
-            notification = {
-                "id": str(uuid.uuid4()),
-                "type": notification_type,
-                "title": title,
-                "content": content,
-                "data": data or {},
-                "priority": priority,
-                "timestamp": int(datetime.now().timestamp() * 1000),
-                "created_at": datetime.now().isoformat()
-            }
-            
-            key = self._get_user_notification_key(user_id)
-            
-            # 3. 添加到列表头部（最新的通知在前面）
-            self.redis_client.lpush(key, json.dumps(notification, ensure_ascii=False))
-            
-            # ✅ 4. 使用类型特定的TTL
-            if custom_ttl is not None:
-                ttl = custom_ttl
-            else:
-                ttl = self.NOTIFICATION_TTL_MAP.get(
-                    notification_type, 
-                    self.NOTIFICATION_TTL_MAP["default"]
-                )
-            
-            # 设置过期时间（每次添加都刷新）
-            self.redis_client.expire(key, ttl)
-            
-            # 5. 限制列表长度（保留最新的 N 条）
-            self.redis_client.ltrim(key, 0, self.MAX_NOTIFICATIONS_PER_USER - 1)
-            
-            logger.info(
-                f"💾 [Redis] 通知已保存: user={user_id}, type={notification_type}, "
-                f"ttl={ttl}s ({ttl/3600:.1f}h), dedup={dedup_key or 'N/A'}, id={notification['id']}"
-            )
-            return True
-            
+            for start in range(0, len(user_ids), self.BULK_CHUNK_SIZE):
+                chunk = user_ids[start:start + self.BULK_CHUNK_SIZE]
+                keys: List[str] = []
+                payloads: List[str] = []
+                for user_id in chunk:
+                    keys.extend(self._get_user_keys(user_id))
+                    if dedup_key:
+                        keys.append(f"notif_dedup:{user_id}:{dedup_key}")
+                    notification_id = str(uuid.uuid4())
+                    payloads.append(notification_id)
+                    payloads.append(json.dumps({"id": notification_id, **base}, ensure_ascii=False))
+                saved += int(self._bulk_save_script(
+                    keys=keys,
+                    args=[ttl, self.MAX_NOTIFICATIONS_PER_USER, dedup_ttl, base["timestamp"], *payloads]
+                ))
+            return saved
         except Exception as e:
-            logger.error(f"❌ [Redis] 保存通知失败: {e}", exc_info=True)
-            return False
+            logger.error(f"❌ [Redis] 批量保存通知失败: {e}", exc_info=True)
+            return -1
     
-    def get_unread_notifications(
+    def list_notifications(
         self,
         user_id: str,
-        limit: int = 50
-    ) -> List[Dict]:
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_read: bool = False
+    ) -> Dict:
         """
-        获取用户的未读通知
-        
+        按时间倒序游标分页读取通知
+
         Args:
             user_id: 用户ID
-            limit: 返回数量限制
-            
+            limit: 每页数量
+            cursor: 上一页返回的 next_cursor（'毫秒时间戳:通知ID'），为空表示第一页
+            include_read: 是否包含已读通知
+
         Returns:
-            通知列表
+            {"notifications": [...], "next_cursor": str | None}，每条通知带 read 标记
         """
         if not self.enabled:
             logger.warning(f"⚠️ Redis不可用，无法获取通知")
-            return []
-        
+            return {"notifications": [], "next_cursor": None}
+
         try:
-            key = self._get_user_notification_key(user_id)
-            
-            # 获取所有通知（从头部开始，即最新的）
-            notifications_json = self.redis_client.lrange(key, 0, limit - 1)
-            
+            upper, after_id = "+inf", ""
+            if cursor:
+                score, sep, after_id = str(cursor).partition(":")
+                # 旧版游标只有时间戳：按开区间读取
+                upper = str(int(float(score))) if sep else f"({int(float(score))}"
+            result = self._list_script(
+                keys=self._get_user_keys(user_id),
+                args=[upper, limit, "1" if include_read else "0", after_id]
+            )
             notifications = []
-            for notif_json in notifications_json:
+            for i in range(1, len(result), 2):
                 try:
-                    notification = json.loads(notif_json)
-                    notifications.append(notification)
+                    notification = json.loads(result[i])
                 except json.JSONDecodeError as e:
                     logger.error(f"❌ [Redis] 解析通知失败: {e}")
                     continue
-            
-            logger.info(f"📬 [Redis] 获取未读通知: user={user_id}, count={len(notifications)}")
-            return notifications
-            
+                notification["read"] = result[i + 1] == "1"
+                notifications.append(notification)
+            next_cursor = result[0] or None
+            return {"notifications": notifications, "next_cursor": next_cursor}
         except Exception as e:
             logger.error(f"❌ [Redis] 获取通知失败: {e}", exc_info=True)
-            return []
+            return {"notifications": [], "next_cursor": None}
+
+    def get_unread_notifications(
+        self,
+        user_id: str,
+        limit: int = 50
+    ) -> List[Dict]:
+        """
+        获取用户的未读通知（最新的在前）
+        
+        Args:
+            user_id: 用户ID
+            limit: 返回数量限制
+            
+        Returns:
+            通知列表
+        """
+        notifications = self.list_notifications(user_id, limit=limit)["notifications"]
+        logger.info(f"📬 [Redis] 获取未读通知: user={user_id}, count={len(notifications)}")
+        return notifications
     
     def get_unread_count(self, user_id: str) -> int:
         """
-        获取用户未读通知数量
+        获取用户未读通知数量（索引总数 - 已读数，O(1)）
         
         Args:
             user_id: 用户ID
@@ -193,8 +411,12 @@ class RedisNotificationStorage:
             return 0
         
         try:
-            key = self._get_user_notification_key(user_id)
-            count = self.redis_client.llen(key)
+            _, index_key, read_key = self._get_user_keys(user_id)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.zcard(index_key)
+            pipe.scard(read_key)
+            total, read = pipe.execute()
+            count = max(0, total - read)
             logger.info(f"📬 [Redis] 未读通知数: user={user_id}, count={count}")
             return count
         except Exception as e:
@@ -203,83 +425,89 @@ class RedisNotificationStorage:
     
     def mark_as_read(self, user_id: str, notification_id: str) -> bool:
         """
-        标记通知为已读（从列表中删除）
+        标记通知为已读（加入已读集合）
         
         Args:
             user_id: 用户ID
             notification_id: 通知ID
             
         Returns:
-            是否成功
+            是否成功（通知不存在返回 False）
         """
         if not self.enabled:
             return False
         
         try:
-            key = self._get_user_notification_key(user_id)
-            
-            # 获取所有通知
-            notifications_json = self.redis_client.lrange(key, 0, -1)
-            
-            # 找到并删除指定的通知
-            for notif_json in notifications_json:
-                try:
-                    notification = json.loads(notif_json)
-                    if notification.get('id') == notification_id:
-                        # 从列表中删除这条通知
-                        self.redis_client.lrem(key, 1, notif_json)
-                        logger.info(f"✅ [Redis] 通知已标记为已读: user={user_id}, id={notification_id}")
-                        return True
-                except json.JSONDecodeError:
-                    continue
-            
+            if self._mark_read_script(keys=self._get_user_keys(user_id), args=[notification_id]):
+                logger.info(f"✅ [Redis] 通知已标记为已读: user={user_id}, id={notification_id}")
+                return True
             logger.warning(f"⚠️ [Redis] 未找到通知: user={user_id}, id={notification_id}")
             return False
-            
         except Exception as e:
             logger.error(f"❌ [Redis] 标记已读失败: {e}", exc_info=True)
             return False
     
-    def mark_all_as_read(self, user_id: str) -> bool:
+    def mark_all_as_read(self, user_id: str) -> int:
         """
-        标记所有通知为已读（清空列表）
+        标记所有通知为已读
         
         Args:
             user_id: 用户ID
             
         Returns:
-            是否成功
+            新标记为已读的数量，失败返回 -1
         """
         if not self.enabled:
-            return False
+            return -1
         
         try:
-            key = self._get_user_notification_key(user_id)
-            count = self.redis_client.llen(key)
-            
-            # 删除整个列表
-            self.redis_client.delete(key)
-            
+            count = int(self._mark_all_read_script(keys=self._get_user_keys(user_id)))
             logger.info(f"✅ [Redis] 所有通知已标记为已读: user={user_id}, count={count}")
-            return True
-            
+            return count
         except Exception as e:
             logger.error(f"❌ [Redis] 标记所有已读失败: {e}", exc_info=True)
-            return False
+            return -1
     
     def delete_notification(self, user_id: str, notification_id: str) -> bool:
         """
-        删除通知（从列表中移除）
+        删除通知
         
         Args:
             user_id: 用户ID
             notification_id: 通知ID
             
         Returns:
-            是否成功
+            是否成功（通知不存在返回 False）
+        """
+        if not self.enabled:
+            return False
+        
+        try:
+            if self._delete_script(keys=self._get_user_keys(user_id), args=[notification_id]):
+                logger.info(f"🗑️ [Redis] 通知已删除: user={user_id}, id={notification_id}")
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"❌ [Redis] 删除通知失败: {e}", exc_info=True)
+            return False
+
+    def clear_read(self, user_id: str) -> int:
+        """
+        删除所有已读通知
+        
+        Returns:
+            删除数量，失败返回 -1
         """
-        # 删除和标记已读是同一个操作
-        return self.mark_as_read(user_id, notification_id)
+        if not self.enabled:
+            return -1
+        
+        try:
+            count = int(self._clear_read_script(keys=self._get_user_keys(user_id)))
+            logger.info(f"🗑️ [Redis] 已读通知已清空: user={user_id}, count={count}")
+            return count
+        except Exception as e:
+            logger.error(f"❌ [Redis] 清空已读通知失败: {e}", exc_info=True)
+            return -1
     
     def get_ttl(self, user_id: str) -> int:
         """
@@ -295,9 +523,8 @@ class RedisNotificationStorage:
             return -2
         
         try:
-            key = self._get_user_notification_key(user_id)
-            ttl = self.redis_client.ttl(key)
-            return ttl
+            _, index_key, _ = self._get_user_keys(user_id)
+            return self.redis_client.ttl(index_key)
         except Exception as e:
             logger.error(f"❌ [Redis] 获取TTL失败: {e}")
             return -2
@@ -8,6 +8,8 @@ from datetime import datetime
 from app.utils.datetime_utils import utc_now
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from app.config import settings
 from app.services.notification_ws import manager as ws_manager
 
 logger = logging.getLogger(__name__)
@@ -29,6 +31,15 @@ class SchedulerService:
             # 添加下班提醒任务：每天 17:10
             self.add_work_end_reminder()
             
+            # 项目任务计数校准
+            self.add_project_counter_reconcile()
+            
+            # 协作文档在线状态清扫
+            self.add_presence_sweep()
+            
+            # 协作文档增量保存合并落库
+            self.add_document_save_flush()
+            
             # 可以在这里添加更多定时任务
             # self.add_other_task()
     
@@ -61,6 +72,99 @@ class SchedulerService:
         except Exception as e:
             logger.error(f"❌ [Scheduler] 添加下班提醒任务失败: {e}")
     
+    def add_project_counter_reconcile(self):
+        """添加项目任务计数校准任务：按配置间隔执行，启动后立即校准一次"""
+        try:
+            self.scheduler.add_job(
+                func=self._reconcile_project_counters,
+                trigger=IntervalTrigger(minutes=settings.PROJECT_COUNTER_RECONCILE_MINUTES),
+                id='project_counter_reconcile',
+                name='项目任务计数校准',
+                replace_existing=True,
+                next_run_time=datetime.now(self.scheduler.timezone),
+                max_instances=1,
+                coalesce=True
+            )
+            logger.info(f"⏰ [Scheduler] 已添加项目任务计数校准任务：每 {settings.PROJECT_COUNTER_RECONCILE_MINUTES} 分钟")
+        except Exception as e:
+            logger.error(f"❌ [Scheduler] 添加项目任务计数校准任务失败: {e}")
+    
+    def add_presence_sweep(self):
+        """添加协作在线状态清扫任务：把心跳超时的离开批量写回会话表"""
+        try:
+            self.scheduler.add_job(
+                func=self._sweep_presence,
+                trigger=IntervalTrigger(seconds=settings.COLLAB_PRESENCE_SWEEP_SECONDS),
+                id='collab_presence_sweep',
+                name='协作在线状态清扫',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            logger.info(f"⏰ [Scheduler] 已添加协作在线状态清扫任务：每 {settings.COLLAB_PRESENCE_SWEEP_SECONDS} 秒")
+        except Exception as e:
+            logger.error(f"❌ [Scheduler] 添加协作在线状态清扫任务失败: {e}")
+    
+    def _sweep_presence(self):
+        """清扫心跳超时的在线用户"""
+        from app.database import SessionLocal
+        from app.services.presence_service import presence_service
+        
+        db = SessionLocal()
+        try:
+            presence_service.sweep(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ [Scheduler] 协作在线状态清扫失败: {e}", exc_info=True)
+        finally:
+            db.close()
+    
+    def add_document_save_flush(self):
+        """添加协作文档保存落库任务：把 Redis 中合并的增量保存写回数据库"""
+        try:
+            self.scheduler.add_job(
+                func=self._flush_document_saves,
+                trigger=IntervalTrigger(seconds=settings.COLLAB_SAVE_FLUSH_SECONDS),
+                id='collab_document_save_flush',
+                name='协作文档保存落库',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            logger.info(f"⏰ [Scheduler] 已添加协作文档保存落库任务：每 {settings.COLLAB_SAVE_FLUSH_SECONDS} 秒")
+        except Exception as e:
+            logger.error(f"❌ [Scheduler] 添加协作文档保存落库任务失败: {e}")
+    
+    def _flush_document_saves(self):
+        """合并落库协作文档的增量保存"""
+        from app.database import SessionLocal
+        from app.services.document_save_service import document_saves
+        
+        db = SessionLocal()
+        try:
+            document_saves.flush(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ [Scheduler] 协作文档保存落库失败: {e}", exc_info=True)
+        finally:
+            db.close()
+    
+    def _reconcile_project_counters(self):
+        """按任务表重算项目任务计数，修正偏差"""
+        from app.database import SessionLocal
+        from app.services.project_counter_service import project_counter_service
+        
+        db = SessionLocal()
+        try:
+            fixed = project_counter_service.reconcile(db)
+            if fixed:
+                from app.services.cache_service import cache_service
+                cache_service.invalidate_projects_cache()
+        except Exception as e:
+            logger.error(f"❌ [Scheduler] 项目任务计数校准失败: {e}", exc_info=True)
+        finally:
+            db.close()
+    
     def _send_work_end_reminder(self):
         """发送下班提醒（保存给所有用户，包括离线用户）"""
         try:
@@ -0,0 +1,353 @@
+"""
+全文搜索服务
+- HTML 去标签为纯文本，中文按字二元组（bigram）切分、英文/数字按词切分，直接构造 tsvector/tsquery 字面量，
+  不依赖数据库的分词配置与中文分词扩展
+- 文章与协作文档保存时通过 ORM 事件在同一事务内更新 search_index
+- 查询按 ts_rank_cd 排序、数据库分页，只对当前页生成高亮摘要
+"""
+import html
+import logging
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+from sqlalchemy import cast, desc, event, func, inspect, literal_column, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import TSQUERY, TSVECTOR, insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.article import Article
+from app.models.collaboration import CollaborationDocument
+from app.models.search import SearchEntry
+
+logger = logging.getLogger(__name__)
+
+ENTITY_ARTICLE = "article"
+ENTITY_DOCUMENT = "document"
+
+# PostgreSQL tsvector 限制：位置最大 16383，每个词位最多保留 255 个位置
+MAX_POSITION = 16383
+MAX_POSITIONS_PER_LEXEME = 255
+# 单个英文词最长保留的字符数（超长串一般是 base64/链接，不参与搜索）
+MAX_WORD_LENGTH = 64
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+_TOKEN_RE = re.compile(rf"[{_CJK}]+|[0-9a-z\u00c0-\u024f]+")
+_CJK_RE = re.compile(rf"[{_CJK}]")
+
+# 按块级元素断行，避免相邻段落的文字被拼成一个词
+_BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "td", "th", "table", "h1", "h2", "h3", "h4", "h5", "h6",
+    "blockquote", "pre", "section", "article", "header", "footer", "hr",
+}
+_SKIP_TAGS = {"script", "style", "noscript", "template"}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(content: Optional[str]) -> str:
+    """HTML 转纯文本（合并空白，保留段落换行）"""
+    if not content:
+        return ""
+    if "<" not in content:
+        return html.unescape(content).strip()
+    parser = _TextExtractor()
+    try:
+        parser.feed(content)
+        parser.close()
+    except Exception:
+        # 残缺的 HTML：退化为粗略去标签
+        return re.sub(r"<[^>]*>", " ", content)
+    text = "".join(parser.parts)
+    text = re.sub(r"[ \t\r\f\v\u00a0]+", " ", text)
+    return re.sub(r"\s*\n\s*", "\n", text).strip()
+
+
+def _is_cjk(token: str) -> bool:
+    return bool(_CJK_RE.match(token))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    切分为词位序列
+    中文连续段输出相邻二元组，并补上末字的单字词位（单字查询按前缀匹配二元组与末字）
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        run = match.group()
+        if _is_cjk(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run[:MAX_WORD_LENGTH])
+    return tokens
+
+
+def _quote(lexeme: str) -> str:
+    return "'" + lexeme.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def build_tsvector(title: str, body: str) -> str:
+    """构造 tsvector 字面量：标题词位权重 A，正文权重 D（默认），按出现顺序记录位置"""
+    positions: Dict[str, List[str]] = {}
+    position = 0
+    for weight, text in (("A", title), ("", body)):
+        for token in tokenize(text):
+            position += 1
+            entries = positions.setdefault(token, [])
+            if position <= MAX_POSITION and len(entries) < MAX_POSITIONS_PER_LEXEME:
+                entries.append(f"{position}{weight}")
+    return " ".join(
+        f"{_quote(lexeme)}:{','.join(entries)}" if entries else _quote(lexeme)
+        for lexeme, entries in positions.items()
+    )
+
+
+def query_terms(q: str) -> List[str]:
+    """查询中的检索词（英文词、中文连续段），用于高亮"""
+    return [match.group() for match in _TOKEN_RE.finditer(q.lower())]
+
+
+def build_tsquery(q: str) -> Optional[str]:
+    """
+    构造 tsquery 字面量：各检索词之间为 AND
+    英文词按前缀匹配；中文段按相邻二元组短语匹配（<->），单字按前缀匹配
+    """
+    parts = []
+    for term in query_terms(q):
+        if _is_cjk(term) and len(term) > 1:
+            bigrams = [term[i:i + 2] for i in range(len(term) - 1)]
+            phrase = " <-> ".join(_quote(bigram) for bigram in bigrams)
+            parts.append(f"({phrase})" if len(bigrams) > 1 else phrase)
+        else:
+            parts.append(f"{_quote(term[:MAX_WORD_LENGTH])}:*")
+    return " & ".join(parts) or None
+
+
+def highlight(text: Optional[str], terms: List[str], width: Optional[int] = None) -> str:
+    """
+    以第一个命中位置为中心截取摘要并用 <mark> 标注命中（结果已做 HTML 转义）
+    width 为 None 时不截取（用于标题）
+    """
+    text = text or ""
+    pattern = None
+    if terms:
+        alternatives = sorted({re.escape(term) for term in terms}, key=len, reverse=True)
+        pattern = re.compile("|".join(alternatives), re.IGNORECASE)
+    if width is not None:
+        start = 0
+        if pattern is not None:
+            match = pattern.search(text)
+            if match:
+                start = max(0, match.start() - width // 3)
+        snippet = text[start:start + width].replace("\n", " ")
+        text = ("…" if start > 0 else "") + snippet + ("…" if start + width < len(text) else "")
+    if pattern is None:
+        return html.escape(text)
+    pieces = []
+    last = 0
+    for match in pattern.finditer(text):
+        pieces.append(html.escape(text[last:match.start()]))
+        pieces.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    pieces.append(html.escape(text[last:]))
+    return "".join(pieces)
+
+
+class SearchService:
+    """搜索索引维护与查询"""
+
+    def __init__(self, max_index_chars: int):
+        # 只索引正文的前 max_index_chars 个字符（超长文档的尾部不参与搜索）
+        self.max_index_chars = max_index_chars
+
+    # ==================== 索引维护 ====================
+
+    def entry_values(self, entity_type: str, entity_id: str, title: Optional[str], *html_parts: Optional[str]) -> dict:
+        """计算一条索引记录（纯文本 + tsvector 字面量）"""
+        title = title or ""
+        body = "\n".join(text for text in (html_to_text(part) for part in html_parts) if text)
+        body = body[:self.max_index_chars]
+        return {
+            "entity_type": entity_type,
+            "entity_id": entity_id,
+            "title": title[:200],
+            "body": body,
+            "tsv": build_tsvector(title, body),
+        }
+
+    @staticmethod
+    def upsert_statement(rows: List[dict]):
+        """批量写入/覆盖索引记录的 INSERT ... ON CONFLICT 语句"""
+        stmt = insert(SearchEntry.__table__).values([
+            {**row, "tsv": cast(row["tsv"], TSVECTOR)} for row in rows
+        ])
+        return stmt.on_conflict_do_update(
+            index_elements=["entity_type", "entity_id"],
+            set_={
+                "title": stmt.excluded.title,
+                "body": stmt.excluded.body,
+                "tsv": stmt.excluded.tsv,
+                "updated_at": func.now(),
+            }
+        )
+
+    def index_article(self, connection, article: Article):
+        row = self.entry_values(ENTITY_ARTICLE, article.id, article.title, article.summary, article.content)
+        connection.execute(self.upsert_statement([row]))
+
+    def index_document(self, connection, document: CollaborationDocument):
+        row = self.entry_values(
+            ENTITY_DOCUMENT, document.id, document.title, document.description, document.content
+        )
+        connection.execute(self.upsert_statement([row]))
+
+    @staticmethod
+    def remove(connection, entity_type: str, entity_id: str):
+        table = SearchEntry.__table__
+        connection.execute(
+            table.delete().where(table.c.entity_type == entity_type, table.c.entity_id == entity_id)
+        )
+
+    # ==================== 查询 ====================
+
+    @staticmethod
+    def match_ids(entity_type: str, q: str):
+        """
+        返回匹配的实体ID子查询（供列表接口的 search 参数使用）；查询中没有可检索的词时返回 None
+        """
+        tsquery = build_tsquery(q)
+        if tsquery is None:
+            return None
+        return select(SearchEntry.entity_id).where(
+            SearchEntry.entity_type == entity_type,
+            SearchEntry.tsv.op("@@")(cast(tsquery, TSQUERY))
+        )
+
+    def search(
+        self,
+        db: Session,
+        q: str,
+        visibility: Dict[str, object],
+        page: int = 1,
+        page_size: int = 20,
+        snippet_width: int = 160,
+    ) -> dict:
+        """
+        按相关度分页搜索
+
+        visibility: 实体类型 -> 可见性条件（关联 SearchEntry.entity_id 的 SQL 条件），只搜索其中的实体类型
+        """
+        tsquery = build_tsquery(q)
+        empty = {"items": [], "total": 0, "page": page, "page_size": page_size, "total_pages": 0}
+        if tsquery is None or not visibility:
+            return empty
+        query_value = cast(tsquery, TSQUERY)
+        rank = func.ts_rank_cd(SearchEntry.tsv, query_value).label("rank")
+        query = db.query(
+            SearchEntry.entity_type, SearchEntry.entity_id, SearchEntry.title, SearchEntry.updated_at, rank
+        ).filter(
+            SearchEntry.tsv.op("@@")(query_value),
+            or_(*[
+                (SearchEntry.entity_type == entity_type) & condition
+                for entity_type, condition in visibility.items()
+            ])
+        )
+        total = query.count()
+        rows = query.order_by(desc(literal_column("rank")), desc(SearchEntry.updated_at)).offset(
+            (page - 1) * page_size
+        ).limit(page_size).all()
+
+        # 只为当前页读取正文生成摘要
+        bodies = {}
+        if rows:
+            keys = [(row.entity_type, row.entity_id) for row in rows]
+            for entity_type, entity_id, body in db.query(
+                SearchEntry.entity_type, SearchEntry.entity_id, SearchEntry.body
+            ).filter(tuple_(SearchEntry.entity_type, SearchEntry.entity_id).in_(keys)):
+                bodies[(entity_type, entity_id)] = body
+
+        terms = query_terms(q)
+        items = [
+            {
+                "type": row.entity_type,
+                "id": row.entity_id,
+                "title": row.title,
+                "title_highlight": highlight(row.title, terms),
+                "snippet": highlight(bodies.get((row.entity_type, row.entity_id)), terms, width=snippet_width),
+                "rank": float(row.rank or 0),
+                "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+            }
+            for row in rows
+        ]
+        return {
+            "items": items,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size,
+        }
+
+
+# 全局实例
+search_service = SearchService(max_index_chars=settings.SEARCH_MAX_INDEX_CHARS)
+
+
+# ==================== 保存时维护索引 ====================
+
+def _changed(target, *fields) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+@event.listens_for(Article, "after_insert")
+def _index_new_article(mapper, connection, target):
+    search_service.index_article(connection, target)
+
+
+@event.listens_for(Article, "after_update")
+def _reindex_article(mapper, connection, target):
+    if _changed(target, "title", "summary", "content"):
+        search_service.index_article(connection, target)
+
+
+@event.listens_for(Article, "after_delete")
+def _unindex_article(mapper, connection, target):
+    search_service.remove(connection, ENTITY_ARTICLE, target.id)
+
+
+@event.listens_for(CollaborationDocument, "after_insert")
+def _index_new_document(mapper, connection, target):
+    search_service.index_document(connection, target)
+
+
+@event.listens_for(CollaborationDocument, "after_update")
+def _reindex_document(mapper, connection, target):
+    if _changed(target, "title", "description", "content"):
+        search_service.index_document(connection, target)
+
+
+@event.listens_for(CollaborationDocument, "after_delete")
+def _unindex_document(mapper, connection, target):
+    search_service.remove(connection, ENTITY_DOCUMENT, target.id)
@@ -35,12 +35,19 @@ class StatsCacheService:
     def set_dashboard_stats(self, data: Dict, cache_key_suffix: str = ""):
         """设置仪表板统计缓存"""
         cache_key = f"stats:dashboard:general{':' + cache_key_suffix if cache_key_suffix else ''}"
-        self.cache.set(cache_key, data, expire=self.DASHBOARD_STATS_TTL)
+        self.cache.set(cache_key, data, expire=self.DASHBOARD_STATS_TTL, tags=["stats:dashboard"])
         logger.info(f"💾 仪表板统计已缓存: {cache_key}, TTL={self.DASHBOARD_STATS_TTL}s")
     
+    def get_or_compute_dashboard_stats(self, compute_func: callable, cache_key_suffix: str = "") -> Dict:
+        """获取仪表板统计，未命中时单飞重算（仪表板统计失效后并发刷新只计算一次）"""
+        cache_key = f"stats:dashboard:general{':' + cache_key_suffix if cache_key_suffix else ''}"
+        return self.get_or_compute(
+            cache_key, compute_func, ttl=self.DASHBOARD_STATS_TTL, tags=["stats:dashboard"]
+        )
+    
     def invalidate_dashboard_stats(self):
         """清除仪表板统计缓存"""
-        self.cache.delete_pattern("stats:dashboard:*")
+        self.cache.invalidate_tags("stats:dashboard")
         logger.info("🗑️ 仪表板统计缓存已清除")
     
     # ==================== 项目统计缓存 ====================
@@ -56,7 +63,7 @@ class StatsCacheService:
     def set_project_stats(self, project_id: str, data: Dict):
         """设置项目统计缓存"""
         cache_key = f"stats:project:{project_id}"
-        self.cache.set(cache_key, data, expire=self.PROJECT_STATS_TTL)
+        self.cache.set(cache_key, data, expire=self.PROJECT_STATS_TTL, tags=["stats:project"])
         logger.info(f"💾 项目统计已缓存: {cache_key}, TTL={self.PROJECT_STATS_TTL}s")
     
     def invalidate_project_stats(self, project_id: str = None):
@@ -66,7 +73,7 @@ class StatsCacheService:
             self.cache.delete(cache_key)
             logger.info(f"🗑️ 项目统计缓存已清除: {project_id}")
         else:
-            self.cache.delete_pattern("stats:project:*")
+            self.cache.invalidate_tags("stats:project")
             logger.info("🗑️ 所有项目统计缓存已清除")
     
     # ==================== 绩效统计缓存 ====================
@@ -87,10 +94,12 @@ class StatsCacheService:
         """设置绩效统计缓存"""
         if user_id:
             cache_key = f"stats:performance:user:{user_id}:{period}"
+            tags = ["stats:performance", f"stats:performance:user:{user_id}", f"stats:performance:period:{period}"]
         else:
             cache_key = f"stats:performance:team:{period}"
+            tags = ["stats:performance", f"stats:performance:period:{period}"]
         
-        self.cache.set(cache_key, data, expire=self.PERFORMANCE_STATS_TTL)
+        self.cache.set(cache_key, data, expire=self.PERFORMANCE_STATS_TTL, tags=tags)
         logger.info(f"💾 绩效统计已缓存: {cache_key}, TTL={self.PERFORMANCE_STATS_TTL}s")
     
     def invalidate_performance_stats(self, user_id: str = None, period: str = None):
@@ -100,13 +109,13 @@ class StatsCacheService:
             self.cache.delete(cache_key)
             logger.info(f"🗑️ 用户绩效缓存已清除: {user_id}, {period}")
         elif user_id:
-            self.cache.delete_pattern(f"stats:performance:user:{user_id}:*")
+            self.cache.invalidate_tags(f"stats:performance:user:{user_id}")
             logger.info(f"🗑️ 用户所有绩效缓存已清除: {user_id}")
         elif period:
-            self.cache.delete_pattern(f"stats:performance:*:{period}")
+            self.cache.invalidate_tags(f"stats:performance:period:{period}")
             logger.info(f"🗑️ {period} 周期绩效缓存已清除")
         else:
-            self.cache.delete_pattern("stats:performance:*")
+            self.cache.invalidate_tags("stats:performance")
             logger.info("🗑️ 所有绩效统计缓存已清除")
     
     # ==================== 工作日志统计缓存 ====================
@@ -134,7 +143,7 @@ class StatsCacheService:
         else:
             cache_key = "stats:worklog:summary"
         
-        self.cache.set(cache_key, data, expire=self.WORKLOG_STATS_TTL)
+        self.cache.set(cache_key, data, expire=self.WORKLOG_STATS_TTL, tags=["stats:worklog"])
         logger.info(f"💾 工作日志统计已缓存: {cache_key}, TTL={self.WORKLOG_STATS_TTL}s")
     
     def invalidate_worklog_stats(self, week_id: str = None, user_id: str = None):
@@ -144,10 +153,10 @@ class StatsCacheService:
             self.cache.delete(cache_key)
             logger.info(f"🗑️ 工作周统计缓存已清除: {week_id}")
         elif user_id:
-            self.cache.delete_pattern(f"stats:worklog:user:{user_id}")
+            self.cache.delete(f"stats:worklog:user:{user_id}")
             logger.info(f"🗑️ 用户工作日志缓存已清除: {user_id}")
         else:
-            self.cache.delete_pattern("stats:worklog:*")
+            self.cache.invalidate_tags("stats:worklog")
             logger.info("🗑️ 所有工作日志统计缓存已清除")
     
     # ==================== 通用统计辅助方法 ====================
@@ -156,34 +165,28 @@ class StatsCacheService:
         self, 
         cache_key: str, 
         compute_func: callable, 
-        ttl: int = 900
+        ttl: int = 900,
+        tags: Optional[List[str]] = None
     ) -> Any:
         """
         通用缓存模式：先检查缓存，未命中则计算并缓存
         
+        并发未命中时只有一个请求执行计算（single-flight），临近过期时概率性提前刷新
+        
         Args:
             cache_key: 缓存键
             compute_func: 计算函数（无参数）
             ttl: 过期时间（秒）
+            tags: 失效标签列表
         
         Returns:
             计算结果
         """
-        # 尝试从缓存获取
-        cached = self.cache.get(cache_key)
-        if cached is not None:
-            logger.info(f"🎯 缓存命中: {cache_key}")
-            return cached
-        
-        # 缓存未命中，执行计算
-        logger.info(f"💨 缓存未命中，执行计算: {cache_key}")
-        result = compute_func()
-        
-        # 写入缓存
-        self.cache.set(cache_key, result, expire=ttl)
-        logger.info(f"💾 计算结果已缓存: {cache_key}, TTL={ttl}s")
+        def compute():
+            logger.info(f"💨 缓存未命中，执行计算: {cache_key}")
+            return compute_func()
         
-        return result
+        return self.cache.get_or_set(cache_key, compute, expire=ttl, tags=tags)
 
 
 # 全局实例
@@ -0,0 +1,362 @@
+"""
+任务批量导入服务
+上传文件先落盘，后台逐行流式解析（CSV 增量读取 / openpyxl read_only），
+项目与用户按批次一次性解析并缓存，任务按批 bulk_insert_mappings 写入，
+导入进度保存在 Redis（不可用时退化为进程内字典），前端通过 job_id 轮询
+"""
+
+import codecs
+import csv
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.project import Project
+from app.models.task import Task
+from app.models.user import User
+from app.services.cache_service import cache_service, dumps_json, loads_json
+from app.services.project_counter_service import project_counter_service
+from app.services.stats_cache_service import stats_cache_service
+
+try:
+    import openpyxl  # xlsx
+except Exception:
+    openpyxl = None
+try:
+    import xlrd  # xls
+except Exception:
+    xlrd = None
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".xlsx", ".xls", ".csv")
+
+# 兼容中文优先级
+PRIORITY_MAP = {
+    '低': 'low', 'low': 'low',
+    '中': 'medium', '中等': 'medium', 'medium': 'medium',
+    '高': 'high', 'high': 'high',
+    '紧急': 'urgent', 'urgent': 'urgent'
+}
+
+# 任务状态中最多保留的错误条数（避免超大文件把错误列表撑爆）
+MAX_REPORTED_ERRORS = 200
+
+# 上传落盘时每次读取的字节数
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 导入任务状态保留时间（秒）
+JOB_TTL = 24 * 3600
+
+
+def _pick(row: dict, names) -> Optional[str]:
+    """按候选列名取值（先精确匹配，再忽略大小写）"""
+    for n in names:
+        if n in row and str(row[n]).strip() != '':
+            return str(row[n]).strip()
+    lower = {k.lower(): v for k, v in row.items()}
+    for n in names:
+        if n.lower() in lower and str(lower[n.lower()]).strip() != '':
+            return str(lower[n.lower()]).strip()
+    return None
+
+
+def _detect_csv_encoding(path: str) -> str:
+    """用文件开头的样本探测编码（Windows下Excel常用GBK）"""
+    with open(path, "rb") as f:
+        sample = f.read(UPLOAD_CHUNK_SIZE)
+    for encoding in ("utf-8-sig", "gbk"):
+        try:
+            # 增量解码器允许样本末尾截断半个字符
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return "latin1"
+
+
+def iter_import_rows(path: str, filename: str) -> Iterator[dict]:
+    """逐行读取导入文件，返回 {列名: 字符串值}，不把整张表读入内存"""
+    if filename.endswith(".csv"):
+        encoding = _detect_csv_encoding(path)
+        with open(path, "r", encoding=encoding, newline="") as f:
+            for row in csv.DictReader(f):
+                yield {(k or '').strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items()}
+    elif filename.endswith(".xlsx") and openpyxl:
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            headers = [str(v).strip() if v is not None else '' for v in header]
+            for r in rows:
+                yield {
+                    headers[i]: (str(r[i]).strip() if i < len(r) and r[i] is not None else '')
+                    for i in range(len(headers))
+                }
+        finally:
+            wb.close()
+    elif filename.endswith(".xls") and xlrd:
+        # xls 格式最多 65536 行，xlrd 按需加载工作表
+        book = xlrd.open_workbook(path, on_demand=True)
+        try:
+            sheet = book.sheet_by_index(0)
+            headers = [str(sheet.cell_value(0, c)).strip() for c in range(sheet.ncols)]
+            for r in range(1, sheet.nrows):
+                yield {headers[c]: str(sheet.cell_value(r, c)).strip() for c in range(sheet.ncols)}
+        finally:
+            book.release_resources()
+    else:
+        raise RuntimeError("服务器缺少Excel解析依赖，请安装openpyxl/xlrd")
+
+
+class TaskImportService:
+    """任务批量导入服务"""
+
+    def __init__(self):
+        self.batch_size = settings.TASK_IMPORT_BATCH_SIZE
+        # Redis 不可用时的进程内任务状态
+        self._local_jobs: Dict[str, dict] = {}
+        self._local_lock = threading.Lock()
+
+    # ==================== 任务状态 ====================
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"tasks:import:job:{job_id}"
+
+    def create_job(self, user_id: str, filename: str, project_id: Optional[str]) -> str:
+        """创建导入任务，返回 job_id"""
+        job_id = str(uuid.uuid4())
+        self._save_job(job_id, {
+            "job_id": job_id,
+            "status": "pending",
+            "filename": filename,
+            "project_id": project_id or "",
+            "created_by": user_id,
+            "processed": 0,
+            "created": 0,
+            "failed": 0,
+            "errors": [],
+            "message": "等待导入",
+            "created_at": time.time(),
+            "finished_at": None
+        })
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """读取导入任务状态"""
+        if cache_service.enabled:
+            data = cache_service.redis_client.get(self._job_key(job_id))
+            return loads_json(data) if data else None
+        with self._local_lock:
+            job = self._local_jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _save_job(self, job_id: str, job: dict):
+        if cache_service.enabled:
+            # 直接写 Redis，不进入 L1，保证各 worker 读到的进度一致
+            cache_service.redis_client.setex(
+                self._job_key(job_id), JOB_TTL, dumps_json(job)
+            )
+        else:
+            with self._local_lock:
+                self._local_jobs[job_id] = job
+
+    # ==================== 上传 ====================
+
+    async def save_upload(self, file) -> str:
+        """把上传文件分块写入临时文件，返回路径"""
+        suffix = os.path.splitext(file.filename or "")[1].lower()
+        fd, path = tempfile.mkstemp(prefix="task_import_", suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+    # ==================== 导入执行 ====================
+
+    def run_job(self, job_id: str, path: str, filename: str, project_id: Optional[str], user_id: str, user_name: Optional[str]):
+        """
+        执行导入（在后台线程中运行）
+
+        每批 batch_size 行：一次查询解析本批新出现的项目/用户ID，
+        bulk_insert_mappings 写入任务，同一事务内累加项目任务计数后提交
+        """
+        job = self.get_job(job_id) or {"job_id": job_id, "errors": []}
+        job.update({"status": "running", "message": "正在导入"})
+        self._save_job(job_id, job)
+
+        db = SessionLocal()
+        # 已解析的项目/用户：{id: 是否存在} / {id: 显示名或None}
+        known_projects: Dict[str, bool] = {}
+        known_users: Dict[str, Optional[str]] = {}
+        touched_projects = set()
+        processed = created = failed = 0
+        errors: List[str] = []
+
+        def add_error(message: str):
+            nonlocal failed
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(message)
+
+        try:
+            batch: List[Tuple[int, dict]] = []
+            for idx, row in enumerate(iter_import_rows(path, filename.lower()), start=2):
+                processed += 1
+                batch.append((idx, row))
+                if len(batch) >= self.batch_size:
+                    created += self._import_batch(
+                        db, batch, project_id, user_id, user_name,
+                        known_projects, known_users, touched_projects, add_error
+                    )
+                    batch = []
+                    job.update({"processed": processed, "created": created, "failed": failed, "errors": errors})
+                    self._save_job(job_id, job)
+            if batch:
+                created += self._import_batch(
+                    db, batch, project_id, user_id, user_name,
+                    known_projects, known_users, touched_projects, add_error
+                )
+
+            job.update({
+                "status": "completed",
+                "message": f"成功导入{created}条，失败{failed}条"
+            })
+            logger.info(f"✅ [TaskImport] 导入完成: job={job_id}, 行数={processed}, 成功={created}, 失败={failed}")
+        except Exception as e:
+            db.rollback()
+            logger.exception(f"❌ [TaskImport] 导入任务异常: job={job_id}")
+            job.update({
+                "status": "failed",
+                "message": f"导入中断: {e}（已成功导入{created}条）"
+            })
+        finally:
+            db.close()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            job.update({
+                "processed": processed,
+                "created": created,
+                "failed": failed,
+                "errors": errors,
+                "finished_at": time.time()
+            })
+            self._save_job(job_id, job)
+            if created:
+                self._invalidate_caches(touched_projects)
+
+    def _import_batch(
+        self,
+        db,
+        batch: List[Tuple[int, dict]],
+        default_project_id: Optional[str],
+        user_id: str,
+        user_name: Optional[str],
+        known_projects: Dict[str, bool],
+        known_users: Dict[str, Optional[str]],
+        touched_projects: set,
+        add_error
+    ) -> int:
+        """解析并写入一批行，返回成功写入数"""
+        parsed = []
+        for idx, row in batch:
+            title = _pick(row, ["title", "任务标题", "名称"]) or ''
+            if not title:
+                add_error(f"第{idx}行缺少任务标题")
+                continue
+            project_id_value = default_project_id or _pick(row, ["project_id", "项目ID"]) or None
+            if not project_id_value:
+                add_error(f"第{idx}行缺少项目ID（请在弹窗选择项目或在文件中提供project_id）")
+                continue
+            parsed.append((idx, row, title, project_id_value, _pick(row, ["assigned_to", "标注员ID"]) or None))
+
+        # 本批新出现的项目/用户一次查询解析，结果在整个导入期间复用
+        new_projects = {p for _, _, _, p, _ in parsed if p not in known_projects}
+        if new_projects:
+            found = {pid for (pid,) in db.query(Project.id).filter(Project.id.in_(new_projects)).all()}
+            known_projects.update({pid: pid in found for pid in new_projects})
+        new_users = {u for _, _, _, _, u in parsed if u and u not in known_users}
+        if new_users:
+            names = {
+                uid: real_name or username
+                for uid, real_name, username in db.query(User.id, User.real_name, User.username).filter(User.id.in_(new_users)).all()
+            }
+            known_users.update({uid: names.get(uid) for uid in new_users})
+
+        mappings = []
+        deltas = defaultdict(lambda: [0, 0])
+        for idx, row, title, project_id_value, assigned_to in parsed:
+            if not known_projects.get(project_id_value):
+                add_error(f"第{idx}行项目不存在: {project_id_value}")
+                continue
+
+            priority = _pick(row, ["priority", "优先级"]) or 'medium'
+            priority = PRIORITY_MAP.get(priority, priority)
+            est_hours_raw = _pick(row, ["estimated_hours", "预计工时"]) or '0'
+            try:
+                estimated_hours = float(est_hours_raw)
+            except Exception:
+                estimated_hours = 0.0
+            # 标注员ID不存在时忽略，与逐行导入时的行为一致
+            assignee_name = known_users.get(assigned_to) if assigned_to else None
+            assignee_id = assigned_to if assignee_name else None
+
+            mappings.append({
+                "id": str(uuid.uuid4()),
+                "title": title,
+                "description": _pick(row, ["description", "任务描述"]) or '',
+                "project_id": project_id_value,
+                "priority": priority if priority in ["low", "medium", "high", "urgent"] else "medium",
+                "status": "pending",
+                "created_by": user_id,
+                "created_by_name": user_name,
+                "image_url": _pick(row, ["image_url", "影像URL", "影像链接", "图片链接"]) or None,
+                "annotation_data": {"estimated_hours": estimated_hours},
+                "assigned_to": assignee_id,
+                "assigned_to_name": assignee_name,
+                "timeline": []
+            })
+            deltas[(project_id_value, "pending")][0] += 1
+            deltas[(project_id_value, "pending")][1] += 1 if assignee_id else 0
+
+        if not mappings:
+            return 0
+
+        db.bulk_insert_mappings(Task, mappings)
+        # ✅ 与本批任务在同一事务内累加项目任务计数
+        project_counter_service.apply_deltas(db, {key: tuple(value) for key, value in deltas.items()})
+        db.commit()
+        touched_projects.update(pid for pid, _ in deltas)
+        return len(mappings)
+
+    @staticmethod
+    def _invalidate_caches(project_ids: set):
+        """导入完成后清除缓存"""
+        # 递增任务列表全局代数（单次INCR，所有任务列表缓存随之失效）
+        cache_service.invalidate_tasks_cache()
+        for project_id in project_ids:
+            cache_service.invalidate_project_detail_cache(project_id)
+            stats_cache_service.invalidate_project_stats(project_id)
+        stats_cache_service.invalidate_dashboard_stats()
+        logger.info(f"✅ [TaskImport] 批量导入后缓存已清除: projects={sorted(project_ids)}")
+
+
+# 全局实例
+task_import_service = TaskImportService()
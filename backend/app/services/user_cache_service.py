@@ -54,7 +54,7 @@ class UserCacheService:
         }
         
         # 写入缓存（30分钟）
-        cache_service.set(cache_key, user_info, expire=1800)
+        cache_service.set(cache_key, user_info, expire=1800, tags=["users"])
         logger.debug(f"💾 用户信息写入缓存: {user_id}")
         
         return user_info
@@ -93,7 +93,7 @@ class UserCacheService:
         ]
         
         # 写入缓存（30分钟）
-        cache_service.set(cache_key, user_list, expire=1800)
+        cache_service.set(cache_key, user_list, expire=1800, tags=["users", "users:list"])
         logger.debug(f"💾 活跃用户列表写入缓存: {len(user_list)} 个用户")
         
         return user_list
@@ -135,7 +135,7 @@ class UserCacheService:
         ]
         
         # 写入缓存（30分钟）
-        cache_service.set(cache_key, user_list, expire=1800)
+        cache_service.set(cache_key, user_list, expire=1800, tags=["users", "users:list"])
         logger.debug(f"💾 角色用户列表写入缓存: {role} ({len(user_list)} 个用户)")
         
         return user_list
@@ -177,7 +177,7 @@ class UserCacheService:
         ]
         
         # 写入缓存（30分钟）
-        cache_service.set(cache_key, user_list, expire=1800)
+        cache_service.set(cache_key, user_list, expire=1800, tags=["users", "users:list"])
         logger.debug(f"💾 部门用户列表写入缓存: {department} ({len(user_list)} 个用户)")
         
         return user_list
@@ -194,7 +194,7 @@ class UserCacheService:
         cache_service.invalidate_user_detail_cache(user_id)
         
         # 清除列表缓存（用户信息变更可能影响列表）
-        cache_service.delete_pattern("users:list:*")
+        cache_service.invalidate_tags("users:list")
         
         logger.info(f"🗑️ 用户缓存已清除: {user_id}")
     
@@ -0,0 +1,111 @@
+"""
+工作日志统计服务
+按 (用户, 工作类型, 状态) 在数据库中 GROUP BY 汇总条目数、计划/实际工时与完成率，
+工作周统计接口与周/月/季/年度 PDF 报告共用，只有聚合结果（行数 ≈ 用户数 × 类型数 × 状态数）离开数据库
+"""
+
+from typing import Dict, List, Optional
+import logging
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.work_log import WorkLogEntry
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 计为"已提交"的条目状态
+SUBMITTED_STATUSES = ("submitted", "approved")
+
+
+def label_work_types(hours_by_type: Dict[Optional[str], int], default_label: str) -> Dict[str, int]:
+    """未填写工作类型（NULL/空串）的工时合并到 default_label 下"""
+    labeled: Dict[str, int] = {}
+    for work_type, hours in hours_by_type.items():
+        key = work_type or default_label
+        labeled[key] = labeled.get(key, 0) + hours
+    return labeled
+
+
+class WorkLogStatsService:
+    """工作日志统计服务"""
+
+    def aggregate(self, db: Session, week_ids: List[str]) -> dict:
+        """
+        汇总若干工作周内的全部条目
+
+        返回:
+            users: 按用户汇总的列表（user_id, real_name, username, total_entries, total_planned_hours,
+                   total_actual_hours, completion_rate_sum, status_count, work_type_hours）
+            status_count / work_type_hours / total_entries / total_planned_hours / total_actual_hours: 整体汇总
+        work_type_hours 的键为原始工作类型（可能为 None），只包含实际工时大于 0 的类型
+        """
+        result = {
+            "users": [],
+            "status_count": {},
+            "work_type_hours": {},
+            "total_entries": 0,
+            "total_planned_hours": 0,
+            "total_actual_hours": 0,
+        }
+        if not week_ids:
+            return result
+
+        rows = db.query(
+            WorkLogEntry.user_id,
+            User.real_name,
+            User.username,
+            WorkLogEntry.work_type,
+            WorkLogEntry.status,
+            func.count().label("entries"),
+            func.coalesce(func.sum(WorkLogEntry.planned_hours), 0).label("planned_hours"),
+            func.coalesce(func.sum(WorkLogEntry.actual_hours), 0).label("actual_hours"),
+            func.coalesce(func.sum(WorkLogEntry.completion_rate), 0).label("completion_rate_sum"),
+        ).outerjoin(
+            User, User.id == WorkLogEntry.user_id
+        ).filter(
+            WorkLogEntry.work_week_id.in_(week_ids)
+        ).group_by(
+            WorkLogEntry.user_id, User.real_name, User.username, WorkLogEntry.work_type, WorkLogEntry.status
+        ).order_by(WorkLogEntry.user_id).all()
+
+        users: Dict[str, dict] = {}
+        for row in rows:
+            user = users.get(row.user_id)
+            if user is None:
+                user = users[row.user_id] = {
+                    "user_id": row.user_id,
+                    "real_name": row.real_name,
+                    "username": row.username,
+                    "total_entries": 0,
+                    "total_planned_hours": 0,
+                    "total_actual_hours": 0,
+                    "completion_rate_sum": 0,
+                    "status_count": {},
+                    "work_type_hours": {},
+                }
+            user["total_entries"] += row.entries
+            user["total_planned_hours"] += row.planned_hours
+            user["total_actual_hours"] += row.actual_hours
+            user["completion_rate_sum"] += row.completion_rate_sum
+            user["status_count"][row.status] = user["status_count"].get(row.status, 0) + row.entries
+            if row.actual_hours:
+                user["work_type_hours"][row.work_type] = user["work_type_hours"].get(row.work_type, 0) + row.actual_hours
+                result["work_type_hours"][row.work_type] = result["work_type_hours"].get(row.work_type, 0) + row.actual_hours
+
+            result["status_count"][row.status] = result["status_count"].get(row.status, 0) + row.entries
+            result["total_entries"] += row.entries
+            result["total_planned_hours"] += row.planned_hours
+            result["total_actual_hours"] += row.actual_hours
+
+        result["users"] = list(users.values())
+        logger.debug(
+            f"📊 [WorkLogStats] 聚合 {len(week_ids)} 个工作周: {len(rows)} 组, "
+            f"{len(users)} 个用户, {result['total_entries']} 条"
+        )
+        return result
+
+
+# 全局实例
+work_log_stats_service = WorkLogStatsService()
@@ -0,0 +1,75 @@
+"""
+缓存响应工具模块
+命中缓存时直接把 Redis 中的 JSON 字节作为响应体返回，并支持 ETag / 304 协商
+"""
+import hashlib
+from typing import Any, Callable, List, Optional
+
+from fastapi import Request, Response
+
+from app.services.cache_service import cache_service
+
+
+def make_etag(body: bytes) -> str:
+    """
+    根据响应体生成强 ETag
+    
+    Args:
+        body: 响应体字节
+        
+    Returns:
+        str: 形如 "\"9f86d081884c7d65...\"" 的 ETag
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    判断请求头 If-None-Match 是否与 ETag 匹配（弱比较）
+    
+    Args:
+        request: 当前请求
+        etag: 当前响应的 ETag
+        
+    Returns:
+        bool: 匹配则可返回 304
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return etag in candidates
+
+
+def cached_json_response(
+    request: Request,
+    cache_key: str,
+    compute: Callable[[], Any],
+    expire: Optional[int] = None,
+    tags: Optional[List[str]] = None
+) -> Response:
+    """
+    返回带缓存的 JSON 响应
+    
+    缓存命中时响应体直接取自 Redis，不做反序列化和再序列化；
+    未命中时由 compute 计算（带防击穿保护）并回填缓存。
+    客户端携带匹配的 If-None-Match 时返回 304。
+    
+    Args:
+        request: 当前请求
+        cache_key: 缓存键
+        compute: 未命中时的计算函数，返回可 JSON 序列化的对象
+        expire: 缓存过期时间（秒）
+        tags: 失效标签列表
+        
+    Returns:
+        Response: 200（JSON 字节）或 304
+    """
+    body = cache_service.get_or_set_raw(cache_key, compute, expire=expire, tags=tags)
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,197 @@
+"""
+角色权限注册表
+进程内一次性加载 roles 表：菜单权限名驻留为整数位号，每个角色的权限编译为位掩码，
+权限检查只需一次按位与；角色变更时本进程立即重载，并通过 Redis Pub/Sub 通知其他 worker
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, FrozenSet, Iterable, Optional, Union
+
+import redis
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.role import Role
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# 重载广播频道
+ROLE_RELOAD_CHANNEL = "auth:roles:reload"
+
+PermissionNames = Union[str, Iterable[str]]
+
+
+def _parse_permissions(raw) -> FrozenSet[str]:
+    """解析 roles.permissions（JSON 字符串或列表）"""
+    if not raw:
+        return frozenset()
+    try:
+        data = json.loads(raw) if isinstance(raw, str) else raw
+        if isinstance(data, list):
+            return frozenset(str(x) for x in data)
+    except Exception:
+        pass
+    return frozenset()
+
+
+class PermissionRegistry:
+    """角色权限注册表"""
+
+    def __init__(self, max_age: int):
+        # 兜底重载间隔（秒），防止丢失广播后长期使用旧数据
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # 权限名 -> 位号（只增不减，位号在进程生命周期内稳定）
+        self._bits: Dict[str, int] = {}
+        # 编译后的权限要求缓存：权限名元组 -> 掩码
+        self._compiled: Dict[tuple, int] = {}
+        # 角色掩码：按 id / 编码 / 名称 三种方式查找
+        self._by_id: Dict[str, int] = {}
+        self._by_code: Dict[str, int] = {}
+        self._by_name: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale = True
+        self._instance_id = uuid.uuid4().hex
+        self._listener_started = False
+
+    # ==================== 编译 ====================
+
+    def _bit(self, name: str) -> int:
+        """权限名驻留为位号（调用方持有锁）"""
+        bit = self._bits.get(name)
+        if bit is None:
+            bit = len(self._bits)
+            self._bits[name] = bit
+        return bit
+
+    def compile(self, permission_name: PermissionNames) -> int:
+        """把一个或多个权限名编译为掩码（多个权限名为“任一满足”）"""
+        names = (permission_name,) if isinstance(permission_name, str) else tuple(permission_name)
+        mask = self._compiled.get(names)
+        if mask is not None:
+            return mask
+        with self._lock:
+            mask = 0
+            for name in names:
+                mask |= 1 << self._bit(str(name))
+            self._compiled[names] = mask
+        return mask
+
+    # ==================== 加载 ====================
+
+    def load(self, db: Session):
+        """从数据库加载全部角色并编译掩码（整体替换，读取方无需加锁）"""
+        rows = db.query(Role.id, Role.role, Role.name, Role.permissions).all()
+        by_id, by_code, by_name = {}, {}, {}
+        with self._lock:
+            for role_id, code, name, raw in rows:
+                mask = 0
+                for permission in _parse_permissions(raw):
+                    mask |= 1 << self._bit(permission)
+                by_id[role_id] = mask
+                if code:
+                    by_code[code] = mask
+                if name:
+                    by_name[name] = mask
+            self._by_id, self._by_code, self._by_name = by_id, by_code, by_name
+            self._loaded_at = time.monotonic()
+            self._stale = False
+        self._ensure_listener()
+        logger.info(f"✅ [PermissionRegistry] 角色权限已加载: {len(rows)} 个角色, {len(self._bits)} 个权限位")
+
+    def _ensure_loaded(self, db: Session):
+        if self._stale or self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.load(db)
+
+    def reload(self, db: Session, broadcast: bool = True):
+        """角色变更后调用：本进程立即重载，并通知其他 worker"""
+        self.load(db)
+        if broadcast:
+            self._publish()
+
+    def mark_stale(self):
+        """下次检查时重载"""
+        self._stale = True
+
+    # ==================== 检查 ====================
+
+    def role_mask(self, db: Session, role_code: Optional[str] = None, role_id: Optional[str] = None) -> int:
+        """查找角色掩码：先按角色ID，再按角色编码，最后按角色名称"""
+        self._ensure_loaded(db)
+        if role_id and role_id in self._by_id:
+            return self._by_id[role_id]
+        if role_code:
+            mask = self._by_code.get(role_code)
+            if mask is None:
+                mask = self._by_name.get(role_code, 0)
+            return mask
+        return 0
+
+    def has_permission(self, db: Session, required_mask: int, role_code: Optional[str] = None, role_id: Optional[str] = None) -> bool:
+        """O(1) 位检查：角色拥有任一所需权限即通过"""
+        return bool(self.role_mask(db, role_code=role_code, role_id=role_id) & required_mask)
+
+    def permission_names(self, mask: int) -> FrozenSet[str]:
+        """把掩码还原为权限名集合"""
+        return frozenset(name for name, bit in self._bits.items() if mask >> bit & 1)
+
+    # ==================== 广播 ====================
+
+    def _publish(self):
+        if not redis_client.is_available():
+            return
+        try:
+            redis_client.get_instance().publish(
+                ROLE_RELOAD_CHANNEL, json.dumps({"origin": self._instance_id})
+            )
+        except Exception as e:
+            redis_client.mark_disconnected()
+            logger.error(f"❌ [PermissionRegistry] 重载广播失败: {e}")
+
+    def _ensure_listener(self):
+        """首次加载后启动订阅线程"""
+        if self._listener_started:
+            return
+        with self._lock:
+            if self._listener_started:
+                return
+            self._listener_started = True
+        threading.Thread(
+            target=self._listen,
+            name="auth-role-reload",
+            daemon=True
+        ).start()
+
+    def _listen(self):
+        """后台线程：收到其他 worker 的重载广播后标记为过期"""
+        while True:
+            try:
+                client = redis.from_url(
+                    settings.REDIS_URL,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    health_check_interval=30
+                )
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(ROLE_RELOAD_CHANNEL)
+                # 订阅建立前可能漏掉消息
+                self.mark_stale()
+                for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") != self._instance_id:
+                        self.mark_stale()
+                        logger.info("🔄 [PermissionRegistry] 收到角色变更广播，下次检查时重载")
+            except Exception as e:
+                logger.warning(f"⚠️ [PermissionRegistry] 重载订阅中断，5秒后重连: {e}")
+                self.mark_stale()
+                time.sleep(5)
+
+
+# 导出单例
+permission_registry = PermissionRegistry(max_age=settings.PERMISSION_REGISTRY_MAX_AGE)
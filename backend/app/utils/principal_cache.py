@@ -0,0 +1,192 @@
+"""
+认证主体缓存
+按 token 哈希缓存已通过校验的用户，保存在进程内并带短 TTL；
+用户变更、token 撤销时通过 Redis Pub/Sub 通知所有 worker 立即丢弃对应条目
+（角色权限由 app.utils.permission_registry 维护）
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+import redis
+
+from app.config import settings
+from app.models.user import User
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# 失效广播频道
+PRINCIPAL_INVALIDATION_CHANNEL = "auth:principal:invalidate"
+
+# 缓存的用户列（不缓存密码哈希）
+_USER_COLUMNS = (
+    "id", "username", "real_name", "email", "role", "avatar_url", "department",
+    "status", "tags", "hire_date", "created_at", "updated_at"
+)
+
+
+class PrincipalCache:
+    """认证主体缓存"""
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # token_hash -> (过期时间, 用户列字典)
+        self._principals: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        # user_id -> {token_hash}，用于按用户失效
+        self._user_tokens: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._instance_id = uuid.uuid4().hex
+        self._listener_started = False
+        self._stats = {"hits": 0, "misses": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    # ==================== 用户 ====================
+
+    def get_user(self, token_hash: str) -> Optional[User]:
+        """
+        读取缓存的用户
+
+        每次返回新的游离 User 对象（不绑定会话），调用方修改它不会影响缓存；
+        需要持久化修改的接口应自行按 current_user.id 重新查询
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._principals.get(token_hash)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._drop_token(token_hash)
+                self._stats["misses"] += 1
+                return None
+            self._principals.move_to_end(token_hash)
+            self._stats["hits"] += 1
+            data = entry[1]
+        return User(**data)
+
+    def put_user(self, token_hash: str, user: User):
+        """缓存通过校验的用户"""
+        if not self.enabled:
+            return
+        self._ensure_listener()
+        data = {column: getattr(user, column, None) for column in _USER_COLUMNS}
+        with self._lock:
+            self._drop_token(token_hash)
+            self._principals[token_hash] = (time.monotonic() + self.ttl, data)
+            self._user_tokens.setdefault(data["id"], set()).add(token_hash)
+            while len(self._principals) > self.max_entries:
+                oldest = next(iter(self._principals))
+                self._drop_token(oldest)
+
+    def _drop_token(self, token_hash: str):
+        """移除一个 token 条目（调用方持有锁）"""
+        entry = self._principals.pop(token_hash, None)
+        if entry is None:
+            return
+        user_id = entry[1].get("id")
+        tokens = self._user_tokens.get(user_id)
+        if tokens is not None:
+            tokens.discard(token_hash)
+            if not tokens:
+                self._user_tokens.pop(user_id, None)
+
+    # ==================== 失效 ====================
+
+    def invalidate_token(self, token_hash: str, broadcast: bool = True):
+        """token 被撤销"""
+        with self._lock:
+            self._drop_token(token_hash)
+        if broadcast:
+            self._publish({"token": token_hash})
+
+    def invalidate_user(self, user_id: str, broadcast: bool = True):
+        """用户信息/状态变更：丢弃该用户所有 token 的缓存"""
+        with self._lock:
+            for token_hash in list(self._user_tokens.get(user_id, ())):
+                self._drop_token(token_hash)
+        if broadcast:
+            self._publish({"user": user_id})
+        logger.debug(f"🗑️ [PrincipalCache] 用户认证缓存已失效: {user_id}")
+
+    def clear(self):
+        """清空本进程缓存"""
+        with self._lock:
+            self._principals.clear()
+            self._user_tokens.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "principals": len(self._principals),
+                **self._stats
+            }
+
+    def _publish(self, payload: dict):
+        if not redis_client.is_available():
+            return
+        try:
+            redis_client.get_instance().publish(
+                PRINCIPAL_INVALIDATION_CHANNEL,
+                json.dumps({"origin": self._instance_id, **payload})
+            )
+        except Exception as e:
+            redis_client.mark_disconnected()
+            logger.error(f"❌ [PrincipalCache] 失效广播失败: {e}")
+
+    def _ensure_listener(self):
+        """首次写入时启动订阅线程"""
+        if self._listener_started:
+            return
+        with self._lock:
+            if self._listener_started:
+                return
+            self._listener_started = True
+        threading.Thread(
+            target=self._listen,
+            name="auth-principal-invalidation",
+            daemon=True
+        ).start()
+
+    def _listen(self):
+        """后台线程：订阅失效频道并丢弃对应条目"""
+        while True:
+            try:
+                client = redis.from_url(
+                    settings.REDIS_URL,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    health_check_interval=30
+                )
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(PRINCIPAL_INVALIDATION_CHANNEL)
+                # 订阅建立前可能漏掉消息，清空本地缓存
+                self.clear()
+                for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    if payload.get("origin") == self._instance_id:
+                        continue
+                    if payload.get("token"):
+                        self.invalidate_token(payload["token"], broadcast=False)
+                    if payload.get("user"):
+                        self.invalidate_user(payload["user"], broadcast=False)
+            except Exception as e:
+                logger.warning(f"⚠️ [PrincipalCache] 失效订阅中断，5秒后重连: {e}")
+                self.clear()
+                time.sleep(5)
+
+
+# 导出单例
+principal_cache = PrincipalCache(
+    ttl=settings.AUTH_PRINCIPAL_CACHE_TTL,
+    max_entries=settings.AUTH_PRINCIPAL_CACHE_MAX_ENTRIES
+)
@@ -5,6 +5,7 @@ Redis 客户端工具类
 import redis
 import json
 import logging
+import time
 from typing import Optional, Any
 from app.config import settings
 
@@ -15,6 +16,9 @@ class RedisClient:
     
     _instance: Optional[redis.Redis] = None
     _connected: bool = False
+    # 断线后重连的最小间隔（秒），避免每个请求都等待连接超时
+    RECONNECT_INTERVAL = 5
+    _last_attempt: float = 0.0
     
     @classmethod
     def get_instance(cls) -> Optional[redis.Redis]:
@@ -72,6 +76,39 @@ class RedisClient:
             cls._connected = False
             return False
     
+    @classmethod
+    def is_available(cls) -> bool:
+        """
+        检查 Redis 是否可用（不发送 PING，用于请求热路径）
+        
+        连接状态由实际命令的成败维护（失败时调用 mark_disconnected），
+        断线后每 RECONNECT_INTERVAL 秒最多尝试一次重连
+        """
+        if cls._connected and cls._instance is not None:
+            return True
+        now = time.monotonic()
+        if now - cls._last_attempt < cls.RECONNECT_INTERVAL:
+            return False
+        cls._last_attempt = now
+        if cls._instance is None:
+            cls.get_instance()
+            return cls._connected and cls._instance is not None
+        try:
+            cls._instance.ping()
+            cls._connected = True
+            logger.info("✅ [Redis] Redis 连接已恢复")
+        except Exception:
+            cls._connected = False
+        return cls._connected
+    
+    @classmethod
+    def mark_disconnected(cls):
+        """命令执行失败时标记连接断开，后续请求走降级路径直到重连成功"""
+        if cls._connected:
+            logger.warning("⚠️ [Redis] Redis 命令失败，标记为断开")
+        cls._connected = False
+        cls._last_attempt = time.monotonic()
+    
     @classmethod
     def set(cls, key: str, value: Any, expire: Optional[int] = None) -> bool:
         """
@@ -8,6 +8,7 @@ from app.config import settings
 from app.models.user import User
 from app.database import get_db
 from app.utils.token_manager import token_manager
+from app.utils.principal_cache import principal_cache
 from sqlalchemy.orm import Session
 
 # 密码加密上下文
@@ -51,13 +52,15 @@ def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> User:
-    """获取当前用户（支持 Redis Token 白名单和自动续期）"""
+    """
+    获取当前用户（支持 Redis Token 白名单和自动续期）
+    
+    快速路径：JWT 校验通过且 token 命中进程内主体缓存时直接返回，不访问 Redis 和数据库；
+    缓存未命中时用一次 Lua 调用完成白名单校验与续期，再查询用户并写入缓存
+    """
     import logging
     logger = logging.getLogger(__name__)
     
-    logger.info(f"🔐 [Security] 开始获取当前用户")
-    logger.info(f"📜 [Security] Credentials类型: {type(credentials)}")
-    
     if not credentials or not credentials.credentials:
         logger.error("❌ [Security] 没有提供认证凭据")
         raise HTTPException(
@@ -67,11 +70,9 @@ def get_current_user(
         )
     
     token = credentials.credentials
-    logger.info(f"🔑 [Security] 接收到的Token: {token[:20]}...")
     
-    # 第一步：验证 JWT 签名
+    # 第一步：验证 JWT 签名（纯计算，无网络往返）
     user_id = verify_token(token)
-    logger.info(f"🆔 [Security] Token解析结果 - user_id: {user_id}")
     
     if user_id is None:
         logger.warning("❌ [Security] JWT Token验证失败")
@@ -81,30 +82,35 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # 第二步：检查 Redis 白名单（如果 Redis 可用）
+    # 第二步：主体缓存（token 撤销、用户变更时经 Pub/Sub 失效）
+    token_hash = token_manager._get_token_hash(token)
+    cached_user = principal_cache.get_user(token_hash)
+    if cached_user is not None and cached_user.id == user_id:
+        logger.debug(f"🎯 [Security] 认证主体缓存命中: {cached_user.username}")
+        return cached_user
+    
+    logger.info(f"🔐 [Security] 认证主体缓存未命中，校验Token: {token[:20]}...")
+    
+    # 第三步：检查 Redis 白名单并自动续期（滑动窗口），单次往返
     from app.utils.redis_client import redis_client
     
-    # 先检查 Redis 是否连接
-    redis_connected = redis_client.is_connected()
-    
-    if redis_connected:
-        # Redis 可用，检查白名单
-        token_data = token_manager.verify_token(token)
-        if token_data is None:
-            # Token 不在白名单中（已被撤销或过期）
-            logger.error("❌ [Security] Token 不在 Redis 白名单中，可能已被撤销或过期")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token 已失效，请重新登录",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
-        logger.info(f"✅ [Security] Token 白名单验证通过 - User: {token_data.get('username')}")
-        
-        # 第三步：自动续期 Token（滑动窗口）
-        renewed = token_manager.renew_token(token)
-        if renewed:
-            logger.info(f"🔄 [Security] Token 已自动续期")
+    if redis_client.is_available():
+        try:
+            token_data = token_manager.validate_and_renew(token)
+        except Exception as e:
+            # Redis 命令失败，降级为纯 JWT 模式
+            redis_client.mark_disconnected()
+            logger.warning(f"⚠️ [Security] Redis 白名单校验失败，降级为纯 JWT 模式: {e}")
+        else:
+            if token_data is None:
+                # Token 不在白名单中（已被撤销或过期）
+                logger.error("❌ [Security] Token 不在 Redis 白名单中，可能已被撤销或过期")
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token 已失效，请重新登录",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            logger.info(f"✅ [Security] Token 白名单验证通过 - User: {token_data.get('username')}")
     else:
         # Redis 不可用，降级为纯 JWT 模式
         logger.warning("⚠️ [Security] Redis 未连接，降级为纯 JWT 模式（仅验证 JWT 签名）")
@@ -129,6 +135,7 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    principal_cache.put_user(token_hash, user)
     logger.info(f"✅ [Security] 用户验证成功: {user.username}, 角色: {user.role}, ID: {user.id}")
     return user
 
@@ -3,14 +3,41 @@ Token 管理服务
 使用 Redis 作为 Token 白名单，实现 Token 的存储、验证、续期和撤销
 """
 import hashlib
+import json
 import logging
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from app.utils.redis_client import redis_client
+from app.utils.principal_cache import principal_cache
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 校验并续期 token：一次往返完成 GET + TTL +（必要时）SET/EXPIRE
+# KEYS[1]: token key
+# ARGV: 续期阈值(秒), 续期后有效期(秒), 当前时间(ISO), 用户 token 映射 key 前缀
+# 返回 token 数据（JSON 字符串），不在白名单中返回 nil
+_VALIDATE_AND_RENEW_LUA = """
+local data = redis.call('GET', KEYS[1])
+if not data then
+    return false
+end
+local ttl = redis.call('TTL', KEYS[1])
+if ttl > 0 and ttl < tonumber(ARGV[1]) then
+    local ok, token = pcall(cjson.decode, data)
+    if ok and type(token) == 'table' then
+        token['last_active'] = ARGV[3]
+        data = cjson.encode(token)
+        if token['user_id'] then
+            redis.call('EXPIRE', ARGV[4] .. token['user_id'], ARGV[2])
+        end
+    end
+    redis.call('SET', KEYS[1], data, 'EX', ARGV[2])
+end
+return data
+"""
+
+
 class TokenManager:
     """Token 管理器"""
     
@@ -131,6 +158,35 @@ class TokenManager:
             logger.error(f"❌ [TokenManager] Token 验证异常: {str(e)}")
             return None
     
+    _validate_and_renew_script = None
+    
+    @classmethod
+    def validate_and_renew(cls, token: str) -> Optional[Dict[str, Any]]:
+        """
+        校验 token 是否在白名单中，并在剩余时间低于阈值时续期（单次 Lua 调用）
+        
+        Redis 命令失败时抛出异常，由调用方决定是否降级为纯 JWT 模式
+        :param token: JWT token
+        :return: Token 数据（如果有效）或 None
+        """
+        client = redis_client.get_instance()
+        if client is None:
+            raise ConnectionError("Redis 未连接")
+        if cls._validate_and_renew_script is None:
+            cls._validate_and_renew_script = client.register_script(_VALIDATE_AND_RENEW_LUA)
+        data = cls._validate_and_renew_script(
+            keys=[cls._get_token_key(token)],
+            args=[
+                cls.TOKEN_RENEW_THRESHOLD,
+                cls.TOKEN_EXPIRE_SECONDS,
+                datetime.utcnow().isoformat(),
+                cls.USER_TOKEN_PREFIX
+            ]
+        )
+        if data is None:
+            return None
+        return json.loads(data)
+    
     @classmethod
     def renew_token(cls, token: str) -> bool:
         """
@@ -193,6 +249,7 @@ class TokenManager:
             
             # 删除 token
             success = redis_client.delete(token_key)
+            principal_cache.invalidate_token(cls._get_token_hash(token))
             
             if success and token_data:
                 # 删除用户 -> token 的映射
@@ -230,6 +287,7 @@ class TokenManager:
                 
                 # 删除用户映射
                 redis_client.delete(user_token_key)
+                principal_cache.invalidate_user(user_id)
                 
                 logger.info(f"✅ [TokenManager] 用户所有 Token 已撤销 - UserID: {user_id}")
                 return True
@@ -0,0 +1,6 @@
+-- 工作日志条目 (work_week_id, user_id, work_date) 普通索引
+-- 批量生成工作周条目使用 INSERT ... SELECT ... WHERE NOT EXISTS，按该索引判断当天是否已有条目；
+-- 同一人同一天允许多个工作项，因此不是唯一索引
+
+CREATE INDEX IF NOT EXISTS idx_work_log_entries_week_user_date
+    ON work_log_entries (work_week_id, user_id, work_date);
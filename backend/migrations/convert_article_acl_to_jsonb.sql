@@ -0,0 +1,23 @@
+-- 文章访问控制字段改为 JSONB 并建立 GIN 索引
+-- 文章列表的权限过滤在数据库中完成（editable_user_ids/editable_roles/departments 使用 ? 运算符）
+
+-- 1. 字段类型 JSON -> JSONB
+ALTER TABLE articles ALTER COLUMN editable_user_ids TYPE JSONB USING editable_user_ids::jsonb;
+ALTER TABLE articles ALTER COLUMN editable_roles TYPE JSONB USING editable_roles::jsonb;
+ALTER TABLE articles ALTER COLUMN departments TYPE JSONB USING departments::jsonb;
+
+-- 2. 角色编码统一为小写（权限匹配不区分大小写，? 运算符区分大小写）
+UPDATE articles
+SET editable_roles = (
+    SELECT COALESCE(jsonb_agg(DISTINCT lower(r)), '[]'::jsonb)
+    FROM jsonb_array_elements_text(editable_roles) AS r
+)
+WHERE jsonb_typeof(editable_roles) = 'array';
+
+-- 3. GIN 索引（默认 jsonb_ops，支持 ? / ?| / @>）
+CREATE INDEX IF NOT EXISTS idx_articles_editable_user_ids ON articles USING GIN (editable_user_ids);
+CREATE INDEX IF NOT EXISTS idx_articles_editable_roles ON articles USING GIN (editable_roles);
+CREATE INDEX IF NOT EXISTS idx_articles_departments ON articles USING GIN (departments);
+
+-- 4. 列表排序
+CREATE INDEX IF NOT EXISTS idx_articles_updated_at ON articles (updated_at DESC);
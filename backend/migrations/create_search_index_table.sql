@@ -0,0 +1,17 @@
+-- 全文搜索索引表：文章与协作文档的纯文本与 tsvector
+-- tsvector 由应用按中文二元组 + 英文词切分后直接写入（不依赖数据库分词配置）
+-- 建表后运行 scripts/migrate_add_search_index.py 为现有数据建立索引
+
+CREATE TABLE IF NOT EXISTS search_index (
+    entity_type VARCHAR(20) NOT NULL,
+    entity_id VARCHAR(50) NOT NULL,
+    title VARCHAR(200),
+    body TEXT,
+    tsv TSVECTOR,
+    updated_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (entity_type, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_index_tsv ON search_index USING GIN (tsv);
+
+COMMENT ON TABLE search_index IS '全文搜索索引（文章 article / 协作文档 document）';
@@ -0,0 +1,124 @@
+"""
+认证开销基准测试
+对比每个请求在业务逻辑之前的认证耗时：
+  - 旧路径：PING + GET/EXISTS/TTL token + 查询用户 + 查询角色并解析权限
+  - 新路径（冷）：主体缓存未命中，一次 Lua 校验续期 + 查询用户 + 注册表位检查
+  - 新路径（热）：主体缓存命中，不访问 Redis 与数据库
+
+用法:
+    python scripts/benchmark_auth_overhead.py --username admin --rounds 2000 --permission TaskPool
+
+注意: 脚本会为指定用户签发并写入一个测试 token，结束时撤销
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.security import HTTPAuthorizationCredentials
+from app.database import SessionLocal
+from app.models.role import Role
+from app.models.user import User
+from app.utils.security import create_access_token, get_current_user
+from app.utils.permissions import check_permission
+from app.utils.principal_cache import principal_cache
+from app.utils.redis_client import redis_client
+from app.utils.token_manager import token_manager
+
+
+def legacy_role_permissions(db, role_code: str) -> set:
+    """改造前的权限读取：按角色编码（其次按名称）查询角色并解析权限 JSON"""
+    role = db.query(Role).filter(Role.role == role_code).first()
+    role = role or db.query(Role).filter(Role.name == role_code).first()
+    if role is None or not role.permissions:
+        return set()
+    data = json.loads(role.permissions) if isinstance(role.permissions, str) else role.permissions
+    return set(str(x) for x in data) if isinstance(data, list) else set()
+
+
+def legacy_auth(db, token: str, user_id: str, permission: str):
+    """改造前的认证流程（逐条命令 + 每次查库）"""
+    redis_client.is_connected()
+    token_manager.verify_token(token)
+    token_manager.renew_token(token)
+    user = db.query(User).filter(User.id == user_id).first()
+    permissions = legacy_role_permissions(db, user.role)
+    return permission in permissions
+
+
+def fast_auth(db, credentials, permission: str):
+    """当前认证流程"""
+    user = get_current_user(credentials=credentials, db=db)
+    return check_permission(db, user, permission)
+
+
+def measure(func, rounds: int, before_each=None):
+    samples = []
+    for _ in range(rounds):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    samples.sort()
+    return {
+        "avg": statistics.mean(samples),
+        "p50": samples[len(samples) // 2],
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="认证开销基准测试")
+    parser.add_argument("--username", required=True, help="用于测试的在职用户名")
+    parser.add_argument("--permission", default="TaskPool", help="检查的菜单权限名")
+    parser.add_argument("--rounds", type=int, default=2000, help="每种路径的请求次数")
+    args = parser.parse_args()
+
+    if not redis_client.is_connected():
+        print("❌ Redis不可用，无法运行基准测试")
+        return
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == args.username).first()
+        if not user or user.status != "active":
+            print(f"❌ 用户不存在或未启用: {args.username}")
+            return
+
+        token = create_access_token({"sub": user.id})
+        token_manager.store_token(token, user.id, user.username, user.role)
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+        results = {
+            "旧路径": measure(lambda: legacy_auth(db, token, user.id, args.permission), args.rounds),
+            "新路径（缓存未命中）": measure(
+                lambda: fast_auth(db, credentials, args.permission), args.rounds, before_each=principal_cache.clear
+            ),
+        }
+        principal_cache.clear()
+        fast_auth(db, credentials, args.permission)
+        results["新路径（缓存命中）"] = measure(lambda: fast_auth(db, credentials, args.permission), args.rounds)
+
+        print("=" * 64)
+        print(f"🧪 认证开销基准测试 (用户: {args.username}, 每组 {args.rounds} 次)")
+        print("=" * 64)
+        print(f"{'路径':<20} | {'平均(µs)':>10} | {'p50(µs)':>10} | {'p99(µs)':>10}")
+        print("-" * 64)
+        for name, r in results.items():
+            print(f"{name:<20} | {r['avg']:>10.1f} | {r['p50']:>10.1f} | {r['p99']:>10.1f}")
+
+        token_manager.revoke_token(token)
+        print("\n✅ 基准测试完成，测试 token 已撤销")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
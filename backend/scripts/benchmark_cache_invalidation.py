@@ -0,0 +1,103 @@
+"""
+缓存失效性能基准测试
+对比 KEYS 模式匹配删除与标签索引失效（invalidate_tags）的耗时随 keyspace 规模的变化
+
+用法:
+    python scripts/benchmark_cache_invalidation.py --db 15 --sizes 1000 10000 100000 1000000
+
+注意: 脚本会清空 --db 指定的 Redis 数据库，请勿指向业务库
+"""
+
+import sys
+import os
+import time
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis
+from app.config import settings
+from app.services.cache_service import CacheService
+
+# 每轮被失效的缓存数量（模拟一个项目下的各种筛选/分页组合）
+TAGGED_KEYS = 200
+PROJECT_ID = "bench-project"
+PROJECT_TAG = f"bench:project:{PROJECT_ID}"
+
+
+def fill_keyspace(client: redis.Redis, size: int):
+    """写入无关的填充键，模拟其他业务缓存"""
+    pipe = client.pipeline(transaction=False)
+    for i in range(size):
+        pipe.set(f"bench:filler:{i}", "x", ex=600)
+        if i % 10000 == 9999:
+            pipe.execute()
+    pipe.execute()
+
+
+def fill_project_entries(cache: CacheService, tagged: bool):
+    """写入一个项目下的列表缓存"""
+    for i in range(TAGGED_KEYS):
+        key = f"bench:list:{PROJECT_ID}:all:user{i % 10}:{i * 20}:20"
+        tags = ["bench:list", PROJECT_TAG] if tagged else None
+        cache.set(key, {"list": [], "total": 0}, expire=300, tags=tags)
+
+
+def bench_keys(cache: CacheService) -> float:
+    """旧实现：KEYS pattern + DEL"""
+    fill_project_entries(cache, tagged=False)
+    start = time.perf_counter()
+    keys = cache.redis_client.keys(f"bench:list:{PROJECT_ID}:*")
+    if keys:
+        cache.redis_client.delete(*keys)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_tags(cache: CacheService) -> float:
+    """新实现：标签集合 SMEMBERS + UNLINK"""
+    fill_project_entries(cache, tagged=True)
+    start = time.perf_counter()
+    cache.invalidate_tags(PROJECT_TAG)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缓存失效性能基准测试")
+    parser.add_argument("--db", type=int, default=15, help="使用的Redis数据库编号（会被清空）")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--rounds", type=int, default=5, help="每个规模的重复次数")
+    args = parser.parse_args()
+
+    cache = CacheService()
+    if not cache.enabled:
+        print("❌ Redis不可用，无法运行基准测试")
+        return
+    cache.redis_client = redis.from_url(settings.REDIS_URL, db=args.db, decode_responses=True)
+    cache._invalidate_tags_script = cache.redis_client.register_script(
+        cache._invalidate_tags_script.script
+    )
+
+    print("=" * 70)
+    print(f"🧪 缓存失效基准测试 (每轮失效 {TAGGED_KEYS} 个列表缓存, db={args.db})")
+    print("=" * 70)
+    print(f"{'keyspace':>12} | {'KEYS+DEL (ms)':>14} | {'标签失效 (ms)':>14}")
+    print("-" * 48)
+
+    for size in args.sizes:
+        cache.redis_client.flushdb()
+        fill_keyspace(cache.redis_client, size)
+
+        keys_times = [bench_keys(cache) for _ in range(args.rounds)]
+        tags_times = [bench_tags(cache) for _ in range(args.rounds)]
+
+        keys_avg = sum(keys_times) / len(keys_times)
+        tags_avg = sum(tags_times) / len(tags_times)
+        print(f"{size:>12} | {keys_avg:>14.2f} | {tags_avg:>14.2f}")
+
+    cache.redis_client.flushdb()
+    print("\n✅ 基准测试完成：标签失效耗时只与被失效的键数量有关，不随 keyspace 增长")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+全文搜索基准测试
+在独立的临时表中生成 N 篇中英混排的 HTML 文档（默认 10 万篇），对比：
+  - 旧方式：content ILIKE '%词%'（对 HTML 正文顺序扫描）
+  - 新方式：search_service 的二元组 tsvector + GIN 索引，按 ts_rank_cd 排序取前 20 条并计数
+
+用法:
+    python scripts/benchmark_search.py --docs 100000 --rounds 5
+    python scripts/benchmark_search.py --docs 100000 --keep   # 保留测试表以便手动 EXPLAIN
+
+注意: 只读写 search_benchmark 表，不影响业务数据；结束时默认删除该表
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+import statistics
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from app.database import engine
+from app.services.search_service import build_tsquery, build_tsvector, html_to_text, search_service
+
+TABLE = "search_benchmark"
+
+ZH_WORDS = [
+    "医学影像", "标注", "规范", "病灶", "分割", "肺结节", "数据集", "质控", "审核", "模型", "训练", "测试",
+    "会议纪要", "需求文档", "设计", "版本", "迭代", "交付", "客户", "项目", "进度", "风险", "问题", "方案",
+    "超声", "磁共振", "胸片", "眼底", "病理", "切片", "标注员", "审核员", "一致性", "准确率", "召回率",
+    "工作量", "绩效", "排期", "验收", "部署", "接口", "数据库", "缓存", "性能", "优化", "文档", "流程",
+]
+EN_WORDS = [
+    "CT", "MRI", "DICOM", "segmentation", "nodule", "label", "review", "dataset", "model", "accuracy",
+    "recall", "pipeline", "release", "annotation", "quality", "baseline", "inference", "GPU", "latency",
+]
+# 低频词：只出现在少量文档中，用于测试高选择性查询
+RARE_WORDS = ["罕见病例", "Kaggle", "联邦学习"]
+
+QUERIES = [
+    ("高频中文词", "标注"),
+    ("中文短语", "肺结节 分割"),
+    ("中英混合", "CT 病灶"),
+    ("英文前缀", "segment"),
+    ("低频词", "联邦学习"),
+]
+
+
+def make_document(rng: random.Random, paragraphs: int):
+    title = "".join(rng.sample(ZH_WORDS, 3))
+    parts = []
+    for _ in range(paragraphs):
+        words = [rng.choice(ZH_WORDS if rng.random() < 0.75 else EN_WORDS) for _ in range(rng.randint(20, 60))]
+        if rng.random() < 0.002:
+            words.insert(rng.randrange(len(words)), rng.choice(RARE_WORDS))
+        parts.append(f"<p>{''.join(w if w in ZH_WORDS or w in RARE_WORDS else f' {w} ' for w in words)}</p>")
+    if rng.random() < 0.3:
+        parts.append('<p><img src="http://minio:9000/bucket/images/sample.png"></p>')
+    return title, "".join(parts)
+
+
+def build_table(conn, docs: int, paragraphs: int, batch_size: int):
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    conn.execute(text(
+        f"CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY, title TEXT, content TEXT, body TEXT, tsv TSVECTOR)"
+    ))
+    rng = random.Random(42)
+    insert = text(
+        f"INSERT INTO {TABLE} (id, title, content, body, tsv) "
+        f"VALUES (:id, :title, :content, :body, CAST(:tsv AS tsvector))"
+    )
+    started = time.perf_counter()
+    batch = []
+    for doc_id in range(1, docs + 1):
+        title, content = make_document(rng, paragraphs)
+        body = html_to_text(content)[:search_service.max_index_chars]
+        batch.append({"id": doc_id, "title": title, "content": content, "body": body,
+                      "tsv": build_tsvector(title, body)})
+        if len(batch) >= batch_size:
+            conn.execute(insert, batch)
+            batch = []
+            if doc_id % (batch_size * 20) == 0:
+                print(f"   ... 已生成 {doc_id} 篇")
+    if batch:
+        conn.execute(insert, batch)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    conn.execute(text(f"CREATE INDEX {TABLE}_tsv_idx ON {TABLE} USING GIN (tsv)"))
+    index_seconds = time.perf_counter() - started
+    conn.execute(text(f"ANALYZE {TABLE}"))
+    return load_seconds, index_seconds
+
+
+def measure(conn, sql: str, params: dict, rounds: int):
+    samples = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = conn.execute(text(sql), params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], result
+
+
+def run_queries(conn, rounds: int):
+    ilike_sql = (
+        f"SELECT id, title, count(*) OVER () AS total FROM {TABLE} "
+        f"WHERE {' AND '.join('content ILIKE :t%d' % i for i in range(4))} "
+        f"ORDER BY id LIMIT 20"
+    )
+    fts_sql = (
+        f"SELECT id, title, ts_rank_cd(tsv, q) AS rank, count(*) OVER () AS total "
+        f"FROM {TABLE}, CAST(:q AS tsquery) AS q WHERE tsv @@ q "
+        f"ORDER BY rank DESC LIMIT 20"
+    )
+    print(f"{'查询':<10} | {'ILIKE 平均(ms)':>14} | {'FTS 平均(ms)':>12} | {'ILIKE 命中':>10} | {'FTS 命中':>9}")
+    print("-" * 72)
+    for name, q in QUERIES:
+        terms = q.split()
+        # 旧接口最多按 4 个词 AND，不足的用第一个词补齐
+        padded = (terms * 4)[:4]
+        ilike_avg, _, ilike_rows = measure(
+            conn, ilike_sql, {f"t{i}": f"%{term}%" for i, term in enumerate(padded)}, rounds
+        )
+        fts_avg, _, fts_rows = measure(conn, fts_sql, {"q": build_tsquery(q)}, rounds)
+        ilike_total = ilike_rows[0].total if ilike_rows else 0
+        fts_total = fts_rows[0].total if fts_rows else 0
+        print(f"{name:<10} | {ilike_avg:>14.1f} | {fts_avg:>12.1f} | {ilike_total:>10} | {fts_total:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="全文搜索基准测试")
+    parser.add_argument("--docs", type=int, default=100000, help="生成的文档数")
+    parser.add_argument("--paragraphs", type=int, default=8, help="每篇文档的段落数")
+    parser.add_argument("--rounds", type=int, default=5, help="每个查询的执行次数")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批写入的文档数")
+    parser.add_argument("--keep", action="store_true", help="结束后保留测试表")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        print("❌ 全文搜索基准测试需要 PostgreSQL")
+        return
+
+    with engine.connect() as conn:
+        print(f"📝 生成 {args.docs} 篇测试文档...")
+        load_seconds, index_seconds = build_table(conn, args.docs, args.paragraphs, args.batch_size)
+        conn.commit()
+        size = conn.execute(text(
+            f"SELECT pg_size_pretty(pg_total_relation_size('{TABLE}')), "
+            f"pg_size_pretty(pg_relation_size('{TABLE}_tsv_idx'))"
+        )).first()
+
+        print("=" * 72)
+        print(f"🧪 全文搜索基准测试 ({args.docs} 篇, 每个查询 {args.rounds} 次)")
+        print("=" * 72)
+        print(f"生成+分词写入: {load_seconds:.1f}s，建 GIN 索引: {index_seconds:.1f}s，"
+              f"表总大小: {size[0]}，GIN 索引: {size[1]}")
+        print()
+        run_queries(conn, args.rounds)
+
+        if not args.keep:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+            conn.commit()
+            print(f"\n✅ 基准测试完成，测试表 {TABLE} 已删除")
+        else:
+            print(f"\n✅ 基准测试完成，测试表 {TABLE} 已保留")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+协作文档 WebSocket 压测
+模拟 N 个同时打字的编辑者连接同一文档，统计每个操作从发送到收到服务端回显（带最终版本号）的延迟
+
+用法:
+    python scripts/loadtest_collaboration_ws.py --document-id <文档ID> --typists 20 --rate 8 --duration 30
+    python scripts/loadtest_collaboration_ws.py --document-id <文档ID> --typists 20 --no-batch
+
+注意: 操作会真实写入该文档（并按快照间隔落库），请使用测试文档
+"""
+
+import sys
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+class Typist:
+    """一个模拟编辑者"""
+
+    def __init__(self, index: int, url: str, rate: float):
+        self.name = f"loadtest-{index}"
+        self.url = url
+        self.interval = 1.0 / rate
+        self.version = 1
+        self.length = 0
+        self.seq = 0
+        self.pending = {}
+        self.latencies = []
+        self.frames = 0
+
+    async def run(self, duration: float):
+        async with websockets.connect(self.url, max_size=None) as ws:
+            init = json.loads(await ws.recv())
+            self.version = init.get("version", 1)
+            self.length = len(init.get("content") or "")
+            receiver = asyncio.create_task(self._receive(ws))
+            deadline = time.perf_counter() + duration
+            try:
+                while time.perf_counter() < deadline:
+                    await self._send_op(ws)
+                    await asyncio.sleep(self.interval * random.uniform(0.5, 1.5))
+                # 等待最后一批回显
+                await asyncio.sleep(1)
+            finally:
+                receiver.cancel()
+
+    async def _send_op(self, ws):
+        self.seq += 1
+        token = f"{self.name}:{self.seq}"
+        self.pending[token] = time.perf_counter()
+        await ws.send(json.dumps({
+            "type": "op",
+            "version": self.version,
+            "pos": random.randint(0, self.length),
+            "del": 0,
+            "ins": random.choice("abcdefghij"),
+            "user_id": self.name,
+            "user_name": token,
+        }))
+        if self.seq % 5 == 0:
+            await ws.send(json.dumps({
+                "type": "presence",
+                "user_id": self.name,
+                "user_name": self.name,
+                "cursor": random.randint(0, self.length),
+            }))
+
+    async def _receive(self, ws):
+        async for raw in ws:
+            now = time.perf_counter()
+            self.frames += 1
+            frame = json.loads(raw)
+            messages = frame["messages"] if frame.get("type") == "batch" else [frame]
+            for message in messages:
+                mtype = message.get("type")
+                if mtype == "init":
+                    self.version = message.get("version", self.version)
+                    self.length = len(message.get("content") or "")
+                elif mtype == "op":
+                    self.version = max(self.version, message.get("version", 0))
+                    self.length += len(message.get("ins") or "") - int(message.get("del") or 0)
+                    sent = self.pending.pop(message.get("user_name"), None)
+                    if sent is not None:
+                        self.latencies.append((now - sent) * 1000)
+
+
+async def run_load(args):
+    query = "" if args.no_batch else "?batch=1"
+    url = f"{args.url.rstrip('/')}/collaboration/ws/{args.document_id}{query}"
+    typists = [Typist(i, url, args.rate) for i in range(args.typists)]
+    started = time.perf_counter()
+    await asyncio.gather(*(t.run(args.duration) for t in typists))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(l for t in typists for l in t.latencies)
+    sent = sum(t.seq for t in typists)
+    lost = sum(len(t.pending) for t in typists)
+    frames = sum(t.frames for t in typists)
+
+    print("=" * 64)
+    print(f"🧪 协作 WebSocket 压测 ({args.typists} 人, 每人 {args.rate} 次/秒, {args.duration}s, "
+          f"{'逐条下发' if args.no_batch else '合并帧'})")
+    print("=" * 64)
+    print(f"发送操作: {sent}，收到回显: {len(latencies)}，未回显: {lost}")
+    print(f"收到帧数: {frames}（平均每人 {frames / max(1, args.typists):.0f}）")
+    print(f"吞吐: {len(latencies) / elapsed:.1f} ops/s")
+    if latencies:
+        print(f"回显延迟(ms): avg={statistics.mean(latencies):.2f} "
+              f"p50={latencies[len(latencies) // 2]:.2f} "
+              f"p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.2f} "
+              f"max={latencies[-1]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="协作文档 WebSocket 压测")
+    parser.add_argument("--url", default="ws://localhost:8000", help="后端 WebSocket 根地址")
+    parser.add_argument("--document-id", required=True, help="测试文档ID")
+    parser.add_argument("--typists", type=int, default=20, help="同时打字的人数")
+    parser.add_argument("--rate", type=float, default=8.0, help="每人每秒操作数")
+    parser.add_argument("--duration", type=float, default=30.0, help="持续时间（秒）")
+    parser.add_argument("--no-batch", action="store_true", help="不使用合并帧（逐条接收）")
+    args = parser.parse_args()
+
+    if websockets is None:
+        print("❌ 缺少 websockets 库（uvicorn[standard] 会安装），请先 pip install websockets")
+        return
+
+    asyncio.run(run_load(args))
+
+
+if __name__ == "__main__":
+    main()
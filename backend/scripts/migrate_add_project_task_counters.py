@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+创建项目任务计数表 project_task_counters 并按现有任务回填
+
+之后计数随任务状态流转增量维护，定时任务按 PROJECT_COUNTER_RECONCILE_MINUTES 校准
+Usage:
+  python backend/scripts/migrate_add_project_task_counters.py
+  or inside docker: docker-compose exec backend python scripts/migrate_add_project_task_counters.py
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import engine, SessionLocal
+from app.models.project import ProjectTaskCounter
+from app.services.project_counter_service import project_counter_service
+
+
+def main() -> None:
+    ProjectTaskCounter.__table__.create(bind=engine, checkfirst=True)
+    print("✅ 表 project_task_counters 已就绪")
+
+    db = SessionLocal()
+    try:
+        fixed = project_counter_service.reconcile(db)
+        print(f"✅ 项目任务计数回填完成，写入项目数: {fixed}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
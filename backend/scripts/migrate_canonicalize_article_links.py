@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+一次性迁移：把文章正文与封面中的 MinIO 直链（http(s)://<host>/<bucket>/...）改写为 /api/files/... 并落库
+
+新保存的文章已在写入时完成改写；迁移后读取接口只剩一次子串判断，不再对正文做正则替换
+只更新 content/cover_url 列（不改版本号、不产生编辑历史），可重复执行
+Usage:
+  python backend/scripts/migrate_canonicalize_article_links.py [--batch-size 200] [--dry-run]
+  or inside docker: docker-compose exec backend python scripts/migrate_canonicalize_article_links.py
+"""
+import sys
+import os
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import or_, bindparam
+from app.database import engine, SessionLocal
+from app.models.article import Article
+from app.api.articles import _BUCKET_MARKER, _rewrite_content_links, _rewrite_public_url
+from app.services.article_cache_service import article_cache_service
+
+
+def write_batch(rows) -> None:
+    # 写入走独立连接，读取游标所在的事务不被提交打断；直接执行 UPDATE，不触发搜索索引重建（图片链接不参与索引）
+    stmt = (
+        Article.__table__.update()
+        .where(Article.__table__.c.id == bindparam("_id"))
+        .values(content=bindparam("_content"), cover_url=bindparam("_cover_url"))
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt, rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="文章正文/封面链接规范化")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批更新的文章数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计需要改写的文章，不写库")
+    args = parser.parse_args()
+
+    like = f"%{_BUCKET_MARKER}%"
+    db = SessionLocal()
+    scanned = updated = 0
+    rows = []
+    try:
+        query = (
+            db.query(Article.id, Article.content, Article.cover_url)
+            .filter(or_(Article.content.like(like), Article.cover_url.like(like)))
+        )
+        for article_id, content, cover_url in query.yield_per(args.batch_size):
+            scanned += 1
+            new_content = _rewrite_content_links(content)
+            new_cover = _rewrite_public_url(cover_url)
+            if new_content == content and new_cover == cover_url:
+                continue
+            rows.append({"_id": article_id, "_content": new_content, "_cover_url": new_cover})
+            if len(rows) >= args.batch_size:
+                if not args.dry_run:
+                    write_batch(rows)
+                updated += len(rows)
+                rows = []
+                print(f"   ... 已处理 {updated} 篇")
+        if rows:
+            if not args.dry_run:
+                write_batch(rows)
+            updated += len(rows)
+    finally:
+        db.close()
+
+    if args.dry_run:
+        print(f"🔍 [dry-run] 扫描 {scanned} 篇候选文章，需要改写 {updated} 篇")
+        return
+
+    if updated:
+        # 详情/列表缓存中仍是旧链接，统一失效
+        article_cache_service.invalidate_all_articles()
+    print(f"✅ 链接规范化完成：扫描 {scanned} 篇候选文章，改写 {updated} 篇")
+
+
+if __name__ == "__main__":
+    main()
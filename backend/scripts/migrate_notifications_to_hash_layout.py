@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+把旧版离线通知 List（notifications:user:{uid}）迁移到 Hash + ZSET 索引布局
+
+旧布局中的通知都是未读的，迁移后写入 items/index 两个键，保留原有 TTL，然后删除旧 List；
+重复执行是安全的（已迁移的用户不再有 List 键）
+Usage:
+  python backend/scripts/migrate_notifications_to_hash_layout.py [--dry-run]
+  or inside docker: docker-compose exec backend python scripts/migrate_notifications_to_hash_layout.py
+"""
+import sys
+import os
+import json
+import argparse
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.redis_notification_storage import redis_notification_storage
+
+
+def migrate_key(client, key: str, dry_run: bool) -> int:
+    """迁移一个用户的通知列表，返回迁移的通知数"""
+    user_id = key[len("notifications:user:"):]
+    items_key, index_key, read_key = redis_notification_storage._get_user_keys(user_id)
+
+    raw_items = client.lrange(key, 0, -1)
+    ttl = client.ttl(key)
+    entries = {}
+    for raw in raw_items:
+        try:
+            notification = json.loads(raw)
+        except json.JSONDecodeError:
+            continue
+        notification_id = notification.get("id")
+        if not notification_id:
+            continue
+        entries[notification_id] = (int(notification.get("timestamp") or 0), raw)
+
+    if dry_run:
+        return len(entries)
+
+    pipe = client.pipeline(transaction=True)
+    if entries:
+        pipe.hset(items_key, mapping={nid: raw for nid, (_, raw) in entries.items()})
+        pipe.zadd(index_key, {nid: score for nid, (score, _) in entries.items()})
+        if ttl and ttl > 0:
+            pipe.expire(items_key, ttl)
+            pipe.expire(index_key, ttl)
+            pipe.expire(read_key, ttl)
+    pipe.delete(key)
+    pipe.execute()
+    return len(entries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="离线通知存储布局迁移")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    args = parser.parse_args()
+
+    if not redis_notification_storage.enabled:
+        print("❌ Redis不可用，无法迁移")
+        return
+
+    client = redis_notification_storage.redis_client
+    users = 0
+    notifications = 0
+    for key in client.scan_iter(match="notifications:user:*", count=1000):
+        # 新布局的 :items/:index/:read 键同样匹配，只处理旧版 List
+        if client.type(key) != "list":
+            continue
+        notifications += migrate_key(client, key, args.dry_run)
+        users += 1
+
+    action = "待迁移" if args.dry_run else "已迁移"
+    print(f"✅ 通知存储布局迁移完成：{action} {users} 个用户，共 {notifications} 条通知")
+
+
+if __name__ == "__main__":
+    main()
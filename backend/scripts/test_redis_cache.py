@@ -124,12 +124,15 @@ def test_cache_invalidation():
     print("=" * 70)
     
     print("\n📝 测试任务缓存失效...")
-    cache_service.set("tasks:list:proj1:all:all:0:100:False", {"count": 10})
+    list_key = cache_service.task_list_cache_key("proj1", None, None, 0, 100, False)
+    cache_service.set(list_key, {"count": 10})
     cache_service.set("tasks:detail:task1", {"id": "task1", "title": "测试"})
     
-    # 测试单项目缓存失效
-    cache_service.invalidate_tasks_cache("proj1")
-    assert cache_service.get("tasks:list:proj1:all:all:0:100:False") is None
+    # 测试任务列表缓存失效（代数递增后生成新键，旧键不再被读取）
+    cache_service.invalidate_tasks_cache()
+    new_list_key = cache_service.task_list_cache_key("proj1", None, None, 0, 100, False)
+    assert new_list_key != list_key
+    assert cache_service.get(new_list_key) is None
     assert cache_service.get("tasks:detail:task1") is None
     print("✅ 任务缓存失效测试通过")
     
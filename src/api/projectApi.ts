@@ -615,9 +615,16 @@ export const taskApi = {
     const formData = new FormData()
     formData.append('file', file)
     if (projectId) formData.append('project_id', projectId)
-    return backendApi.post<BatchImportResult>('/tasks/import', formData, {
+    const submitted: any = await backendApi.post<any>('/tasks/import', formData, {
       headers: { 'Content-Type': 'multipart/form-data' }
     })
+    if (!submitted?.job_id) return submitted
+    // 导入在后台执行，轮询进度直到完成
+    for (;;) {
+      await new Promise((resolve) => setTimeout(resolve, 1000))
+      const job: any = await backendApi.get<any>(`/tasks/import/${submitted.job_id}`)
+      if (job.status === 'completed' || job.status === 'failed') return job
+    }
   },
 
   // 导出任务